@@ -21,16 +21,36 @@ from flask import (
     render_template,
     redirect,
     url_for,
+    stream_with_context,
 )
 from dotenv import load_dotenv
-from pymongo import MongoClient
+from pymongo import MongoClient, ASCENDING, DESCENDING, UpdateOne, DeleteMany, ReplaceOne
 from bson.objectid import ObjectId
 import bcrypt
+import click
 import pyotp
 
+import classifier
+from bank_refresh import BankRefreshScheduler
+from summary_engine import build_summary
+from vulnerability import (
+    run_vulnerability_scan,
+    rescore_user,
+    window_totals,
+    manual_window_totals,
+    PRIORITY_SOURCE_ADVISOR,
+    PRIORITY_SOURCE_SCAN,
+)
+from jobs import JobQueue
+from velocity import VelocityTracker
+from compliance_rules import DEFAULT_RULE_SETTINGS, RuleEngine, rule_settings
+from report_cache import ReportCache
+from tx_export import EXPORT_WATERMARK_OVERLAP, export_transactions, parse_timestamp
+from audit_queue import AuditQueue
+from entry_import import detect_format, parse_csv, parse_ofx, validate_row
+from batching import chunked
 from plaid_client import (
-    get_current_balances,
-    get_recent_transactions,
+    refresh_bank_item,
     create_sandbox_access_token,
 )
 
@@ -70,6 +90,10 @@ users_col = db.get_collection("users")
 entries_col = db.get_collection("entries")
 profile_pics_col = db.get_collection("profilepics")
 bank_accounts_col = db.get_collection("bank_account_connected")
+# One document per Plaid transaction, keyed by (user_id, transaction_id)
+bank_transactions_col = db.get_collection("bank_transactions")
+# One document per user per day: income/expense/category sums of the rows above
+daily_rollups_col = db.get_collection("daily_rollups")
 notes_col = db.get_collection("notes")
 clients_col = db.get_collection("clients")
 notifications_col = db.get_collection("notifications")
@@ -80,29 +104,219 @@ compliance_settings_col = db.get_collection("compliance_settings")
 audit_logs_col = db.get_collection("audit_logs")
 financially_vulnerable_col = db.get_collection("financially_vulnerable_users")
 savings_goals_col = db.get_collection("savings_goals")
+compliance_jobs_col = db.get_collection("compliance_jobs")
+# Running expense totals from manual entries, one doc per user (_id = user_id)
+spending_totals_col = db.get_collection("spending_totals")
+# Per user+merchant transaction counts in time buckets (velocity rule)
+velocity_counters_col = db.get_collection("velocity_counters")
+# Last exported updated_at per bulk export (incremental analytics dumps)
+export_watermarks_col = db.get_collection("export_watermarks")
+
+velocity_tracker = VelocityTracker(velocity_counters_col)
+# Flag rules compiled from compliance_settings, rebuilt when they change
+rule_engine = RuleEngine(compliance_settings_col)
+
+
+
+_indexes_ready = False
 
 
+def ensure_indexes():
+    """Create the indexes the query paths rely on (idempotent)."""
+    bank_transactions_col.create_index(
+        [("user_id", ASCENDING), ("transaction_id", ASCENDING)],
+        unique=True,
+    )
+    bank_transactions_col.create_index([("user_id", ASCENDING), ("date", DESCENDING)])
+    daily_rollups_col.create_index(
+        [("user_id", ASCENDING), ("day", ASCENDING)],
+        unique=True,
+    )
+    # Cross-user window scans (vulnerability job)
+    daily_rollups_col.create_index([("day", ASCENDING)])
+    # Per-user manual entry windows (vulnerability rescoring)
+    entries_col.create_index([("user_id", ASCENDING), ("created_at", DESCENDING)])
+    # Newest-first pages of flagged transactions
+    flagged_col.create_index([("created_at", DESCENDING)])
+    velocity_tracker.ensure_indexes()
+    # Re-screening a user's stored transactions
+    flagged_col.create_index([("transaction.user_id", ASCENDING), ("transaction.transaction_id", ASCENDING)])
+    # Newest write, for report cache versions
+    bank_transactions_col.create_index([("updated_at", DESCENDING)])
+    bank_accounts_col.create_index([("updated_at", DESCENDING)])
+    users_col.create_index([("updated_at", DESCENDING)])
+
+
+@app.before_request
+def ensure_indexes_once():
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    _indexes_ready = True
+    try:
+        ensure_indexes()
+    except Exception as e:
+        print("INDEX SETUP ERROR:", e)
+
 
 def resolve_category(raw_list):
-    if not raw_list or not isinstance(raw_list, list):
-        return "Other"
-    raw = raw_list[0].lower()
-    if "uber" in raw or "lyft" in raw:
-        return "Transport"
-    if "mcdonald" in raw or "starbucks" in raw:
-        return "Food & Drink"
-    if "pay" in raw or "payment" in raw:
-        return "Bills"
-    if "airlines" in raw or "flight" in raw:
-        return "Travel"
-    if "deposit" in raw or "credit" in raw:
-        return "Income"
-    return raw_list[0].title()
+    return classifier.raw_category(raw_list)
 
 
 DEFAULT_SPENDING_LIMIT = 1000.0
 
 
+# ---------------------------
+# SPENDING TOTALS
+# ---------------------------
+#
+# spending_totals keeps, per user, the sum of their manual expense entries:
+#   {_id: user_id, expense_total, expense_count, by_month: {"YYYY-MM": total}}
+# It is moved with $inc whenever an expense entry is added or removed, so
+# budget checks read one small document instead of every entry. A user's
+# document is built from entries the first time it is needed, and
+# `flask reconcile-spending-totals` rebuilds it from scratch.
+
+def _spending_month(created_at) -> str:
+    return (created_at or datetime.utcnow()).strftime("%Y-%m")
+
+
+def _aggregate_spending_totals(match: dict) -> dict:
+    """Per-user totals docs (keyed by user_id) for the expense entries matching `match`."""
+    pipeline = [
+        {"$match": {**match, "type": "expense"}},
+        {"$group": {
+            "_id": {
+                "user_id": "$user_id",
+                "month": {"$dateToString": {"format": "%Y-%m", "date": "$created_at"}},
+            },
+            "total": {"$sum": {"$convert": {
+                "input": "$amount", "to": "double", "onError": 0.0, "onNull": 0.0,
+            }}},
+            "count": {"$sum": 1},
+        }},
+    ]
+    now = datetime.utcnow()
+    docs = {}
+    for row in entries_col.aggregate(pipeline, allowDiskUse=True):
+        uid = row["_id"]["user_id"]
+        doc = docs.setdefault(uid, {
+            "_id": uid, "expense_total": 0.0, "expense_count": 0,
+            "by_month": {}, "updated_at": now,
+        })
+        doc["expense_total"] += row["total"]
+        doc["expense_count"] += row["count"]
+        month = row["_id"]["month"]
+        if month:
+            doc["by_month"][month] = doc["by_month"].get(month, 0.0) + row["total"]
+    return docs
+
+
+def reconcile_spending_totals(user_id: str | None = None, only_missing: bool = False) -> int:
+    """
+    Rebuild spending_totals from entries (one user, or everyone when
+    user_id is None). Returns the number of user documents written.
+
+    only_missing=True only creates documents that don't exist yet, so a
+    lazy first read can't overwrite totals another request just created
+    and bumped.
+    """
+    match = {"user_id": user_id} if user_id is not None else {}
+    docs = _aggregate_spending_totals(match)
+
+    if user_id is not None and user_id not in docs:
+        docs[user_id] = {
+            "_id": user_id, "expense_total": 0.0, "expense_count": 0,
+            "by_month": {}, "updated_at": datetime.utcnow(),
+        }
+    if user_id is None and not only_missing:
+        # Users whose expense entries are all gone
+        spending_totals_col.delete_many({"_id": {"$nin": list(docs)}})
+
+    if not docs:
+        return 0
+    if only_missing:
+        ops = [
+            UpdateOne(
+                {"_id": uid},
+                {"$setOnInsert": {k: v for k, v in doc.items() if k != "_id"}},
+                upsert=True,
+            )
+            for uid, doc in docs.items()
+        ]
+    else:
+        ops = [ReplaceOne({"_id": uid}, doc, upsert=True) for uid, doc in docs.items()]
+    spending_totals_col.bulk_write(ops, ordered=False)
+    return len(docs)
+
+
+def _backfill_spending_totals(user_id: str, before_id):
+    """
+    Add expense entries older than `before_id` to a totals doc that was
+    just created by a bump. Applied with $inc so concurrent bumps are kept.
+    """
+    match = {"user_id": user_id}
+    if before_id is not None:
+        match["_id"] = {"$lt": before_id}
+    doc = _aggregate_spending_totals(match).get(user_id)
+    if not doc:
+        return
+    inc = {"expense_total": doc["expense_total"], "expense_count": doc["expense_count"]}
+    for month, total in doc["by_month"].items():
+        inc["by_month." + month] = total
+    spending_totals_col.update_one({"_id": user_id}, {"$inc": inc})
+
+
+def _bump_spending_totals(user_id: str, entries: list, sign: int = 1):
+    """
+    Apply added (sign=1) or removed (sign=-1) expense entries to the user's
+    running totals. Call after the entries were written to entries_col,
+    passing the written docs (with their _id).
+
+    The first bump for a user creates the totals doc with this $inc
+    (upsert) and then backfills the entries older than these ones.
+    """
+    inc = {}
+    for e in entries:
+        if str(e.get("type", "")).lower() != "expense":
+            continue
+        try:
+            amount = float(e.get("amount", 0))
+        except (TypeError, ValueError):
+            continue
+        month_key = "by_month." + _spending_month(e.get("created_at"))
+        inc["expense_total"] = inc.get("expense_total", 0.0) + sign * amount
+        inc["expense_count"] = inc.get("expense_count", 0) + sign
+        inc[month_key] = inc.get(month_key, 0.0) + sign * amount
+    if not inc:
+        return
+
+    res = spending_totals_col.update_one(
+        {"_id": user_id},
+        {"$inc": inc, "$set": {"updated_at": datetime.utcnow()}},
+        upsert=True,
+    )
+    if res.upserted_id is not None:
+        ids = [e["_id"] for e in entries if e.get("_id") is not None]
+        _backfill_spending_totals(user_id, min(ids) if ids else None)
+
+
+def _expense_total(user_id: str) -> float:
+    doc = spending_totals_col.find_one({"_id": user_id}, {"expense_total": 1})
+    if doc is None:
+        reconcile_spending_totals(user_id, only_missing=True)
+        doc = spending_totals_col.find_one({"_id": user_id}, {"expense_total": 1}) or {}
+    return float(doc.get("expense_total", 0.0))
+
+
+@app.cli.command("reconcile-spending-totals")
+@click.option("--user-id", default=None, help="Only rebuild this user's totals.")
+def reconcile_spending_totals_command(user_id):
+    """Rebuild spending_totals from the entries collection."""
+    written = reconcile_spending_totals(user_id)
+    click.echo(f"Reconciled spending totals for {written} user(s).")
+
+
 def recalc_spending_flag_for_user(user_id: str):
     try:
         user_obj_id = ObjectId(user_id)
@@ -111,13 +325,7 @@ def recalc_spending_flag_for_user(user_id: str):
     user = users_col.find_one({"_id": user_obj_id})
     if not user:
         return
-    total_expense = 0.0
-    for e in entries_col.find({"user_id": user_id}):
-        if str(e.get("type", "")).lower() == "expense":
-            try:
-                total_expense += float(e.get("amount", 0))
-            except (TypeError, ValueError):
-                continue
+    total_expense = _expense_total(user_id)
     try:
         spending_limit = float(user.get("spending_limit", DEFAULT_SPENDING_LIMIT))
     except (TypeError, ValueError):
@@ -170,6 +378,18 @@ def login_required(view_func):
         return redirect(url_for("login_page", next=next_url))
     return wrapped
 #audit logs
+# Audit docs are buffered and written in batches by a background thread;
+# AUDIT_ASYNC=0 writes each one inline instead.
+AUDIT_ASYNC = os.getenv("AUDIT_ASYNC", "1") != "0"
+audit_queue = AuditQueue(
+    audit_logs_col,
+    max_size=int(os.getenv("AUDIT_QUEUE_MAX", "10000")),
+    batch_size=int(os.getenv("AUDIT_BATCH_SIZE", "500")),
+    flush_seconds=float(os.getenv("AUDIT_FLUSH_SECONDS", "1.0")),
+    block_seconds=float(os.getenv("AUDIT_BLOCK_MS", "0")) / 1000,
+)
+
+
 def write_audit_log(action, details=None, status=None):
     """
     audit logger. Call this from routes, or use the after_request
@@ -190,7 +410,10 @@ def write_audit_log(action, details=None, status=None):
             "status": status,
             "details": details or {},
         }
-        audit_logs_col.insert_one(doc)
+        if AUDIT_ASYNC:
+            audit_queue.enqueue(doc)
+        else:
+            audit_logs_col.insert_one(doc)
     except Exception as e:
         print("AUDIT LOG ERROR:", e)
 
@@ -276,9 +499,25 @@ def _compute_total_balance(balances_payload: dict) -> float:
 
 
 def _classify_direction(name: str, category: str | None) -> bool:
-    label = f"{name or ''} {category or ''}".lower()
-    income_keywords = ["payroll", "deposit", "credit", "refund", "interest", "intrst"]
-    return any(k in label for k in income_keywords)
+    return classifier.is_income(name, category)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def _pagination_args(default_size: int = DEFAULT_PAGE_SIZE):
+    """(page, page_size, skip) from ?page=&page_size= (1-based, clamped)."""
+    try:
+        page = max(1, int(request.args.get("page", 1)))
+    except (TypeError, ValueError):
+        page = 1
+    try:
+        page_size = int(request.args.get("page_size", default_size))
+    except (TypeError, ValueError):
+        page_size = default_size
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    return page, page_size, (page - 1) * page_size
+
 
 def _get_advisor_client_link(client_link_id: str, require_accepted: bool = True):
     """
@@ -315,6 +554,56 @@ def _get_advisor_client_link(client_link_id: str, require_accepted: bool = True)
     return link, None
 
 
+def _parse_tx_date(raw_date) -> datetime | None:
+    """Plaid date (date, datetime or ISO string) as a midnight datetime."""
+    if isinstance(raw_date, datetime):
+        return datetime(raw_date.year, raw_date.month, raw_date.day)
+    if isinstance(raw_date, date):
+        return datetime(raw_date.year, raw_date.month, raw_date.day)
+    try:
+        d = datetime.fromisoformat(str(raw_date))
+    except Exception:
+        try:
+            d = datetime.strptime(str(raw_date), "%Y-%m-%d")
+        except Exception:
+            return None
+    return datetime(d.year, d.month, d.day)
+
+
+def _canonical_category(category: str | None) -> str:
+    """
+    One spelling per category for grouping: personal_finance_category
+    codes like FOOD_AND_DRINK become "Food And Drink", whitespace is
+    collapsed, and empty values become "Other".
+    """
+    cat = " ".join(str(category or "").split())
+    if not cat:
+        return "Other"
+    if cat.isupper() and " " not in cat:
+        return cat.replace("_", " ").title()
+    return cat
+
+
+def _enrich_transaction(tx: dict, is_income: bool | None = None) -> dict:
+    """
+    Add the fields read paths need so they never reparse or rescan a row:
+    posted_date (datetime), is_income, signed_amount, canonical_category.
+    Pass is_income when it was already classified in a batch.
+    Modifies and returns `tx`.
+    """
+    try:
+        amount = float(tx.get("amount") or 0)
+    except (TypeError, ValueError):
+        amount = 0.0
+    if is_income is None:
+        is_income = _classify_direction(tx.get("name", ""), tx.get("category") or "Other")
+    tx["posted_date"] = _parse_tx_date(tx.get("date"))
+    tx["is_income"] = is_income
+    tx["signed_amount"] = amount if is_income else -amount
+    tx["canonical_category"] = _canonical_category(tx.get("category"))
+    return tx
+
+
 def _simplify_transactions(tx_payload: dict):
     result = []
     for tx in tx_payload.get("transactions", []):
@@ -344,9 +633,340 @@ def _simplify_transactions(tx_payload: dict):
             "iso_currency_code": tx.get("iso_currency_code"),
             "transaction_id": tx.get("transaction_id"),
         })
+    for row, is_income in zip(result, classifier.classify_directions(result)):
+        _enrich_transaction(row, is_income=is_income)
     return result
 
 
+# The bank status payload keeps showing the same window it always did,
+# even though the synced history stored per user is longer.
+RECENT_TRANSACTION_DAYS = 30
+RECENT_TRANSACTION_LIMIT = 100
+
+# Fields returned to callers from bank_transactions rows
+TX_PROJECTION = {"_id": 0, "user_id": 0, "updated_at": 0}
+# Same, minus the ingest-time datetime, for rows sent back as JSON
+TX_API_PROJECTION = {**TX_PROJECTION, "posted_date": 0}
+
+
+def _write_transaction_rows(user_id: str, upserts: list, removed_ids=(), replace: bool = False):
+    """
+    Upsert/delete rows in bank_transactions for one user in a single
+    bulk_write. replace=True also deletes every stored row that is not in
+    `upserts` (first sync of an item).
+    """
+    now = datetime.utcnow()
+    ops = []
+    keep_ids = []
+    rows = []
+    for tx in upserts:
+        tx_id = tx.get("transaction_id")
+        if not tx_id:
+            continue
+        keep_ids.append(tx_id)
+        row = dict(tx)
+        if "is_income" not in row:
+            _enrich_transaction(row)
+        row.update({"user_id": user_id, "updated_at": now})
+        rows.append(row)
+        ops.append(UpdateOne(
+            {"user_id": user_id, "transaction_id": tx_id},
+            {"$set": row},
+            upsert=True,
+        ))
+    if removed_ids:
+        ops.append(DeleteMany({"user_id": user_id, "transaction_id": {"$in": list(removed_ids)}}))
+    if replace:
+        ops.append(DeleteMany({"user_id": user_id, "transaction_id": {"$nin": keep_ids}}))
+    if not ops:
+        return
+
+    # Rows being overwritten or removed come out of the daily rollups first
+    old_rows = []
+    if not replace:
+        old_rows = list(bank_transactions_col.find(
+            {"user_id": user_id, "transaction_id": {"$in": keep_ids + list(removed_ids)}},
+            ROLLUP_TX_PROJECTION,
+        ))
+
+    bank_transactions_col.bulk_write(ops, ordered=True)
+
+    if replace:
+        rebuild_daily_rollups(user_id)
+    else:
+        deltas = {}
+        for old in old_rows:
+            _add_rollup_delta(deltas, old, -1)
+        for row in rows:
+            _add_rollup_delta(deltas, row, 1)
+        _apply_rollup_deltas(user_id, deltas)
+
+
+def _apply_transaction_sync(doc: dict, sync: dict, extra: dict | None = None) -> dict:
+    """
+    Apply a plaid_client.sync_transactions() result for a stored
+    bank_account_connected document.
+
+    Rows live in bank_transactions. The first sync of an item (no stored
+    cursor) replaces the user's rows outright; after that only the deltas
+    are written. Documents still carrying the old embedded
+    recent_transactions array are migrated into the collection here.
+
+    Returns {"upserted": n, "removed": n}.
+    """
+    user_id = doc["user_id"]
+    added = _simplify_transactions({"transactions": sync.get("added", [])})
+    modified = _simplify_transactions({"transactions": sync.get("modified", [])})
+    changed = added + modified
+    removed_ids = set(sync.get("removed", []))
+    first_sync = not doc.get("transactions_cursor")
+
+    update = dict(extra or {})
+    update["transactions_cursor"] = sync.get("next_cursor")
+    update["updated_at"] = datetime.utcnow()
+    write = {"$set": update}
+
+    legacy = doc.get("recent_transactions")
+    if legacy is not None:
+        if not first_sync:
+            changed_ids = {tx["transaction_id"] for tx in changed}
+            carried = [
+                tx for tx in legacy
+                if tx.get("transaction_id") not in removed_ids
+                and tx.get("transaction_id") not in changed_ids
+            ]
+            changed = carried + changed
+        write["$unset"] = {"recent_transactions": ""}
+
+    if changed or removed_ids or first_sync:
+        _write_transaction_rows(user_id, changed, removed_ids, replace=first_sync)
+        update["transaction_count"] = bank_transactions_col.count_documents({"user_id": user_id})
+
+    bank_accounts_col.update_one({"_id": doc["_id"]}, write)
+    if changed or removed_ids or first_sync:
+        _rescore_user_vulnerability(user_id)
+    return {"upserted": len(changed), "removed": len(removed_ids)}
+
+
+def _load_transactions(
+    user_id: str,
+    since: date | None = None,
+    newest_first: bool = False,
+    limit: int = 0,
+    projection: dict = TX_PROJECTION,
+) -> list:
+    """
+    Stored Plaid transactions for a user, optionally only those dated on or
+    after `since`, sorted by date and capped at `limit` (0 = no cap).
+
+    Served from bank_transactions; bank documents synced before that
+    collection existed still carry an embedded recent_transactions array,
+    which is used as a fallback until their next sync migrates it. Rows
+    stored before ingest-time enrichment get their derived fields filled
+    in here.
+    """
+    query = {"user_id": user_id}
+    if since:
+        query["date"] = {"$gte": since.isoformat()}
+
+    cursor = bank_transactions_col.find(query, projection).sort(
+        "date", DESCENDING if newest_first else ASCENDING
+    )
+    if limit:
+        cursor = cursor.limit(limit)
+    rows = list(cursor)
+    if rows:
+        return _fill_legacy_fields(rows, projection)
+
+    legacy_doc = bank_accounts_col.find_one(
+        {"user_id": user_id, "recent_transactions.0": {"$exists": True}},
+        {"recent_transactions": 1},
+    )
+    if not legacy_doc:
+        return []
+
+    rows = legacy_doc["recent_transactions"]
+    if since:
+        rows = [tx for tx in rows if str(tx.get("date", "")) >= since.isoformat()]
+    rows = sorted(rows, key=lambda x: str(x.get("date", "")), reverse=newest_first)
+    return _fill_legacy_fields(rows[:limit] if limit else rows, projection)
+
+
+def _fill_legacy_fields(rows: list, projection: dict) -> list:
+    for tx in rows:
+        if "is_income" not in tx:
+            _enrich_transaction(tx)
+        if projection.get("posted_date") == 0:
+            tx.pop("posted_date", None)
+    return rows
+
+
+def _has_transactions(user_id: str) -> bool:
+    if bank_transactions_col.find_one({"user_id": user_id}, {"_id": 1}):
+        return True
+    return bank_accounts_col.find_one(
+        {"user_id": user_id, "recent_transactions.0": {"$exists": True}},
+        {"_id": 1},
+    ) is not None
+
+
+# ---------------------------
+# DAILY ROLLUPS
+# ---------------------------
+#
+# daily_rollups holds, per user and day ("YYYY-MM-DD"):
+#   income / expenses / categories  - signed_amount >= 0 vs < 0, as the
+#                                     dashboards chart them
+#   flow_income / flow_expense      - raw amounts split on is_income, as
+#   income_count / expense_count      compute_simplified_flows totals them
+#   tx_count
+# Category names are used as field names, so "." and "$" are escaped.
+
+ROLLUP_TX_PROJECTION = {
+    "_id": 0, "date": 1, "name": 1, "category": 1, "amount": 1,
+    "posted_date": 1, "is_income": 1, "signed_amount": 1, "canonical_category": 1,
+}
+
+
+def _rollup_key(category: str) -> str:
+    return category.replace(".", "\uff0e").replace("$", "\uff04")
+
+
+def _rollup_category(key: str) -> str:
+    return key.replace("\uff0e", ".").replace("\uff04", "$")
+
+
+def _add_rollup_delta(deltas: dict, tx: dict, sign: int):
+    """Accumulate one row (sign=+1 added, -1 removed) into per-day $inc maps."""
+    if "is_income" not in tx:
+        _enrich_transaction(tx)
+    posted = tx["posted_date"]
+    if posted is None:
+        return
+    inc = deltas.setdefault(posted.date().isoformat(), {})
+
+    def bump(field, value):
+        inc[field] = inc.get(field, 0) + sign * value
+
+    signed = tx["signed_amount"]
+    if signed >= 0:
+        bump("income", signed)
+    else:
+        bump("expenses", -signed)
+        bump("categories." + _rollup_key(tx["canonical_category"]), -signed)
+
+    if tx["is_income"]:
+        bump("flow_income", signed)
+        bump("income_count", 1)
+    else:
+        bump("flow_expense", -signed)
+        bump("expense_count", 1)
+    bump("tx_count", 1)
+
+
+def _apply_rollup_deltas(user_id: str, deltas: dict):
+    if not deltas:
+        return
+    now = datetime.utcnow()
+    ops = [
+        UpdateOne(
+            {"user_id": user_id, "day": day},
+            {"$inc": inc, "$set": {"updated_at": now}},
+            upsert=True,
+        )
+        for day, inc in deltas.items()
+    ]
+    # Days whose last transaction was removed
+    ops.append(DeleteMany({"user_id": user_id, "tx_count": {"$lte": 0}}))
+    daily_rollups_col.bulk_write(ops, ordered=True)
+
+
+def rebuild_daily_rollups(user_id: str) -> int:
+    """
+    Recompute a user's rollups from their stored transactions and mark the
+    bank document as rolled up. Returns the number of days written.
+    """
+    deltas = {}
+    for tx in _load_transactions(user_id, projection=ROLLUP_TX_PROJECTION):
+        _add_rollup_delta(deltas, tx, 1)
+
+    now = datetime.utcnow()
+    daily_rollups_col.delete_many({"user_id": user_id})
+    docs = []
+    for day, inc in deltas.items():
+        doc = {"user_id": user_id, "day": day, "updated_at": now, "categories": {}}
+        for field, value in inc.items():
+            if field.startswith("categories."):
+                doc["categories"][field.split(".", 1)[1]] = value
+            else:
+                doc[field] = value
+        docs.append(doc)
+    if docs:
+        daily_rollups_col.insert_many(docs)
+
+    bank_accounts_col.update_many({"user_id": user_id}, {"$set": {"rollups_built_at": now}})
+    return len(docs)
+
+
+def _load_daily_rollups(user_id: str, since: date | None = None) -> list:
+    """
+    A user's rollup rows (oldest day first), optionally from `since` on.
+    Users synced before rollups existed are rebuilt on first read.
+    """
+    bank_doc = bank_accounts_col.find_one({"user_id": user_id}, {"rollups_built_at": 1})
+    if not bank_doc:
+        return []
+    if not bank_doc.get("rollups_built_at"):
+        rebuild_daily_rollups(user_id)
+
+    query = {"user_id": user_id, "tx_count": {"$gt": 0}}
+    if since:
+        query["day"] = {"$gte": since.isoformat()}
+    return list(daily_rollups_col.find(query, {"_id": 0, "user_id": 0}).sort("day", ASCENDING))
+
+
+def _rollup_totals(rollups: list) -> dict:
+    """Window totals over rollup rows; categories are unescaped and rounded."""
+    totals = {
+        "income": 0.0, "expenses": 0.0,
+        "flow_income": 0.0, "flow_expense": 0.0,
+        "income_count": 0, "expense_count": 0,
+    }
+    categories = {}
+    for r in rollups:
+        for field in totals:
+            totals[field] += r.get(field, 0)
+        for key, value in (r.get("categories") or {}).items():
+            cat = _rollup_category(key)
+            categories[cat] = categories.get(cat, 0.0) + value
+    totals["categories"] = {
+        k: round(v, 2) for k, v in categories.items() if round(v, 2) != 0
+    }
+    return totals
+
+
+def _summary_from_rollups(rollups: list) -> dict:
+    """Chart series in the shape _build_plaid_summary returns (without transactions)."""
+    return {
+        "labels": [r["day"] for r in rollups],
+        "income": [round(r.get("income", 0.0), 2) for r in rollups],
+        "expenses": [round(r.get("expenses", 0.0), 2) for r in rollups],
+        "categoryBreakdown": _rollup_totals(rollups)["categories"],
+    }
+
+
+def _recent_transactions(user_id: str) -> list:
+    """Newest-first slice of stored transactions for the bank status payload."""
+    since = datetime.utcnow().date() - timedelta(days=RECENT_TRANSACTION_DAYS)
+    return _load_transactions(
+        user_id,
+        since=since,
+        newest_first=True,
+        limit=RECENT_TRANSACTION_LIMIT,
+        projection=TX_API_PROJECTION,
+    )
+
+
 @app.route("/api/compliance/save_settings", methods=["POST"])
 @login_required
 def api_compliance_save_settings():
@@ -355,6 +975,16 @@ def api_compliance_save_settings():
 
     data = request.get_json() or {}
 
+    # Rule fields the payload leaves out keep their stored values (the
+    # settings page only posts the toggles and retention)
+    stored = compliance_settings_col.find_one(
+        {"_id": "global"}, {key: 1 for key in DEFAULT_RULE_SETTINGS}
+    ) or {}
+    rules = rule_settings({
+        **stored,
+        **{key: data[key] for key in DEFAULT_RULE_SETTINGS if key in data},
+    })
+
     compliance_settings_col.update_one(
         {"_id": "global"},   # global compliance policy
         {"$set": {
@@ -364,10 +994,12 @@ def api_compliance_save_settings():
             "notify_critical": data.get("notify_critical", False),
             "track_admin": data.get("track_admin", False),
             "retention_days": int(data.get("retention_days", 90)),
+            **rules,
             "updated_at": datetime.utcnow()
         }},
         upsert=True
     )
+    rule_engine.invalidate()
 
     return jsonify({"ok": True})
 
@@ -375,7 +1007,8 @@ def api_compliance_save_settings():
 @login_required
 def api_financially_vulnerable_scan():
     """
-    Scan all Plaid-connected users and determine whether they are
+    Scan all users with recent activity (Plaid transactions, or manual
+    entries when there are none) and determine whether they are
     financially vulnerable based on net income remaining.
 
     Rules (over a given time window):
@@ -391,6 +1024,9 @@ def api_financially_vulnerable_scan():
       - store a doc in financially_vulnerable_users collection
       - update any advisor-client links (clients_col) to set priority to
         high/medium/low if the client has accepted the advisor.
+
+    The work is done by vulnerability.run_vulnerability_scan, which builds
+    the new snapshot in a staging collection and swaps it in at the end.
     """
     if session.get("role") != "Compliance Regulator":
         return jsonify({"ok": False, "message": "Unauthorized"}), 403
@@ -402,104 +1038,93 @@ def api_financially_vulnerable_scan():
     except (TypeError, ValueError):
         days = 30
 
-    cutoff_date = datetime.utcnow().date() - timedelta(days=days)
-
-    # Clear previous snapshot so this collection always reflects the latest vulnerability assessment.
-    financially_vulnerable_col.delete_many({})
-
-    vulnerable_results = []
-    scanned_accounts = 0
-
-    # Iterate all Plaid-connected accounts
-    for acct in bank_accounts_col.find({}):
-        user_id_str = acct.get("user_id")
-        if not user_id_str:
-            continue
-
-        try:
-            user_obj_id = ObjectId(user_id_str)
-        except Exception:
-            continue
-
-        user_doc = users_col.find_one({"_id": user_obj_id})
-        if not user_doc:
-            continue
-
-        txs = acct.get("recent_transactions", [])
-        if not txs:
-            continue
-
-        scanned_accounts += 1
+    if _wants_async(data):
+        return _enqueue_job("vulnerability_scan", {"days": days})
+
+    return jsonify({"ok": True, **_vulnerability_scan(days)})
+
+
+def _vulnerability_scan(days: int) -> dict:
+    # Users synced before rollups existed would otherwise be missed by the
+    # rollup aggregation
+    for acct in bank_accounts_col.find(
+        {"rollups_built_at": {"$exists": False}}, {"user_id": 1}
+    ):
+        if acct.get("user_id"):
+            rebuild_daily_rollups(acct["user_id"])
+
+    result = run_vulnerability_scan(
+        bank_accounts_col,
+        users_col,
+        daily_rollups_col,
+        clients_col,
+        financially_vulnerable_col,
+        days=days,
+        entries_col=entries_col,
+    )
+    # Rescoring between scans reuses this window (no updated_at bump: the
+    # rule engine doesn't need to recompile)
+    compliance_settings_col.update_one(
+        {"_id": "global"},
+        {"$set": {"vulnerability_window_days": days}},
+        upsert=True,
+    )
+    return result
 
-        # Reuse existing Plaid summary builder to get income/expenses
-        summary = _build_plaid_summary(txs, cutoff_date)
-        total_income = float(sum(summary.get("income", [])))
-        total_expenses = float(sum(summary.get("expenses", []))) 
 
-        # If we truly have no income and no expenses in this window, skip
-        if total_income <= 0 and total_expenses <= 0:
-            continue
+# Rescoring window until a scan has run (same default as the scan)
+VULNERABILITY_WINDOW_DAYS = int(os.getenv("VULNERABILITY_WINDOW_DAYS", "30"))
 
-        # net = income - expenses
-        net = total_income - total_expenses
 
-        # Percent of income left. If no income but expenses exist,
-        # treat as 0% left (worst case)
-        if total_income <= 0:
-            percent_left = 0.0
-        else:
-            percent_left = (net / total_income) * 100.0
-
-        # Determine risk level
-        risk_level = None
-        if percent_left <= 20:
-            risk_level = "high"
-        elif percent_left <= 40:
-            risk_level = "medium"
-        elif percent_left <= 50:
-            risk_level = "low"
-        else:
-            # 51% or more left -> not financially vulnerable
-            continue
+def _vulnerability_window_days() -> int:
+    doc = compliance_settings_col.find_one(
+        {"_id": "global"}, {"vulnerability_window_days": 1}
+    ) or {}
+    try:
+        return int(doc.get("vulnerability_window_days") or VULNERABILITY_WINDOW_DAYS)
+    except (TypeError, ValueError):
+        return VULNERABILITY_WINDOW_DAYS
 
-        # Build stored document
-        doc = {
-            "user_id": user_id_str,
-            "username": user_doc.get("username"),
-            "email": user_doc.get("email"),
-            "fullName": user_doc.get("fullName"),
-            "percent_income_left": round(percent_left, 2),
-            "total_income": round(total_income, 2),
-            "total_expenses": round(total_expenses, 2),
-            "net_amount": round(net, 2),
-            "current_balance": float(acct.get("current_balance") or 0.0),
-            "risk_level": risk_level,
-            "computed_at": datetime.utcnow(),
-        }
 
-        # Upsert into financially_vulnerable_users so we have a
-        # persistent snapshot collection regulators/advisors can query.
-        financially_vulnerable_col.update_one(
-            {"user_id": user_id_str},
-            {"$set": doc},
-            upsert=True,
+def _rescore_user_vulnerability(user_id: str):
+    """
+    Recompute one user's entry in financially_vulnerable_users (and their
+    advisor link priority) after their transactions changed, over the
+    window of the last scan. Prefers Plaid rollups for the window, falls
+    back to manual entries. Errors are
+    logged, never raised, so a sync or entry save is never failed by it.
+    """
+    try:
+        user_doc = users_col.find_one(
+            {"_id": ObjectId(user_id)},
+            {"username": 1, "email": 1, "fullName": 1},
         )
+        if not user_doc:
+            return
 
-        # Update advisor priority for any accepted advisor-client links
-        clients_col.update_many(
-            {"user_id": user_obj_id, "status": "Accepted"},
-            {"$set": {"priority": risk_level}}
+        window_days = _vulnerability_window_days()
+        since = datetime.utcnow().date() - timedelta(days=window_days)
+        bank_doc = bank_accounts_col.find_one(
+            {"user_id": user_id}, {"current_balance": 1, "rollups_built_at": 1}
         )
-
-        vulnerable_results.append(doc)
-
-    return jsonify({
-        "ok": True,
-        "window_days": days,
-        "scanned_accounts": scanned_accounts,
-        "vulnerable_count": len(vulnerable_results),
-        "vulnerable_users": vulnerable_results,
-    })
+        totals = None
+        if bank_doc:
+            if not bank_doc.get("rollups_built_at"):
+                rebuild_daily_rollups(user_id)
+            totals = window_totals(daily_rollups_col, since, user_id=user_id).get(user_id)
+        if not totals:
+            totals = manual_window_totals(entries_col, since, user_id=user_id).get(user_id)
+
+        rescore_user(
+            user_doc,
+            totals,
+            (bank_doc or {}).get("current_balance"),
+            clients_col,
+            financially_vulnerable_col,
+            window_days,
+        )
+    except Exception as e:
+        print("VULNERABILITY RESCORE ERROR:", user_id, e)
 
 @app.route("/api/compliance/financially_vulnerable", methods=["GET"])
 @login_required
@@ -609,6 +1234,7 @@ def api_compliance_get_settings():
             "notify_critical": doc.get("notify_critical", True),
             "track_admin": doc.get("track_admin", True),
             "retention_days": doc.get("retention_days", 90),
+            **rule_settings(doc),
         }
     })
 
@@ -845,7 +1471,7 @@ def api_user_select_advisor():
 
     now = datetime.utcnow()
 
-    clients_col.insert_one({
+    link = {
         "user_id": user_obj_id,
         "advisor_id": advisor_obj_id,
         "priority": risk_level,
@@ -855,7 +1481,10 @@ def api_user_select_advisor():
         "permission_requested_at": now,
         "permission_updated_at": now,
         "budget_edit_status": "none",
-    })
+    }
+    if vuln_doc:
+        link["priority_source"] = PRIORITY_SOURCE_SCAN
+    clients_col.insert_one(link)
 
     user_doc = users_col.find_one({"_id": user_obj_id})
     user_name = user_doc.get("fullName", "A user") if user_doc else "A user"
@@ -878,50 +1507,92 @@ def api_user_select_advisor():
 # ============================================
 # API — FLAGGED USERS (aggregated by user)
 # ============================================
+RISK_SEVERITY = {"Critical": 4, "High": 3, "Medium": 2, "Low": 1}
+SEVERITY_RISK = {rank: name for name, rank in RISK_SEVERITY.items()}
+FLAGGED_USER_SORTS = {
+    "risk": "severity",
+    "count": "flagCount",
+    "last_activity": "lastActivity",
+}
+
+
 @app.route("/api/compliance/flagged_users")
 @login_required
 def api_flagged_users():
     if session.get("role") != "Compliance Regulator":
         return jsonify({"ok": False, "message": "Unauthorized"}), 403
 
+    page, page_size, skip = _pagination_args()
+    sort_field = FLAGGED_USER_SORTS.get(request.args.get("sort", "risk"), "severity")
+    direction = 1 if (request.args.get("order") or "desc").lower() == "asc" else -1
+    sort = {sort_field: direction}
+    # Stable tie-breakers so pages don't overlap
+    for field in ("severity", "lastActivity", "_id"):
+        sort.setdefault(field, -1)
+
     pipeline = [
         {
             "$group": {
                 "_id": "$transaction.user_id",
                 "flagCount": {"$sum": 1},
                 "lastActivity": {"$max": "$created_at"},
-                "risks": {"$push": "$risk"}
+                # Highest risk as a number, so it can be reduced with $max
+                "severity": {"$max": {"$switch": {
+                    "branches": [
+                        {"case": {"$eq": ["$risk", name]}, "then": rank}
+                        for name, rank in RISK_SEVERITY.items()
+                    ],
+                    "default": 1,
+                }}},
             }
-        }
+        },
+        {"$sort": sort},
+        {"$facet": {
+            "total": [{"$count": "n"}],
+            "page": [
+                {"$skip": skip},
+                {"$limit": page_size},
+                # user_id is stored as a string on the transaction
+                {"$addFields": {"user_oid": {"$convert": {
+                    "input": "$_id", "to": "objectId", "onError": None, "onNull": None,
+                }}}},
+                {"$lookup": {
+                    "from": users_col.name,
+                    "let": {"uid": "$user_oid"},
+                    "pipeline": [
+                        {"$match": {"$expr": {"$eq": ["$_id", "$$uid"]}}},
+                        {"$project": {"_id": 0, "fullName": 1, "email": 1}},
+                    ],
+                    "as": "user",
+                }},
+            ],
+        }},
     ]
 
-    raw = list(flagged_col.aggregate(pipeline))
+    result = next(flagged_col.aggregate(pipeline, allowDiskUse=True), {})
+    total = result["total"][0]["n"] if result.get("total") else 0
     output = []
 
-    for u in raw:
-        user_doc = users_col.find_one({"_id": ObjectId(u["_id"])}) if u["_id"] else None
-
-        # Determine highest-risk level
-        risks = u.get("risks", [])
-        if "Critical" in risks:
-            risk = "Critical"
-        elif "High" in risks:
-            risk = "High"
-        elif "Medium" in risks:
-            risk = "Medium"
-        else:
-            risk = "Low"
+    for u in result.get("page", []):
+        user_doc = u["user"][0] if u.get("user") else None
 
         output.append({
             "user_id": str(u["_id"]),
             "name": user_doc.get("fullName") if user_doc else "Unknown",
             "email": user_doc.get("email") if user_doc else "Unknown",
             "flagged_transactions": u["flagCount"],
-            "risk": risk,
+            "risk": SEVERITY_RISK.get(u["severity"], "Low"),
             "last_activity": u["lastActivity"].isoformat() if u["lastActivity"] else None
         })
 
-    return jsonify({"ok": True, "users": output})
+    return jsonify({
+        "ok": True,
+        "users": output,
+        "total_users": total,
+        "page": page,
+        "page_size": page_size,
+        "has_more": skip + page_size < total,
+    })
 
 
 @app.route("/advisor_dashboard")
@@ -968,31 +1639,24 @@ def build_budget_prompt(user_id: str, user_message: str, max_transactions: int =
         or "the user"
     )
 
-    # Try Plaid first
-    bank_doc = bank_accounts_col.find_one({"user_id": user_id})
+    # Try Plaid first (same 30-day window the bank snapshot shows)
+    since = datetime.utcnow().date() - timedelta(days=RECENT_TRANSACTION_DAYS)
+    txs = _load_transactions(user_id, since=since, newest_first=True)
     tx_lines: list[str] = []
     total_income = 0.0
     total_expenses = 0.0
 
-    if bank_doc and bank_doc.get("recent_transactions"):
-        txs = bank_doc["recent_transactions"]
-
+    if txs:
         # Compute totals
         for tx in txs:
-            amount = float(tx.get("amount") or 0)
-            name = tx.get("name", "")
-            cat = tx.get("category", "Other")
-            is_income = _classify_direction(name, cat)
-
-            signed = amount if is_income else -amount
+            signed = tx["signed_amount"]
             if signed >= 0:
                 total_income += signed
             else:
                 total_expenses += abs(signed)
 
-        # Most recent first, limit to max_transactions
-        txs_sorted = sorted(txs, key=lambda x: x.get("date", ""), reverse=True)[:max_transactions]
-        for tx in txs_sorted:
+        # Already most recent first, limit to max_transactions
+        for tx in txs[:max_transactions]:
             tx_lines.append(
                 f"{tx.get('date')} | {tx.get('name')} | {tx.get('category')} | {tx.get('amount')}"
             )
@@ -1116,18 +1780,17 @@ def build_ai_budget_context(user_id: str, lookback_days: int = 30, max_transacti
         or "the user"
     )
 
-    bank_doc = bank_accounts_col.find_one({"user_id": user_id})
     total_income = 0.0
     total_expenses = 0.0
     tx_lines = []
 
     # Prefer Plaid-connected data
-    if bank_doc and bank_doc.get("recent_transactions"):
+    if _has_transactions(user_id):
         cutoff = datetime.utcnow().date() - timedelta(days=lookback_days)
 
         # Reuse your plaid summary builder
         try:
-            summary = _build_plaid_summary(bank_doc["recent_transactions"], cutoff)
+            summary = _build_plaid_summary(_load_transactions(user_id, since=cutoff), cutoff)
         except Exception:
             summary = {"income": [], "expenses": [], "transactions": []}
 
@@ -1352,52 +2015,201 @@ def api_advisor_clients():
 
     return jsonify(output)
 
+# ---------------------------
+# REPORT CACHE
+# ---------------------------
+#
+# Generated CSV/PDF exports are kept on disk keyed by a hash of the report
+# parameters and a data version of the collections they read. The key is
+# also the ETag, so repeat downloads are served from disk or answered 304.
+
+report_cache = ReportCache()
+
+
+def _newest(col, field: str):
+    doc = col.find_one({field: {"$exists": True}}, {field: 1}, sort=[(field, DESCENDING)])
+    return doc.get(field) if doc else None
+
+
+def _flagged_data_version():
+    # Flags are only inserted or deleted (retention), never edited
+    return [flagged_col.estimated_document_count(), _newest(flagged_col, "created_at")]
+
+
+def _transactions_data_version():
+    # The PDF also shows each account's user email (users.updated_at is set
+    # by profile updates)
+    return [
+        bank_transactions_col.estimated_document_count(),
+        _newest(bank_transactions_col, "updated_at"),
+        bank_accounts_col.estimated_document_count(),
+        _newest(bank_accounts_col, "updated_at"),
+        users_col.estimated_document_count(),
+        _newest(users_col, "updated_at"),
+    ]
+
+
+def _not_modified(key: str):
+    response = Response(status=304)
+    response.set_etag(key)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def _send_cached_report(path: str, key: str, mimetype: str, download_name: str):
+    response = send_file(
+        path,
+        mimetype=mimetype,
+        as_attachment=True,
+        download_name=download_name,
+        etag=key,
+        max_age=0,
+    )
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+# Fixed export schema; transaction.* is flattened into the row
+FLAGGED_CSV_COLUMNS = [
+    "flag_id", "created_at", "risk", "reasons", "reported",
+    "user_id", "transaction_id", "name", "amount", "date", "category",
+]
+FLAGGED_CSV_PROJECTION = {
+    "created_at": 1, "risk": 1, "reasons": 1, "reported": 1,
+    "transaction.user_id": 1, "transaction.transaction_id": 1,
+    "transaction.name": 1, "transaction.amount": 1,
+    "transaction.date": 1, "transaction.category": 1,
+}
+EXPORT_BATCH_SIZE = 1000
+
+
+def _flagged_export_filters(args) -> dict:
+    """
+    start/end (YYYY-MM-DD, inclusive, on created_at) and risk (comma
+    separated levels) from query args. Raises ValueError on bad input.
+    """
+    filters = {}
+    for key in ("start", "end"):
+        raw = (args.get(key) or "").strip()
+        if raw:
+            if _parse_tx_date(raw) is None:
+                raise ValueError(f"Invalid {key} date")
+            filters[key] = raw
+    risks = [r.strip().title() for r in (args.get("risk") or "").split(",") if r.strip()]
+    unknown = [r for r in risks if r not in RISK_SEVERITY]
+    if unknown:
+        raise ValueError(f"Unknown risk level: {', '.join(unknown)}")
+    if risks:
+        filters["risk"] = ",".join(risks)
+    return filters
+
+
+def _flagged_export_query(filters: dict | None) -> dict:
+    filters = filters or {}
+    query = {}
+    created = {}
+    if filters.get("start"):
+        created["$gte"] = _parse_tx_date(filters["start"])
+    if filters.get("end"):
+        created["$lt"] = _parse_tx_date(filters["end"]) + timedelta(days=1)
+    if created:
+        query["created_at"] = created
+    if filters.get("risk"):
+        query["risk"] = {"$in": filters["risk"].split(",")}
+    return query
+
+
+def _flagged_csv_row(doc: dict) -> list:
+    tx = doc.get("transaction") or {}
+    created_at = doc.get("created_at")
+    reasons = doc.get("reasons") or []
+    return [
+        str(doc["_id"]),
+        created_at.isoformat() if isinstance(created_at, datetime) else created_at,
+        doc.get("risk"),
+        "; ".join(reasons) if isinstance(reasons, list) else reasons,
+        bool(doc.get("reported")),
+        tx.get("user_id"),
+        tx.get("transaction_id"),
+        tx.get("name"),
+        tx.get("amount"),
+        tx.get("date"),
+        tx.get("category"),
+    ]
+
+
+def _iter_flagged_csv(filters: dict | None = None, batch_size: int = EXPORT_BATCH_SIZE):
+    """
+    Yield the flagged-activity CSV in chunks of about `batch_size` rows,
+    newest first, reading a batched cursor so memory stays flat.
+    """
+    buf = StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(FLAGGED_CSV_COLUMNS)
+
+    cursor = flagged_col.find(
+        _flagged_export_query(filters), FLAGGED_CSV_PROJECTION, batch_size=batch_size
+    ).sort("created_at", DESCENDING)
+    rows = 0
+    for doc in cursor:
+        writer.writerow(_flagged_csv_row(doc))
+        rows += 1
+        if rows % batch_size == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+def _write_flagged_csv(out, filters: dict | None = None):
+    """Write the flagged activities matching `filters` as CSV to the text file object `out`."""
+    for chunk in _iter_flagged_csv(filters):
+        out.write(chunk)
+
+
 @app.route("/api/compliance/export_csv")
 @login_required
 def api_export_csv():
-    import csv
-    from io import StringIO
-
+    """
+    Flagged activities as CSV, streamed. Optional filters: ?start=&end=
+    (YYYY-MM-DD, on the flag date) and ?risk=High,Critical.
+    """
     # Only regulators or advisors
     if session.get("role") not in ["Compliance Regulator", "Financial Advisor"]:
         return jsonify({"ok": False, "message": "Unauthorized"}), 403
 
-    # Pull all flagged activities from DB
-    flagged = list(flagged_col.find({}))  # OR wherever your flags are stored
-
-    # Create CSV buffer
-    csv_buffer = StringIO()
-
-    # If NO data → return empty CSV with a placeholder header
-    if not flagged:
-        writer = csv.writer(csv_buffer)
-        writer.writerow(["message"])
-        writer.writerow(["No flagged activities available"])
-    else:
-        # Use keys from first document
-        fieldnames = list(flagged[0].keys())
+    try:
+        filters = _flagged_export_filters(request.args)
+    except ValueError as e:
+        return jsonify({"ok": False, "message": str(e)}), 400
 
-        writer = csv.DictWriter(csv_buffer, fieldnames=fieldnames)
-        writer.writeheader()
+    if _wants_async():
+        return _enqueue_job("export_csv", filters)
 
-        for item in flagged:
-            writer.writerow(item)
+    key = report_cache.key("flagged_csv", filters, _flagged_data_version())
+    if request.if_none_match.contains(key):
+        return _not_modified(key)
 
-    csv_buffer.seek(0)
+    path = report_cache.get(key, ".csv")
+    if path:
+        return _send_cached_report(path, key, "text/csv", "flagged_activities.csv")
 
-    return Response(
-        csv_buffer.getvalue(),
+    response = Response(
+        stream_with_context(report_cache.build_stream(key, ".csv", _iter_flagged_csv(filters))),
         mimetype="text/csv",
         headers={
             "Content-Disposition": "attachment; filename=flagged_activities.csv"
         }
     )
+    response.set_etag(key)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
 
 def compute_simplified_flows(user_id: str, max_items: int = 50):
     """
     Return totals + separate lists of income and expenses for the user.
 
-    Prefers Plaid (bank_accounts_col.recent_transactions), falls back to manual entries.
+    Prefers Plaid (bank_transactions, last RECENT_TRANSACTION_DAYS days), falls back to manual entries.
     Each list is capped at max_items, ordered from most recent to oldest.
     """
     income_streams = []
@@ -1406,28 +2218,22 @@ def compute_simplified_flows(user_id: str, max_items: int = 50):
     total_expense = 0.0
 
     # -------- PLAID FIRST --------
-    bank_doc = bank_accounts_col.find_one({"user_id": user_id})
-    if bank_doc and bank_doc.get("recent_transactions"):
-        txs = bank_doc["recent_transactions"]
-
-        # Sort newest first
-        txs_sorted = sorted(txs, key=lambda x: x.get("date", ""), reverse=True)
+    since = datetime.utcnow().date() - timedelta(days=RECENT_TRANSACTION_DAYS)
+    txs_sorted = _load_transactions(user_id, since=since, newest_first=True)
+    if txs_sorted:
 
         for tx in txs_sorted:
             amount = float(tx.get("amount") or 0)
-            name = tx.get("name", "")
-            cat = tx.get("category", "Other")
-            is_income = _classify_direction(name, cat)
 
             item = {
                 "date": tx.get("date"),
-                "name": name,
-                "category": cat,
+                "name": tx.get("name", ""),
+                "category": tx["canonical_category"],
                 "amount": amount,
                 "transaction_id": tx.get("transaction_id"),
             }
 
-            if is_income:
+            if tx["is_income"]:
                 total_income += amount
                 if len(income_streams) < max_items:
                     income_streams.append(item)
@@ -1552,7 +2358,21 @@ def api_simplified_summary():
     if not user_id:
         return jsonify({"ok": False, "message": "Not logged in"}), 401
 
-    flows = compute_simplified_flows(user_id, max_items=50)
+    since = datetime.utcnow().date() - timedelta(days=RECENT_TRANSACTION_DAYS)
+    rollups = _load_daily_rollups(user_id, since=since)
+    if rollups:
+        totals = _rollup_totals(rollups)
+        flows = {
+            "source": "plaid",
+            "total_income": round(totals["flow_income"], 2),
+            "total_expense": round(totals["flow_expense"], 2),
+            "income_streams_count": min(totals["income_count"], 50),
+            "expense_streams_count": min(totals["expense_count"], 50),
+        }
+    else:
+        flows = compute_simplified_flows(user_id, max_items=50)
+        flows["income_streams_count"] = len(flows["income_streams"])
+        flows["expense_streams_count"] = len(flows["expense_streams"])
 
     total_income = flows["total_income"]
     total_expense = flows["total_expense"]
@@ -1569,85 +2389,230 @@ def api_simplified_summary():
         "net_income": round(net_income, 2),
         "savings_target": round(savings_target, 2),
         # helpful extra fields for your simplified_dashboard later
-        "income_streams_count": len(flows["income_streams"]),
-        "expense_streams_count": len(flows["expense_streams"]),
+        "income_streams_count": flows["income_streams_count"],
+        "expense_streams_count": flows["expense_streams_count"],
     })
 
-@app.route("/api/compliance/export_pdf")
-@login_required
-def api_export_pdf():
-    from io import BytesIO
-    from reportlab.lib.pagesizes import letter
-    from reportlab.lib.styles import getSampleStyleSheet
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-    from reportlab.lib import colors
-    from reportlab.lib.units import inch
+REPORT_ACCOUNT_BATCH = 200
+REPORT_TX_PROJECTION = {"_id": 0, "date": 1, "name": 1, "category": 1, "amount": 1}
+REPORT_COLUMNS = [("Date", 70), ("Description", 250), ("Category", 120), ("Amount", 70)]
 
-    # Role check
-    if session.get("role") not in ["Compliance Regulator", "Financial Advisor"]:
-        return jsonify({"ok": False, "message": "Unauthorized"}), 403
 
-    # Fetch all accounts
-    all_docs = list(bank_accounts_col.find({}))
+def _report_filters(args) -> dict:
+    """
+    user_id, start/end (YYYY-MM-DD, inclusive, on the transaction date) and
+    min_amount (absolute value) from query args. Raises ValueError on bad input.
+    """
+    filters = {}
+    user_id = (args.get("user_id") or "").strip()
+    if user_id:
+        filters["user_id"] = user_id
+    for key in ("start", "end"):
+        raw = (args.get(key) or "").strip()
+        if raw:
+            parsed = _parse_tx_date(raw)
+            if parsed is None:
+                raise ValueError(f"Invalid {key} date")
+            filters[key] = parsed.date().isoformat()
+    raw_min = (args.get("min_amount") or "").strip()
+    if raw_min:
+        try:
+            filters["min_amount"] = abs(float(raw_min))
+        except ValueError:
+            raise ValueError("Invalid min_amount")
+    return filters
+
 
-    # PDF buffer
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    styles = getSampleStyleSheet()
-    flow = []
+def _report_transactions(user_id: str, filters: dict, legacy: bool = False):
+    """
+    Matching transactions for one user, oldest first, streamed from
+    bank_transactions. legacy=True (the account still has the embedded
+    recent_transactions array, i.e. has not been migrated) reads that array
+    instead when the collection has no matching rows.
+    """
+    query = {"user_id": user_id}
+    dates = {}
+    if filters.get("start"):
+        dates["$gte"] = filters["start"]
+    if filters.get("end"):
+        dates["$lte"] = filters["end"]
+    if dates:
+        query["date"] = dates
+    if filters.get("min_amount"):
+        m = filters["min_amount"]
+        query["$or"] = [{"amount": {"$gte": m}}, {"amount": {"$lte": -m}}]
+
+    cursor = bank_transactions_col.find(
+        query, REPORT_TX_PROJECTION, batch_size=EXPORT_BATCH_SIZE
+    ).sort("date", ASCENDING)
+    streamed = False
+    for tx in cursor:
+        streamed = True
+        yield tx
+    if streamed or not legacy:
+        return
 
-    # Title
-    flow.append(Paragraph("<b>BudgetMind AI — System Transaction Report</b>", styles["Title"]))
-    flow.append(Spacer(1, 0.2 * inch))
+    since = date.fromisoformat(filters["start"]) if filters.get("start") else None
+    for tx in _load_transactions(user_id, since=since, projection=REPORT_TX_PROJECTION):
+        if filters.get("end") and str(tx.get("date", "")) > filters["end"]:
+            continue
+        if filters.get("min_amount") and abs(float(tx.get("amount") or 0)) < filters["min_amount"]:
+            continue
+        yield tx
 
-    # Loop accounts
-    for acct in all_docs:
-        user_id = acct.get("user_id")
-        user_doc = None
 
-        if user_id:
+def _report_row(tx: dict) -> tuple:
+    amount = tx.get("amount") or 0
+    return (
+        str(tx.get("date", ""))[:10],
+        tx.get("name", ""),
+        tx.get("category", ""),
+        f"${amount:,.2f}",
+    )
+
+
+def _write_transaction_report_pdf(out, filters: dict | None = None, progress=None):
+    """
+    Build the system transaction report into the binary file object `out`,
+    one section per connected account, transactions drawn as page-sized
+    tables. progress(pct, message) is called once per account batch when given.
+    """
+    from pdf_report import TableReport
+
+    filters = filters or {}
+    account_query = {"user_id": filters["user_id"]} if filters.get("user_id") else {}
+    total = bank_accounts_col.count_documents(account_query)
+
+    report = TableReport(out, "BudgetMind AI — System Transaction Report", REPORT_COLUMNS)
+    applied = [f"{k}: {v}" for k, v in filters.items()]
+    if applied:
+        report.note("Filters — " + ", ".join(applied))
+
+    accounts = bank_accounts_col.find(
+        account_query,
+        # One embedded row is enough to tell unmigrated accounts apart
+        {"_id": 0, "user_id": 1, "current_balance": 1, "recent_transactions": {"$slice": 1}},
+        batch_size=REPORT_ACCOUNT_BATCH,
+    )
+    done = 0
+    for batch in chunked(accounts, REPORT_ACCOUNT_BATCH):
+        if progress and total:
+            # Leave the last 5% for saving the file
+            progress(95 * done / total, f"Account {done + 1} of {total}")
+
+        oids = []
+        for acct in batch:
             try:
-                user_doc = users_col.find_one({"_id": ObjectId(user_id)})
-            except:
-                user_doc = None
+                oids.append(ObjectId(acct.get("user_id")))
+            except Exception:
+                continue
+        emails = {
+            str(u["_id"]): u.get("email")
+            for u in users_col.find({"_id": {"$in": oids}}, {"email": 1})
+        } if oids else {}
+
+        for acct in batch:
+            user_id = acct.get("user_id")
+            report.section(
+                f"User: {emails.get(user_id) or 'Unknown'}",
+                f"Balance: ${float(acct.get('current_balance') or 0):,.2f}",
+            )
+            written = report.rows(
+                _report_row(tx) for tx in _report_transactions(
+                    user_id, filters, legacy=bool(acct.get("recent_transactions"))
+                )
+            ) if user_id else 0
+            if not written:
+                report.note("No transactions available.")
+        done += len(batch)
 
-        email = user_doc["email"] if user_doc else "Unknown"
+    if progress:
+        progress(95, "Saving PDF")
+    report.close()
+
+
+@app.route("/api/compliance/export_pdf")
+@login_required
+def api_export_pdf():
+    """
+    System transaction report as PDF. Optional filters: ?user_id=,
+    ?start=&end= (YYYY-MM-DD, on the transaction date) and ?min_amount=.
+    The PDF is written to a temporary file and streamed from disk.
+    """
+    # Role check
+    if session.get("role") not in ["Compliance Regulator", "Financial Advisor"]:
+        return jsonify({"ok": False, "message": "Unauthorized"}), 403
 
-        # User header
-        flow.append(Paragraph(f"<b>User:</b> {email}", styles["Heading3"]))
-        flow.append(Paragraph(f"<b>Balance:</b> ${acct.get('current_balance', 0):,.2f}", styles["Normal"]))
-        flow.append(Spacer(1, 0.15 * inch))
+    try:
+        filters = _report_filters(request.args)
+    except ValueError as e:
+        return jsonify({"ok": False, "message": str(e)}), 400
 
-        txs = acct.get("recent_transactions", [])
+    if _wants_async():
+        return _enqueue_job("export_pdf", filters)
 
-        if not txs:
-            flow.append(Paragraph("<i>No transactions available.</i>", styles["Italic"]))
-            flow.append(Spacer(1, 0.2 * inch))
-            continue
+    key = report_cache.key("transaction_pdf", filters, _transactions_data_version())
+    if request.if_none_match.contains(key):
+        return _not_modified(key)
 
-        # Transactions
-        for tx in txs:
-            date = tx.get("date", "")
-            name = tx.get("name", "")
-            cat = tx.get("category", "")
-            amt = tx.get("amount", 0)
+    path = report_cache.get(key, ".pdf")
+    if not path:
+        try:
+            path = report_cache.build(
+                key, ".pdf", lambda out: _write_transaction_report_pdf(out, filters)
+            )
+        except Exception as e:
+            print("EXPORT PDF ERROR:", e)
+            return jsonify({"ok": False, "message": "Could not build report"}), 500
+
+    return _send_cached_report(path, key, "application/pdf", "transaction_report.pdf")
+
+@app.cli.command("export-transactions")
+@click.argument("out")
+@click.option("--since", default=None, help="Only rows updated after this ISO timestamp (UTC unless it has an offset).")
+@click.option("--incremental", is_flag=True, help="Continue from (and advance) the stored watermark, re-reading EXPORT_WATERMARK_LAG_SECONDS before it.")
+@click.option("--user-id", default=None, help="Only this user's transactions.")
+@click.option("--batch-size", default=5000, show_default=True)
+def export_transactions_command(out, since, incremental, user_id, batch_size):
+    """
+    Dump stored transactions to gzip NDJSON at OUT (a file, or a directory
+    to get a timestamped file name).
+    """
+    started_at = datetime.utcnow()
+    if os.path.isdir(out):
+        out = os.path.join(out, f"transactions-{started_at:%Y%m%dT%H%M%S}.ndjson.gz")
 
-            # ALL ASCII OR UNICODE SAFE reportlab never crashes
-            line = f"{date} — {name} — {cat} — ${amt:,.2f}"
+    state_id = f"bank_transactions:{user_id}" if user_id else "bank_transactions"
+    if since:
+        try:
+            since = parse_timestamp(since)
+        except ValueError:
+            raise click.BadParameter("expected an ISO timestamp", param_hint="--since")
+    elif incremental:
+        state = export_watermarks_col.find_one({"_id": state_id}) or {}
+        since = state.get("watermark")
+
+    result = export_transactions(
+        bank_transactions_col, out,
+        since=since, until=started_at, user_id=user_id, batch_size=batch_size,
+        overlap=EXPORT_WATERMARK_OVERLAP if incremental else None,
+    )
 
-            flow.append(Paragraph(line, styles["Normal"]))
-        
-        flow.append(Spacer(1, 0.3 * inch))
+    if incremental and result["watermark"]:
+        export_watermarks_col.update_one(
+            {"_id": state_id},
+            {"$set": {
+                "watermark": result["watermark"],
+                "last_path": result["path"],
+                "last_rows": result["rows"],
+                "exported_at": started_at,
+            }},
+            upsert=True,
+        )
 
-    doc.build(flow)
-    buffer.seek(0)
+    watermark = result["watermark"].isoformat() if result["watermark"] else "none"
+    click.echo(f"Exported {result['rows']} transaction(s) to {result['path']} (watermark {watermark}).")
 
-    return send_file(
-        buffer,
-        mimetype="application/pdf",
-        as_attachment=True,
-        download_name="transaction_report.pdf"
-    )
 
 @app.route("/advisor_priority")
 @login_required
@@ -1696,29 +2661,18 @@ def api_check_overspending():
         cutoff = now - timedelta(days=365)
 
     # Fetch Plaid data
-    bank_doc = bank_accounts_col.find_one({"user_id": client_user_id})
-    if not bank_doc:
+    if not bank_accounts_col.find_one({"user_id": client_user_id}, {"_id": 1}):
         return jsonify({"ok": True, "overspending": False, "reason": "No bank data"})
 
-    txs = bank_doc.get("recent_transactions", [])
+    txs = _load_transactions(client_user_id, since=cutoff)
     total_spent = 0.0
 
     for tx in txs:
-        d_str = tx.get("date")
-        try:
-            d = datetime.fromisoformat(d_str).date()
-            if d < cutoff:
-                continue
-        except Exception:
+        # Rows are already filtered to the window; unparseable dates are skipped
+        if tx["posted_date"] is None:
             continue
-
-        amt = float(tx.get("amount", 0))
-        name = tx.get("name", "")
-        cat = tx.get("category", "")
-
-        is_income = _classify_direction(name, cat)
-        if not is_income:
-            total_spent += abs(amt)
+        if not tx["is_income"]:
+            total_spent += abs(tx["signed_amount"])
 
     # Spending limit (default = 1000)
     user_doc = users_col.find_one({"_id": link["user_id"]})
@@ -2161,7 +3115,7 @@ def advisor_set_priority():
     try:
         result = clients_col.update_one(
             {"_id": client_obj_id, "advisor_id": advisor_id},
-            {"$set": {"priority": priority}}
+            {"$set": {"priority": priority, "priority_source": PRIORITY_SOURCE_ADVISOR}}
         )
 
         if result.modified_count == 0:
@@ -2410,6 +3364,45 @@ def api_client_budget_limit_requests_respond():
 # BANK / PLAID API ENDPOINTS
 # ---------------------------
 
+BANK_REFRESH_ENABLED = os.getenv("BANK_REFRESH_ENABLED", "1") != "0"
+BANK_REFRESH_INTERVAL_SECONDS = int(os.getenv("BANK_REFRESH_INTERVAL_SECONDS", "600"))
+BANK_REFRESH_JITTER_SECONDS = int(os.getenv("BANK_REFRESH_JITTER_SECONDS", "120"))
+BANK_REFRESH_WORKERS = int(os.getenv("BANK_REFRESH_WORKERS", "4"))
+
+
+def _refresh_bank_doc(doc: dict) -> dict:
+    """
+    Pull fresh balances + transaction deltas from Plaid for one connected
+    item and store them. Used by the background refresher and as the inline
+    fallback when the refresher is not running (tests, BANK_REFRESH_ENABLED=0).
+    """
+    fetched = refresh_bank_item(doc["access_token"], doc.get("transactions_cursor"))
+
+    total_balance = _compute_total_balance(fetched["balances"])
+    return _apply_transaction_sync(doc, fetched["transactions"], {
+        "current_balance": float(total_balance),
+        "last_refreshed_at": datetime.utcnow(),
+        "last_refresh_timings_ms": fetched["timings_ms"],
+        "last_refresh_error": None,
+    })
+
+
+bank_refresher = BankRefreshScheduler(
+    bank_accounts_col,
+    _refresh_bank_doc,
+    interval_seconds=BANK_REFRESH_INTERVAL_SECONDS,
+    jitter_seconds=BANK_REFRESH_JITTER_SECONDS,
+    max_workers=BANK_REFRESH_WORKERS,
+)
+
+
+@app.before_request
+def start_bank_refresher():
+    # Started lazily so every gunicorn worker gets its own scheduler after fork.
+    if BANK_REFRESH_ENABLED and not app.testing:
+        bank_refresher.start()
+
+
 @app.route("/api/bank/connect-sandbox", methods=["POST"])
 @login_required
 def api_bank_connect_sandbox():
@@ -2427,11 +3420,14 @@ def api_bank_connect_sandbox():
         access_token = sandbox_creds["access_token"]
         item_id = sandbox_creds["item_id"]
 
-        balances_raw = get_current_balances(access_token)
-        tx_raw = get_recent_transactions(access_token, days=30, count=100)
+        now = datetime.utcnow()
+        # New item -> first sync, Plaid hands back the full history as "added"
+        fetched = refresh_bank_item(access_token)
+        sync = fetched["transactions"]
 
-        total_balance = _compute_total_balance(balances_raw)
-        recent_tx = _simplify_transactions(tx_raw)
+        total_balance = _compute_total_balance(fetched["balances"])
+        recent_tx = _simplify_transactions({"transactions": sync["added"] + sync["modified"]})
+        _write_transaction_rows(user_id, recent_tx, replace=True)
 
         bank_accounts_col.update_one(
             {"user_id": user_id},
@@ -2441,17 +3437,25 @@ def api_bank_connect_sandbox():
                 "access_token": access_token,
                 "item_id": item_id,
                 "current_balance": float(total_balance),
-                "recent_transactions": recent_tx,
-                "updated_at": datetime.utcnow(),
-            }},
+                "transactions_cursor": sync["next_cursor"],
+                "transaction_count": len(recent_tx),
+                "rollups_built_at": now,
+                "updated_at": now,
+                "last_refreshed_at": now,
+                "last_viewed_at": now,
+                "last_refresh_timings_ms": fetched["timings_ms"],
+                "next_refresh_at": now + timedelta(seconds=BANK_REFRESH_INTERVAL_SECONDS),
+            },
+             "$unset": {"recent_transactions": ""}},
             upsert=True,
         )
+        _rescore_user_vulnerability(user_id)
 
         return jsonify({
             "ok": True,
             "connected": True,
             "current_balance": float(total_balance),
-            "recent_transactions": recent_tx
+            "recent_transactions": _recent_transactions(user_id)
         })
 
     except Exception as e:
@@ -2462,6 +3466,13 @@ def api_bank_connect_sandbox():
 @app.route("/api/bank/status")
 @login_required
 def api_bank_status():
+    """
+    Serve the stored bank snapshot plus how stale it is.
+
+    Plaid is not called here: the background refresher keeps connected items
+    fresh. Viewing the status marks the item as active and, if the snapshot
+    is overdue, pulls its next refresh forward.
+    """
     user_id = session.get("user_id")
     doc = bank_accounts_col.find_one({"user_id": user_id})
 
@@ -2473,38 +3484,45 @@ def api_bank_status():
         bank_accounts_col.delete_one({"_id": doc["_id"]})
         return jsonify({"ok": True, "connected": False})
 
-    try:
-        balances_raw = get_current_balances(access_token)
-        tx_raw = get_recent_transactions(access_token, days=30, count=100)
+    now = datetime.utcnow()
+    payload = {"ok": True, "connected": True}
 
-        total_balance = _compute_total_balance(balances_raw)
-        recent_tx = _simplify_transactions(tx_raw)
+    if not bank_refresher.is_running():
+        # No background worker in this process -> refresh inline as before.
+        try:
+            _refresh_bank_doc(doc)
+            doc = bank_accounts_col.find_one({"_id": doc["_id"]}) or doc
+        except Exception as e:
+            print("BANK STATUS ERROR:", e)
+            payload["warning"] = "Failed refresh – using cached"
+    else:
+        # Only touch last_viewed_at about once a minute to keep writes down.
+        bank_accounts_col.update_one(
+            {"_id": doc["_id"], "$or": [
+                {"last_viewed_at": {"$lt": now - timedelta(seconds=60)}},
+                {"last_viewed_at": {"$exists": False}},
+            ]},
+            {"$set": {"last_viewed_at": now}},
+        )
 
-        update = {
-            "current_balance": float(total_balance),
-            "recent_transactions": recent_tx,
-            "updated_at": datetime.utcnow(),
-        }
+    last_refreshed = doc.get("last_refreshed_at") or doc.get("updated_at")
+    staleness = (now - last_refreshed).total_seconds() if isinstance(last_refreshed, datetime) else None
 
-        bank_accounts_col.update_one({"_id": doc["_id"]}, {"$set": update})
-        doc.update(update)
+    if bank_refresher.is_running() and (
+        staleness is None or staleness > BANK_REFRESH_INTERVAL_SECONDS + BANK_REFRESH_JITTER_SECONDS
+    ):
+        bank_refresher.schedule_now(doc["_id"])
 
-        return jsonify({
-            "ok": True,
-            "connected": True,
-            "current_balance": doc["current_balance"],
-            "recent_transactions": doc["recent_transactions"],
-        })
+    payload.update({
+        "current_balance": doc.get("current_balance"),
+        "recent_transactions": _recent_transactions(user_id),
+        "last_refreshed_at": last_refreshed.isoformat() if isinstance(last_refreshed, datetime) else None,
+        "staleness_seconds": round(staleness, 1) if staleness is not None else None,
+    })
+    if doc.get("last_refresh_error"):
+        payload["refresh_error"] = doc["last_refresh_error"]
 
-    except Exception as e:
-        print("BANK STATUS ERROR:", e)
-        return jsonify({
-            "ok": True,
-            "connected": True,
-            "current_balance": doc.get("current_balance"),
-            "recent_transactions": doc.get("recent_transactions", []),
-            "warning": "Failed refresh – using cached",
-        })
+    return jsonify(payload)
 
 
 @app.route("/api/bank/disconnect", methods=["POST"])
@@ -2512,6 +3530,8 @@ def api_bank_status():
 def api_bank_disconnect():
     user_id = session.get("user_id")
     bank_accounts_col.delete_one({"user_id": user_id})
+    bank_transactions_col.delete_many({"user_id": user_id})
+    daily_rollups_col.delete_many({"user_id": user_id})
     return jsonify({"ok": True, "connected": False})
 
 
@@ -2525,7 +3545,18 @@ def api_compliance_plaid_overview():
     if session.get("role") != "Compliance Regulator":
         return jsonify({"ok": False, "message": "Unauthorized"}), 403
 
-    accounts = list(bank_accounts_col.find({}))
+    # Count rows server-side; legacy docs still carry the embedded array
+    accounts = list(bank_accounts_col.aggregate([
+        {"$project": {
+            "user_id": 1,
+            "current_balance": 1,
+            "updated_at": 1,
+            "transaction_count": {"$ifNull": [
+                "$transaction_count",
+                {"$size": {"$ifNull": ["$recent_transactions", []]}},
+            ]},
+        }},
+    ]))
     overview = []
     total_balance = 0.0
 
@@ -2551,7 +3582,7 @@ def api_compliance_plaid_overview():
                 if isinstance(doc.get("updated_at"), datetime)
                 else None
             ),
-            "num_recent_transactions": len(doc.get("recent_transactions", [])),
+            "num_recent_transactions": doc.get("transaction_count", 0),
         })
 
     return jsonify({
@@ -2575,6 +3606,8 @@ def api_user_delete_bank_data():
 
     # Delete Plaid connection & cached transactions
     bank_result = bank_accounts_col.delete_many({"user_id": user_id})
+    rows_result = bank_transactions_col.delete_many({"user_id": user_id})
+    daily_rollups_col.delete_many({"user_id": user_id})
 
     # Delete compliance mirror of this user's transactions (if any)
     tx_result = transactions_col.delete_many({"user_id": user_id})
@@ -2584,6 +3617,7 @@ def api_user_delete_bank_data():
         "message": "Bank data deleted",
         "deleted": {
             "bank_accounts": bank_result.deleted_count,
+            "bank_transactions": rows_result.deleted_count,
             "compliance_transactions": tx_result.deleted_count,
         }
     })
@@ -2617,6 +3651,7 @@ def api_compliance_retention_bank_data():
 
     deleted = {
         "bank_accounts": 0,
+        "bank_transactions": 0,
         "compliance_transactions": 0,
     }
 
@@ -2629,9 +3664,12 @@ def api_compliance_retention_bank_data():
             return jsonify({"ok": False, "message": "user_id required for mode='user'"}), 400
 
         bank_res = bank_accounts_col.delete_many({"user_id": user_id})
+        rows_res = bank_transactions_col.delete_many({"user_id": user_id})
+        daily_rollups_col.delete_many({"user_id": user_id})
         tx_res = transactions_col.delete_many({"user_id": user_id})
 
         deleted["bank_accounts"] = bank_res.deleted_count
+        deleted["bank_transactions"] = rows_res.deleted_count
         deleted["compliance_transactions"] = tx_res.deleted_count
 
     # ---------------------------
@@ -2643,29 +3681,22 @@ def api_compliance_retention_bank_data():
         except (TypeError, ValueError):
             return jsonify({"ok": False, "message": "older_than_days must be an integer"}), 400
 
-        cutoff = datetime.utcnow() - timedelta(days=older_than_days)
-
-        # bank_accounts_col uses updated_at for freshness
-        bank_res = bank_accounts_col.delete_many({
-            "updated_at": {"$lt": cutoff}
-        })
-
-        # transactions_col also has updated_at
-        tx_res = transactions_col.delete_many({
-            "updated_at": {"$lt": cutoff}
-        })
+        if _wants_async(data):
+            return _enqueue_job("retention_age", {"older_than_days": older_than_days})
 
-        deleted["bank_accounts"] = bank_res.deleted_count
-        deleted["compliance_transactions"] = tx_res.deleted_count
+        deleted = _retention_delete_by_age(older_than_days)
 
     # ---------------------------
     # MODE: delete everything
     # ---------------------------
     elif mode == "all":
         bank_res = bank_accounts_col.delete_many({})
+        rows_res = bank_transactions_col.delete_many({})
+        daily_rollups_col.delete_many({})
         tx_res = transactions_col.delete_many({})
 
         deleted["bank_accounts"] = bank_res.deleted_count
+        deleted["bank_transactions"] = rows_res.deleted_count
         deleted["compliance_transactions"] = tx_res.deleted_count
 
     else:
@@ -2677,8 +3708,174 @@ def api_compliance_retention_bank_data():
         "deleted": deleted
     })
 
+def _retention_delete_by_age(older_than_days: int) -> dict:
+    """Delete bank data not refreshed in `older_than_days` days; returns counts."""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+
+    # bank_accounts_col uses updated_at for freshness
+    stale_users = bank_accounts_col.distinct("user_id", {
+        "updated_at": {"$lt": cutoff}
+    })
+    bank_res = bank_accounts_col.delete_many({
+        "updated_at": {"$lt": cutoff}
+    })
+    rows_res = bank_transactions_col.delete_many({
+        "user_id": {"$in": stale_users}
+    })
+    daily_rollups_col.delete_many({"user_id": {"$in": stale_users}})
+
+    # transactions_col also has updated_at
+    tx_res = transactions_col.delete_many({
+        "updated_at": {"$lt": cutoff}
+    })
+
+    return {
+        "bank_accounts": bank_res.deleted_count,
+        "bank_transactions": rows_res.deleted_count,
+        "compliance_transactions": tx_res.deleted_count,
+    }
+
 #retention policies end
 
+
+# ---------------------------
+# COMPLIANCE JOBS
+# ---------------------------
+#
+# Long compliance operations can run as background jobs instead of inside
+# the request: pass ?async=1 (or "async": true in the JSON body) to the
+# scan, export and age-retention endpoints. They answer 202 with a job id
+# to poll at /api/compliance/jobs/<id>; /result returns the file or JSON.
+
+COMPLIANCE_JOBS_ENABLED = os.getenv("COMPLIANCE_JOBS_ENABLED", "1") != "0"
+COMPLIANCE_JOB_WORKERS = int(os.getenv("COMPLIANCE_JOB_WORKERS", "2"))
+
+
+def _job_vulnerability_scan(params, ctx):
+    ctx.progress(5, "Scanning accounts")
+    result = _vulnerability_scan(int(params.get("days", 30)))
+    return {"result": {
+        "window_days": result["window_days"],
+        "scanned_accounts": result["scanned_accounts"],
+        "vulnerable_count": result["vulnerable_count"],
+    }}
+
+
+def _job_export_csv(params, ctx):
+    path = ctx.result_path("flagged_activities.csv")
+    with open(path, "w", newline="", encoding="utf-8") as out:
+        _write_flagged_csv(out, params)
+    return {"file": path, "mimetype": "text/csv", "download_name": "flagged_activities.csv"}
+
+
+def _job_export_pdf(params, ctx):
+    path = ctx.result_path("transaction_report.pdf")
+    with open(path, "wb") as out:
+        _write_transaction_report_pdf(out, params, progress=ctx.progress)
+    return {"file": path, "mimetype": "application/pdf", "download_name": "transaction_report.pdf"}
+
+
+def _job_retention_age(params, ctx):
+    older_than_days = int(params.get("older_than_days", 365))
+    return {"result": {
+        "mode": "age",
+        "older_than_days": older_than_days,
+        "deleted": _retention_delete_by_age(older_than_days),
+    }}
+
+
+job_queue = JobQueue(compliance_jobs_col, max_workers=COMPLIANCE_JOB_WORKERS)
+job_queue.register("vulnerability_scan", _job_vulnerability_scan)
+job_queue.register("export_csv", _job_export_csv)
+job_queue.register("export_pdf", _job_export_pdf)
+job_queue.register("retention_age", _job_retention_age)
+
+
+@app.before_request
+def start_job_queue():
+    # Same lazy, per-worker start as the bank refresher
+    if COMPLIANCE_JOBS_ENABLED and not app.testing:
+        job_queue.start()
+
+
+def _wants_async(data: dict | None = None) -> bool:
+    flag = request.args.get("async")
+    if flag is None and data:
+        flag = data.get("async")
+    return str(flag).lower() in ("1", "true", "yes")
+
+
+def _enqueue_job(kind: str, params: dict | None = None):
+    job_id = job_queue.submit(kind, params, created_by=session.get("user_id"))
+    return jsonify({
+        "ok": True,
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": f"/api/compliance/jobs/{job_id}",
+        "result_url": f"/api/compliance/jobs/{job_id}/result",
+    }), 202
+
+
+def _get_visible_job(job_id: str):
+    """Job doc if the caller may see it: its creator, or any regulator."""
+    job = job_queue.get(job_id)
+    if not job:
+        return None, (jsonify({"ok": False, "message": "Job not found"}), 404)
+    if session.get("role") != "Compliance Regulator" and job.get("created_by") != session.get("user_id"):
+        return None, (jsonify({"ok": False, "message": "Job not found"}), 404)
+    return job, None
+
+
+@app.route("/api/compliance/jobs/<job_id>")
+@login_required
+def api_compliance_job_status(job_id):
+    job, error = _get_visible_job(job_id)
+    if error:
+        return error
+
+    def iso(value):
+        return value.isoformat() if value else None
+
+    return jsonify({
+        "ok": True,
+        "job_id": str(job["_id"]),
+        "kind": job.get("kind"),
+        "status": job.get("status"),
+        "progress": job.get("progress", 0),
+        "message": job.get("message"),
+        "error": job.get("error"),
+        "created_at": iso(job.get("created_at")),
+        "started_at": iso(job.get("started_at")),
+        "finished_at": iso(job.get("finished_at")),
+        "has_file": bool(job.get("result_file")),
+    })
+
+
+@app.route("/api/compliance/jobs/<job_id>/result")
+@login_required
+def api_compliance_job_result(job_id):
+    job, error = _get_visible_job(job_id)
+    if error:
+        return error
+
+    if job.get("status") == "failed":
+        return jsonify({"ok": False, "message": job.get("error") or "Job failed"}), 500
+    if job.get("status") != "done":
+        return jsonify({"ok": False, "status": job.get("status"), "message": "Job not finished"}), 409
+
+    result_file = job.get("result_file")
+    if result_file:
+        if not os.path.exists(result_file["path"]):
+            return jsonify({"ok": False, "message": "Result file expired"}), 410
+        return send_file(
+            result_file["path"],
+            mimetype=result_file["mimetype"],
+            as_attachment=True,
+            download_name=result_file["download_name"],
+        )
+
+    return jsonify({"ok": True, "result": job.get("result")})
+
 # ---------------------------
 # REGISTER
 # ---------------------------
@@ -2780,13 +3977,7 @@ def api_check_client_budget():
     spending_limit = float(user_doc.get("spending_limit", DEFAULT_SPENDING_LIMIT))
 
     # Calculate total expenses
-    total_expense = 0.0
-    for e in entries_col.find({"user_id": client_user_id}):
-        if str(e.get("type", "")).lower() == "expense":
-            try:
-                total_expense += float(e.get("amount", 0))
-            except (TypeError, ValueError):
-                continue
+    total_expense = _expense_total(client_user_id)
 
     # If the user passes their limit
     if total_expense > spending_limit:
@@ -3043,6 +4234,7 @@ def api_update_profile():
         })
 
     if update_fields:
+        update_fields["updated_at"] = datetime.utcnow()
         users_col.update_one({"_id": ObjectId(user_id)}, {"$set": update_fields})
 
     updated_user = users_col.find_one({"_id": ObjectId(user_id)}, {"password_hash": 0})
@@ -3084,8 +4276,8 @@ def api_advisor_summary():
     cutoff = datetime.utcnow().date() - timedelta(days=days)
 
     # PLAID ONLY
-    bank_doc = bank_accounts_col.find_one({"user_id": client_user_id_str})
-    if not bank_doc or not bank_doc.get("recent_transactions"):
+    rollups = _load_daily_rollups(client_user_id_str, since=cutoff)
+    if not rollups:
         return jsonify({
             "ok": True,
             "hasData": False,
@@ -3096,8 +4288,24 @@ def api_advisor_summary():
             "transactions": [],
         })
 
-    txs = bank_doc.get("recent_transactions", [])
-    summary = _build_plaid_summary(txs, cutoff)
+    summary = _summary_from_rollups(rollups)
+    # The table only needs the newest rows; the charts come from the rollups
+    summary["transactions"] = [
+        {
+            "date": tx.get("date"),
+            "name": tx.get("name", ""),
+            "category": tx["canonical_category"],
+            "amount": tx["signed_amount"],
+            "transaction_id": tx.get("transaction_id"),
+        }
+        for tx in _load_transactions(
+            client_user_id_str,
+            since=cutoff,
+            newest_first=True,
+            limit=RECENT_TRANSACTION_LIMIT,
+            projection=TX_API_PROJECTION,
+        )
+    ]
 
     if not summary["labels"]:
         summary.update({
@@ -3119,72 +4327,13 @@ def _build_plaid_summary(txs, cutoff_date):
     Build summary from Plaid transactions only.
     txs: list of dicts with keys: date, name, category, amount, transaction_id, ...
     cutoff_date: date object; only include txs >= cutoff_date.
-    """
-    filtered = []
-
-    # Filter by date
-    for tx in txs:
-        raw_date = tx.get("date")
-        if isinstance(raw_date, datetime):
-            d = raw_date.date()
-        else:
-            try:
-                d = datetime.fromisoformat(str(raw_date)).date()
-            except Exception:
-                try:
-                    d = datetime.strptime(str(raw_date), "%Y-%m-%d").date()
-                except Exception:
-                    continue
-
-        if d < cutoff_date:
-            continue
-
-        filtered.append((d, tx))
-
-    # Sort ascending by date
-    filtered.sort(key=lambda x: x[0])
-
-    income_by_day = {}
-    expense_by_day = {}
-    categories = {}
-    tx_output = []
-
-    for d, tx in filtered:
-        amt_raw = float(tx.get("amount") or 0)
-        name = tx.get("name", "")
-        cat = tx.get("category") or "Other"
-
-        # Use your existing classifier to decide income vs expense
-        is_income = _classify_direction(name, cat)
-        signed = amt_raw if is_income else -amt_raw
-        date_key = d.isoformat()
-
-        if signed >= 0:
-            income_by_day[date_key] = income_by_day.get(date_key, 0.0) + signed
-        else:
-            val = abs(signed)
-            expense_by_day[date_key] = expense_by_day.get(date_key, 0.0) + val
-            categories[cat] = categories.get(cat, 0.0) + val
 
-        tx_output.append({
-            "date": date_key,
-            "name": name,
-            "category": cat,
-            "amount": signed,
-            "transaction_id": tx.get("transaction_id"),
-        })
+    The grouping itself lives in summary_engine;
+    rows stored before ingest-time enrichment are enriched on the way in.
+    """
+    return build_summary(txs, cutoff_date, enrich=_enrich_transaction)
 
-    labels = sorted(set(list(income_by_day.keys()) + list(expense_by_day.keys())))
-    income_list = [round(income_by_day.get(d, 0.0), 2) for d in labels]
-    expense_list = [round(expense_by_day.get(d, 0.0), 2) for d in labels]
 
-    return {
-        "labels": labels,
-        "income": income_list,
-        "expenses": expense_list,
-        "categoryBreakdown": {k: round(v, 2) for k, v in categories.items()},
-        "transactions": tx_output,
-    }
 # ---------------------------
 # FORGOT PASSWORD
 # ---------------------------
@@ -3217,33 +4366,17 @@ def api_forgot_password():
 @login_required
 def api_summary():
     user_id = session.get("user_id")
-    bank_doc = bank_accounts_col.find_one({"user_id": user_id})
+    since = datetime.utcnow().date() - timedelta(days=RECENT_TRANSACTION_DAYS)
+    rollups = _load_daily_rollups(user_id, since=since)
 
     # Prefer Plaid
-    if bank_doc and bank_doc.get("recent_transactions"):
-        txs = bank_doc["recent_transactions"]
-        income = 0.0
-        expense = 0.0
-        categories = {}
-
-        for tx in txs:
-            amt = float(tx.get("amount") or 0)
-
-            name = tx.get("name", "")
-            cat = tx.get("category", "Other")
-            is_income = _classify_direction(name, cat)
-
-            signed = amt if is_income else -amt
-
-            if signed > 0:
-                income += signed
-            else:
-                value = abs(signed)
-                expense += value
-                categories[cat] = categories.get(cat, 0.0) + value
+    if rollups:
+        totals = _rollup_totals(rollups)
+        income = totals["income"]
+        expense = totals["expenses"]
 
         sorted_list = sorted(
-            [{"name": c, "total": t} for c, t in categories.items()],
+            [{"name": c, "total": t} for c, t in totals["categories"].items()],
             key=lambda x: x["total"],
             reverse=True
         )
@@ -3462,11 +4595,95 @@ def api_add_manual_entry():
     entries_col.insert_one(entry_doc)
 
     if t.lower() == "expense":
+        _bump_spending_totals(user_id, [entry_doc])
         recalc_spending_flag_for_user(user_id)
+    _rescore_user_vulnerability(user_id)
 
     return jsonify({"ok": True, "message": "Entry added"}), 201
 
 
+IMPORT_CHUNK_SIZE = 500
+IMPORT_MAX_ROWS = int(os.getenv("IMPORT_MAX_ROWS", "50000"))
+IMPORT_MAX_ERRORS = 50
+
+
+@app.route("/api/entries/import", methods=["POST"])
+@login_required
+def api_import_entries():
+    """
+    Bulk-import manual entries from an uploaded CSV or OFX file
+    (multipart field "file"; optional "format" = csv|ofx, otherwise taken
+    from the file extension).
+
+    The upload is parsed as a stream and validated in chunks of
+    IMPORT_CHUNK_SIZE rows, each inserted with one insert_many. Invalid
+    rows are skipped and reported. Spending totals, the spending flag and
+    vulnerability are updated once for the whole import.
+    """
+    user_id = session.get("user_id")
+    upload = request.files.get("file")
+    if not upload:
+        return jsonify({"ok": False, "message": "No file uploaded"}), 400
+
+    fmt = detect_format(upload.filename, request.form.get("format"))
+    if not fmt:
+        return jsonify({"ok": False, "message": "Unsupported file type (use CSV or OFX)"}), 400
+
+    stream = io.TextIOWrapper(upload.stream, encoding="utf-8-sig", errors="replace", newline="")
+    rows = parse_csv(stream) if fmt == "csv" else parse_ofx(stream)
+
+    inserted = 0
+    skipped = 0
+    errors = []
+    expense_docs = []
+    try:
+        for chunk in chunked(rows, IMPORT_CHUNK_SIZE):
+            docs = []
+            for line_no, raw in chunk:
+                entry, error = validate_row(raw)
+                if error:
+                    skipped += 1
+                    if len(errors) < IMPORT_MAX_ERRORS:
+                        errors.append({"line": line_no, "error": error})
+                    continue
+                entry["user_id"] = user_id
+                docs.append(entry)
+
+            truncated = inserted + len(docs) > IMPORT_MAX_ROWS
+            if truncated:
+                docs = docs[:IMPORT_MAX_ROWS - inserted]
+            if docs:
+                entries_col.insert_many(docs, ordered=False)
+                inserted += len(docs)
+                expense_docs.extend(
+                    {"_id": d["_id"], "type": d["type"], "amount": d["amount"],
+                     "created_at": d["created_at"]}
+                    for d in docs if d["type"] == "expense"
+                )
+            if truncated:
+                errors.append({"line": line_no, "error": f"Import stopped at {IMPORT_MAX_ROWS} rows"})
+                break
+    except (ValueError, csv.Error) as e:
+        # Header problems or a malformed file; rows inserted so far are kept
+        if not inserted:
+            return jsonify({"ok": False, "message": f"Could not read file: {e}"}), 400
+        errors.append({"line": None, "error": str(e)})
+
+    if expense_docs:
+        _bump_spending_totals(user_id, expense_docs)
+        recalc_spending_flag_for_user(user_id)
+    if inserted:
+        _rescore_user_vulnerability(user_id)
+
+    return jsonify({
+        "ok": True,
+        "format": fmt,
+        "inserted": inserted,
+        "skipped": skipped,
+        "errors": errors,
+    }), 201 if inserted else 200
+
+
 # ---------------------------
 # USER PROFILE API
 # ---------------------------
@@ -3547,34 +4764,36 @@ def api_update_dashboard_mode_legacy():
 @login_required
 def api_transactions():
     user_id = session.get("user_id")
-    doc = bank_accounts_col.find_one({"user_id": user_id})
-    if not doc or not doc.get("recent_transactions"):
-        return jsonify({"ok": True, "transactions": []})
-
-    txs = doc["recent_transactions"]
-    txs_sorted = sorted(txs, key=lambda x: x.get("date", ""), reverse=True)
 
     try:
         limit = int(request.args.get("limit", 50))
     except:
         limit = 50
+    limit = max(1, min(limit, 1000))
 
-    return jsonify({"ok": True, "transactions": txs_sorted[:limit]})
+    txs = _load_transactions(user_id, newest_first=True, limit=limit, projection=TX_API_PROJECTION)
+    return jsonify({"ok": True, "transactions": txs})
 
 
 @app.route("/api/transactions/<tx_id>")
 @login_required
 def api_transaction_detail(tx_id):
     user_id = session.get("user_id")
-    doc = bank_accounts_col.find_one({"user_id": user_id})
-    if not doc:
-        return jsonify({"ok": False, "message": "No transactions"}), 404
+    tx = bank_transactions_col.find_one(
+        {"user_id": user_id, "transaction_id": tx_id}, TX_API_PROJECTION
+    )
+    if tx:
+        return jsonify({"ok": True, "transaction": tx})
 
-    for tx in doc.get("recent_transactions", []):
-        if tx.get("transaction_id") == tx_id:
-            return jsonify({"ok": True, "transaction": tx})
+    # Bank documents not yet migrated out of the embedded array
+    doc = bank_accounts_col.find_one(
+        {"user_id": user_id, "recent_transactions.transaction_id": tx_id},
+        {"recent_transactions.$": 1},
+    )
+    if not doc:
+        return jsonify({"ok": False, "message": "Not found"}), 404
 
-    return jsonify({"ok": False, "message": "Not found"}), 404
+    return jsonify({"ok": True, "transaction": doc["recent_transactions"][0]})
 
 #----------------------------
 # COMPLIANCE API TRANSACTION & FLAGS
@@ -3620,6 +4839,16 @@ def api_save_transactions():
     return jsonify({"ok": True, "message": "Transactions saved"})
 
 
+def _flag_doc(tx: dict, risk_level: str, reasons: list, now: datetime) -> dict:
+    return {
+        "transaction": tx,
+        "reasons": reasons,
+        "risk": risk_level,
+        "reported": False,
+        "created_at": now
+    }
+
+
 @app.route("/api/compliance/flag_transaction", methods=["POST"])
 @login_required
 def api_flag_transaction():
@@ -3627,44 +4856,20 @@ def api_flag_transaction():
         return jsonify({"ok": False, "message": "Unauthorized"}), 403
 
     tx = request.get_json().get("transaction", {})
-    reasons = []
-    risk_level = "Low"
-
-    amount = float(tx.get("amount", 0))
-    merchant = tx.get("name", "").lower()
-
-    # Rule 1 — High value
-    if amount >= 5000:
-        reasons.append("Critical: High-value transaction")
-        risk_level = "Critical"
-    elif amount >= 2000:
-        reasons.append("High-value transaction")
-        risk_level = "High"
-
-    # Rule 2 — Suspicious merchant categories
-    if any(k in merchant for k in ["crypto", "casino", "bet", "gamble"]):
-        reasons.append("Suspicious merchant")
-        risk_level = "Critical"
-
-    # Rule 3 — Velocity (3+ transactions in last hour)
+
     now = datetime.utcnow()
-    recent = flagged_col.count_documents({
-        "transaction.name": tx.get("name"),
-        "created_at": {"$gte": now - timedelta(hours=1)}
-    })
-    if recent >= 3:
-        reasons.append("Velocity pattern detected")
+    ruleset = rule_engine.current()
+    recent = 0
+    if ruleset.uses_velocity:
+        recent = velocity_tracker.count_and_record(
+            tx.get("user_id"), tx.get("name"), ruleset.velocity_window_minutes * 60, now
+        )
+    risk_level, reasons = ruleset.evaluate(tx, recent)
 
     suspicious = len(reasons) > 0
 
     if suspicious:
-        flagged_col.insert_one({
-            "transaction": tx,
-            "reasons": reasons,
-            "risk": risk_level,
-            "reported": False,
-            "created_at": now
-        })
+        flagged_col.insert_one(_flag_doc(tx, risk_level, reasons, now))
 
     return jsonify({
         "ok": True,
@@ -3673,37 +4878,178 @@ def api_flag_transaction():
         "reasons": reasons
     })
 
+
+MAX_SCREEN_BATCH = 1000
+
+
+@app.route("/api/compliance/screen_transactions", methods=["POST"])
+@login_required
+def api_screen_transactions():
+    """
+    Screen many transactions in one call.
+
+    Body: {"transactions": [...]} (up to MAX_SCREEN_BATCH live
+    transactions, counted towards velocity like flag_transaction), or
+    {"user_id": "..."} to re-screen that user's stored Plaid transactions.
+    Stored transactions are history, so they skip the velocity rule and
+    don't touch the live counters; ones already flagged are not flagged
+    again.
+
+    Returns one verdict per transaction, in input order.
+    """
+    if session.get("role") != "Compliance Regulator":
+        return jsonify({"ok": False, "message": "Unauthorized"}), 403
+
+    data = request.get_json() or {}
+    user_id = data.get("user_id")
+    now = datetime.utcnow()
+    ruleset = rule_engine.current()
+
+    try:
+        if user_id:
+            txs = [
+                {**tx, "user_id": user_id}
+                for tx in _load_transactions(str(user_id), projection=TX_API_PROJECTION)
+            ]
+            # No velocity rule for history
+            recent_counts = [0] * len(txs)
+
+            tx_ids = [tx["transaction_id"] for tx in txs if tx.get("transaction_id")]
+            already_flagged = {
+                doc["transaction"]["transaction_id"]
+                for doc in flagged_col.find(
+                    {
+                        "transaction.user_id": user_id,
+                        "transaction.transaction_id": {"$in": tx_ids},
+                    },
+                    {"_id": 0, "transaction.transaction_id": 1},
+                )
+            } if tx_ids else set()
+        else:
+            txs = data.get("transactions")
+            if not isinstance(txs, list) or not txs:
+                return jsonify({"ok": False, "message": "Provide transactions or user_id"}), 400
+            if len(txs) > MAX_SCREEN_BATCH:
+                return jsonify({
+                    "ok": False,
+                    "message": f"At most {MAX_SCREEN_BATCH} transactions per request"
+                }), 400
+            if not all(isinstance(tx, dict) for tx in txs):
+                return jsonify({"ok": False, "message": "Each transaction must be an object"}), 400
+
+            recent_counts = [0] * len(txs)
+            if ruleset.uses_velocity:
+                recent_counts = velocity_tracker.count_and_record_many(
+                    [(tx.get("user_id"), tx.get("name")) for tx in txs],
+                    ruleset.velocity_window_minutes * 60,
+                    now,
+                )
+            already_flagged = set()
+
+        results = []
+        flags = []
+        for i, (tx, recent) in enumerate(zip(txs, recent_counts)):
+            verdict = {"index": i, "transaction_id": tx.get("transaction_id")}
+            try:
+                risk_level, reasons = ruleset.evaluate(tx, recent)
+            except (TypeError, ValueError):
+                verdict.update({"ok": False, "message": "Invalid amount"})
+                results.append(verdict)
+                continue
+
+            suspicious = len(reasons) > 0
+            verdict.update({
+                "ok": True,
+                "suspicious": suspicious,
+                "risk": risk_level,
+                "reasons": reasons,
+            })
+            if suspicious and tx.get("transaction_id") in already_flagged:
+                verdict["already_flagged"] = True
+            elif suspicious:
+                flags.append(_flag_doc(tx, risk_level, reasons, now))
+            results.append(verdict)
+
+        if flags:
+            flagged_col.insert_many(flags, ordered=False)
+    except Exception as e:
+        print("SCREEN TRANSACTIONS ERROR:", e)
+        return jsonify({"ok": False, "message": "Screening failed"}), 500
+
+    return jsonify({
+        "ok": True,
+        "screened": len(results),
+        "flagged": len(flags),
+        "results": results,
+    })
+
+@app.route("/api/compliance/rules/stats")
+@login_required
+def api_compliance_rule_stats():
+    """Active flag rules plus per-rule evaluation counts, hits and timings (this process)."""
+    if session.get("role") != "Compliance Regulator":
+        return jsonify({"ok": False, "message": "Unauthorized"}), 403
+
+    return jsonify({
+        "ok": True,
+        "config": rule_engine.current().describe(),
+        "stats": rule_engine.stats(),
+    })
+
+
+@app.route("/api/compliance/rules/stats/reset", methods=["POST"])
+@login_required
+def api_compliance_rule_stats_reset():
+    if session.get("role") != "Compliance Regulator":
+        return jsonify({"ok": False, "message": "Unauthorized"}), 403
+
+    rule_engine.reset_stats()
+    return jsonify({"ok": True, "message": "Rule stats reset"})
+
+
 @app.route("/api/compliance/summary")
 @login_required
 def api_compliance_summary():
     if session.get("role") != "Compliance Regulator":
         return jsonify({"ok": False, "message": "Unauthorized"}), 403
 
-    flagged = list(flagged_col.find({}))
-    total = len(flagged)
+    page, page_size, skip = _pagination_args()
+
+    # Counts are computed in the database; only one page of flags is loaded
+    facets = next(flagged_col.aggregate([
+        {"$facet": {
+            "total": [{"$count": "n"}],
+            "by_risk": [{"$group": {"_id": "$risk", "count": {"$sum": 1}}}],
+        }},
+    ]), {})
+    total = facets["total"][0]["n"] if facets.get("total") else 0
+    by_risk = {row["_id"]: row["count"] for row in facets.get("by_risk", [])}
 
-    critical = sum(1 for f in flagged if f.get("risk") == "Critical")
-    high = sum(1 for f in flagged if f.get("risk") == "High")
-    medium = sum(1 for f in flagged if f.get("risk") == "Medium")
-    low = sum(1 for f in flagged if f.get("risk") == "Low")
+    cursor = flagged_col.find(
+        {},
+        {"_id": 0, "transaction.name": 1, "transaction.amount": 1, "risk": 1, "reasons": 1},
+    ).sort("created_at", DESCENDING).skip(skip).limit(page_size)
 
     return jsonify({
         "ok": True,
         "total_flagged": total,
         "risk_distribution": {
-            "critical": critical,
-            "high": high,
-            "medium": medium,
-            "low": low
+            "critical": by_risk.get("Critical", 0),
+            "high": by_risk.get("High", 0),
+            "medium": by_risk.get("Medium", 0),
+            "low": by_risk.get("Low", 0)
         },
+        "page": page,
+        "page_size": page_size,
+        "has_more": skip + page_size < total,
         "flagged": [
             {
-                "merchant": f["transaction"].get("name"),
-                "amount": f["transaction"].get("amount"),
+                "merchant": (f.get("transaction") or {}).get("name"),
+                "amount": (f.get("transaction") or {}).get("amount"),
                 "risk": f.get("risk"),
                 "reasons": f.get("reasons")
             }
-            for f in flagged
+            for f in cursor
         ]
     })
 def get_dashboard_redirect_for(user_doc):
@@ -3774,6 +5120,8 @@ def api_compliance_audit_logs():
         limit = 100
     limit = max(1, min(limit, 500))
 
+    # Include entries this worker still has buffered
+    audit_queue.flush()
     cursor = audit_logs_col.find(q).sort("timestamp", -1).limit(limit)
 
     logs = []
@@ -3793,6 +5141,15 @@ def api_compliance_audit_logs():
 
     return jsonify({"ok": True, "logs": logs})
 
+@app.route("/api/compliance/audit_logs/stats")
+@login_required
+def api_compliance_audit_log_stats():
+    """Audit writer counters for this worker: enqueued, flushed, dropped, failed, queued."""
+    if session.get("role") != "Compliance Regulator":
+        return jsonify({"ok": False, "message": "Unauthorized"}), 403
+
+    return jsonify({"ok": True, "async": AUDIT_ASYNC, "stats": audit_queue.stats()})
+
 @app.route("/api/audit_logs/me")
 @login_required
 def api_my_audit_logs():
@@ -3883,45 +5240,47 @@ def notes_delete(note_id):
 # ---------------------------
 
 def assign_category(name):
-    if not name:
-        return "Other"
-    n = name.lower()
-    if any(k in n for k in ["starbucks", "mcdonald", "pizza", "coffee"]):
-        return "Dining"
-    if any(k in n for k in ["uber", "lyft", "taxi", "bus"]):
-        return "Transport"
-    if any(k in n for k in ["airlines", "hotel", "airbnb"]):
-        return "Travel"
-    if any(k in n for k in ["amazon", "walmart", "target"]):
-        return "Shopping"
-    if any(k in n for k in ["gym", "fitness", "climb"]):
-        return "Fitness"
-    if any(k in n for k in ["deposit", "payroll", "credit"]):
-        return "Income"
-    if any(k in n for k in ["payment", "bill"]):
-        return "Bills"
-    return "Other"
+    return classifier.merchant_category(name)
 
 
 @app.route("/api/category-breakdown")
 @login_required
 def api_category_breakdown():
     user_id = session.get("user_id")
-    doc = bank_accounts_col.find_one({"user_id": user_id})
-
-    if not doc or not doc.get("access_token"):
+    if not bank_accounts_col.find_one({"user_id": user_id}, {"_id": 1}):
         return jsonify([])
 
-    txs = get_recent_transactions(doc["access_token"], days=30).get("transactions", [])
-    summary = {}
-
-    for tx in txs:
-        name = tx.get("name", "")
-        amt = float(tx.get("amount", 0))
-        cat = assign_category(name)
+    # Same windows the advisor summary offers
+    days_map = {"month": 30, "quarter": 90, "year": 365}
+    days = days_map.get(request.args.get("range"), 30)
+    since = datetime.utcnow().date() - timedelta(days=days)
+
+    # Served from the synced store (the refresher keeps it current), one
+    # row per merchant name
+    per_name = [
+        (row["_id"], row["total"])
+        for row in bank_transactions_col.aggregate([
+            {"$match": {
+                "user_id": user_id,
+                "date": {"$gte": since.isoformat()},
+                "amount": {"$gt": 0},
+            }},
+            {"$group": {"_id": "$name", "total": {"$sum": "$amount"}}},
+        ])
+    ]
+    if not per_name:
+        # Accounts not yet migrated off the embedded array
+        per_name = [
+            (tx.get("name"), float(tx.get("amount", 0)))
+            for tx in _load_transactions(user_id, since=since)
+            if float(tx.get("amount", 0)) > 0
+        ]
 
-        if amt > 0:
-            summary[cat] = summary.get(cat, 0) + amt
+    summary = {}
+    # Repeated merchant names hit the classifier cache
+    cats = classifier.merchant_classifier.classify_many(name or "" for name, _ in per_name)
+    for (_, amt), cat in zip(per_name, cats):
+        summary[cat] = summary.get(cat, 0) + amt
 
     breakdown = [{"category": c, "total": round(t, 2)} for c, t in summary.items()]
     breakdown.sort(key=lambda x: x["total"], reverse=True)
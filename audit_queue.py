@@ -0,0 +1,214 @@
+"""
+audit_queue.py
+
+In-process buffer for audit log writes, so an /api/* response doesn't
+wait on a Mongo insert.
+
+enqueue() puts the document on a bounded queue and returns immediately.
+A daemon thread drains the queue with insert_many, flushing whenever
+`batch_size` documents are waiting or `flush_seconds` have passed since
+the first one in the batch arrived. Remaining documents are flushed at
+interpreter exit (atexit), and flush() can be called directly (tests,
+CLI commands, graceful shutdown hooks, a read that must see this
+process's own recent writes).
+
+flush() first asks the writer thread to write the batch it is holding
+and waits for that write (a request counter under a Condition), then
+drains whatever is still queued from the calling thread, so every
+document enqueued before the call has been written when it returns.
+
+Backpressure: when the queue is full (Mongo slow or down), enqueue()
+waits up to `block_seconds` for room and then drops the document rather
+than stall the request; drops are counted. Failed inserts are counted too
+and not retried.
+
+The worker is started lazily and per process (fork-aware, like
+JobQueue), so each gunicorn worker gets its own queue and thread.
+
+Provides:
+- AuditQueue(collection, max_size=10000, batch_size=500, flush_seconds=1.0,
+             block_seconds=0.0)
+    .enqueue(doc) -> bool / .flush(timeout=5.0) -> int / .close() / .stats() -> dict
+"""
+
+import atexit
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, List
+
+# How often an idle or batching writer checks for close()
+_POLL_SECONDS = 0.1
+
+
+class AuditQueue:
+    def __init__(
+        self,
+        collection,
+        max_size: int = 10000,
+        batch_size: int = 500,
+        flush_seconds: float = 1.0,
+        block_seconds: float = 0.0,
+    ):
+        self.collection = collection
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.block_seconds = block_seconds
+
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._pid = None
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_size)
+        self._thread = None
+        self._stop = threading.Event()
+        # flush() bumps _flush_requested; the writer sets _flush_served to
+        # the requests it has seen once its in-hand batch is written
+        self._flush_cond = threading.Condition()
+        self._flush_requested = 0
+        self._flush_served = 0
+        self._counters = {"enqueued": 0, "flushed": 0, "dropped": 0, "failed": 0}
+        atexit.register(self.close)
+
+    # ------------------------------------------------------------------
+    # Producer side
+    # ------------------------------------------------------------------
+
+    def _ensure_started(self):
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                # Forked child: the parent's queue (and its locks) isn't ours
+                self._queue = queue.Queue(maxsize=self.max_size)
+                self._pid = os.getpid()
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, name="audit-log-writer", daemon=True)
+            self._thread.start()
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self._counters[key] += n
+
+    def enqueue(self, doc: Dict[str, Any]) -> bool:
+        """Buffer one audit document. False if it was dropped (queue full)."""
+        self._ensure_started()
+        try:
+            if self.block_seconds > 0:
+                self._queue.put(doc, timeout=self.block_seconds)
+            else:
+                self._queue.put_nowait(doc)
+        except queue.Full:
+            self._count("dropped")
+            return False
+        self._count("enqueued")
+        return True
+
+    # ------------------------------------------------------------------
+    # Consumer side
+    # ------------------------------------------------------------------
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        if not batch:
+            return
+        try:
+            with self._write_lock:
+                self.collection.insert_many(batch, ordered=False)
+            self._count("flushed", len(batch))
+        except Exception as e:
+            print("AUDIT FLUSH ERROR:", e)
+            self._count("failed", len(batch))
+
+    def _drain(self, limit: int) -> List[Dict[str, Any]]:
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _writer_alive(self) -> bool:
+        return (
+            self._pid == os.getpid()
+            and self._thread is not None
+            and self._thread.is_alive()
+            and self._thread is not threading.current_thread()
+        )
+
+    def _flush_pending(self) -> bool:
+        return self._flush_requested > self._flush_served
+
+    def _serve_flush(self, seen: int):
+        with self._flush_cond:
+            self._flush_served = max(self._flush_served, seen)
+            self._flush_cond.notify_all()
+
+    def flush(self, timeout: float = 5.0) -> int:
+        """
+        Write everything enqueued so far, including the batch the writer
+        thread holds, before returning. Returns the count written by this
+        thread (the writer's own batch is not included).
+        """
+        if self._writer_alive():
+            with self._flush_cond:
+                self._flush_requested += 1
+                wanted = self._flush_requested
+                self._flush_cond.wait_for(
+                    lambda: self._flush_served >= wanted or not self._thread.is_alive(),
+                    timeout,
+                )
+
+        written = 0
+        while True:
+            batch = self._drain(self.batch_size)
+            if not batch:
+                return written
+            self._write(batch)
+            written += len(batch)
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                try:
+                    first = self._queue.get(timeout=_POLL_SECONDS)
+                except queue.Empty:
+                    # Nothing in hand; flush() drains the queue itself
+                    if self._flush_pending():
+                        self._serve_flush(self._flush_requested)
+                    continue
+                batch = [first]
+                deadline = time.monotonic() + self.flush_seconds
+                while (
+                    len(batch) < self.batch_size
+                    and not self._stop.is_set()
+                    and not self._flush_pending()
+                ):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=min(remaining, _POLL_SECONDS)))
+                    except queue.Empty:
+                        continue
+                seen = self._flush_requested
+                self._write(batch)
+                self._serve_flush(seen)
+        finally:
+            with self._flush_cond:
+                self._flush_cond.notify_all()
+
+    def close(self, timeout: float = 5.0):
+        """Stop the writer thread and flush what's left (runs at exit)."""
+        self._stop.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=timeout)
+        if self._pid in (None, os.getpid()):
+            self.flush()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._counters, "queued": self._queue.qsize()}
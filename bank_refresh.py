@@ -0,0 +1,104 @@
+"""
+bank_refresh.py
+
+Background refresher for Plaid-connected bank items.
+
+Instead of calling Plaid inside every GET /api/bank/status, a scheduler
+thread claims items whose `next_refresh_at` has passed and hands them to a
+small thread pool. Each claimed item is pushed `interval_seconds` into the
+future plus a random jitter, so items connected at the same moment drift
+apart instead of hitting Plaid in the same tick.
+
+Runs on ClaimLoop; an item is claimed by moving its `next_refresh_at`.
+
+Provides:
+- BankRefreshScheduler(collection, refresh_fn, ...)
+    .start() / .stop() / .is_running()
+    .schedule_now(doc_id)
+    .run_pending(limit=None)   -> refresh due items synchronously
+"""
+
+import random
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+
+from pymongo import ReturnDocument
+
+from claim_loop import ClaimLoop
+
+
+class BankRefreshScheduler(ClaimLoop):
+    def __init__(
+        self,
+        collection,
+        refresh_fn: Callable[[Dict[str, Any]], Any],
+        interval_seconds: int = 600,
+        jitter_seconds: int = 120,
+        max_workers: int = 4,
+        poll_seconds: float = 5.0,
+        active_hours: int = 24,
+    ):
+        super().__init__(max_workers, poll_seconds, "bank-refresh")
+        self.collection = collection
+        self.refresh_fn = refresh_fn
+        self.interval_seconds = interval_seconds
+        self.jitter_seconds = jitter_seconds
+        # Items nobody has looked at for this long are left alone until the
+        # next page view schedules them again.
+        self.active_hours = active_hours
+
+    def _ensure_indexes(self):
+        self.collection.create_index([("next_refresh_at", 1)])
+
+    def schedule_now(self, doc_id):
+        """Pull an item's next refresh forward to now and wake the scheduler."""
+        now = datetime.utcnow()
+        self.collection.update_one(
+            {"_id": doc_id, "next_refresh_at": {"$gt": now}},
+            {"$set": {"next_refresh_at": now}},
+        )
+        self.wake()
+
+    # ------------------------------------------------------------------
+    # Scheduling
+    # ------------------------------------------------------------------
+
+    def _next_refresh_at(self, now: datetime) -> datetime:
+        jitter = random.uniform(0, self.jitter_seconds)
+        return now + timedelta(seconds=self.interval_seconds + jitter)
+
+    def _claim(self) -> Optional[Dict[str, Any]]:
+        now = datetime.utcnow()
+        query = {
+            "access_token": {"$nin": [None, ""]},
+            "$or": [
+                {"next_refresh_at": {"$lte": now}},
+                {"next_refresh_at": {"$exists": False}},
+            ],
+        }
+        if self.active_hours:
+            query["last_viewed_at"] = {
+                "$gte": now - timedelta(hours=self.active_hours)
+            }
+        return self.collection.find_one_and_update(
+            query,
+            {"$set": {"next_refresh_at": self._next_refresh_at(now)}},
+            sort=[("next_refresh_at", 1)],
+            return_document=ReturnDocument.BEFORE,
+        )
+
+    def _handle(self, doc: Dict[str, Any]):
+        try:
+            self.refresh_fn(doc)
+        except Exception as e:
+            print("BANK REFRESH ERROR:", doc.get("_id"), e)
+            try:
+                self.collection.update_one(
+                    {"_id": doc["_id"]},
+                    {"$set": {
+                        "last_refresh_error": str(e),
+                        "last_refresh_error_at": datetime.utcnow(),
+                    }},
+                )
+            except Exception:
+                pass
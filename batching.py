@@ -0,0 +1,22 @@
+"""
+batching.py
+
+Groups an iterable (typically a streaming Mongo cursor) into fixed-size
+lists for batched queries and bulk writes, without materialising it.
+
+Provides:
+- chunked(iterable, size) -> iterator of lists (the last one may be shorter)
+"""
+
+from typing import Iterable, Iterator, List
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[List]:
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
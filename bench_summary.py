@@ -0,0 +1,119 @@
+"""
+bench_summary.py
+
+Times summary_engine.build_summary on enriched rows against the
+pre-enrichment loop (which reparsed dates and reran the classifier per
+row) on synthetic histories.
+
+    python bench_summary.py                 # 10k and 100k rows
+    python bench_summary.py 50000 250000    # custom sizes
+    python bench_summary.py > bench_output.txt
+"""
+
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from summary_engine import build_summary
+
+CATEGORIES = [
+    "Food And Drink", "Travel / Taxi", "Shops", "Transfer / Deposit",
+    "Rent And Utilities", "Entertainment", "Payment / Credit Card", "Other",
+]
+
+
+def make_history(n: int, days: int = 365, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    rows = []
+    for i in range(n):
+        posted = today - timedelta(days=rng.randrange(days))
+        is_income = rng.random() < 0.1
+        amount = round(rng.uniform(1, 2500 if is_income else 300), 2)
+        rows.append({
+            "date": posted.date().isoformat(),
+            "name": f"Merchant {rng.randrange(500)}",
+            "category": rng.choice(CATEGORIES),
+            "amount": amount,
+            "transaction_id": f"tx{i}",
+            "posted_date": posted,
+            "is_income": is_income,
+            "signed_amount": amount if is_income else -amount,
+            "canonical_category": rng.choice(CATEGORIES),
+        })
+    return rows
+
+
+def legacy_summary(txs, cutoff_date):
+    """
+    The per-row loop _build_plaid_summary ran before ingest-time
+    enrichment: parse every date string, rerun the keyword classifier.
+    """
+    income_keywords = ["payroll", "deposit", "credit", "refund", "interest", "intrst"]
+    filtered = []
+    for tx in txs:
+        try:
+            d = datetime.fromisoformat(str(tx.get("date"))).date()
+        except Exception:
+            try:
+                d = datetime.strptime(str(tx.get("date")), "%Y-%m-%d").date()
+            except Exception:
+                continue
+        if d < cutoff_date:
+            continue
+        filtered.append((d, tx))
+    filtered.sort(key=lambda x: x[0])
+
+    income_by_day, expense_by_day, categories, out = {}, {}, {}, []
+    for d, tx in filtered:
+        amt = float(tx.get("amount") or 0)
+        cat = tx.get("category") or "Other"
+        label = f"{tx.get('name') or ''} {cat}".lower()
+        signed = amt if any(k in label for k in income_keywords) else -amt
+        key = d.isoformat()
+        if signed >= 0:
+            income_by_day[key] = income_by_day.get(key, 0.0) + signed
+        else:
+            expense_by_day[key] = expense_by_day.get(key, 0.0) - signed
+            categories[cat] = categories.get(cat, 0.0) - signed
+        out.append({"date": key, "name": tx.get("name"), "category": cat,
+                    "amount": signed, "transaction_id": tx.get("transaction_id")})
+    labels = sorted(set(income_by_day) | set(expense_by_day))
+    return {
+        "labels": labels,
+        "income": [round(income_by_day.get(k, 0.0), 2) for k in labels],
+        "expenses": [round(expense_by_day.get(k, 0.0), 2) for k in labels],
+        "categoryBreakdown": {k: round(v, 2) for k, v in categories.items()},
+        "transactions": out,
+    }
+
+
+def best_of(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(sizes):
+    cutoff = (datetime.utcnow() - timedelta(days=90)).date()
+    print("window: last 90 of 365 days, best of 5 runs")
+    print("legacy = per-row parse + classify, enriched = build_summary on enriched rows")
+    print(f"{'rows':>8} {'legacy ms':>10} {'enriched ms':>12} {'speedup':>8}")
+    for n in sizes:
+        txs = make_history(n)
+        t_legacy = best_of(lambda: legacy_summary(txs, cutoff))
+        t_enriched = best_of(lambda: build_summary(txs, cutoff))
+        print(
+            f"{n:>8} {t_legacy * 1000:>10.1f} {t_enriched * 1000:>12.1f} "
+            f"{t_legacy / t_enriched:>7.1f}x"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [10_000, 100_000]
+    sys.exit(main(sizes))
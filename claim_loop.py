@@ -0,0 +1,157 @@
+"""
+claim_loop.py
+
+Shared scheduler loop for the background workers that claim work items
+from a Mongo collection (BankRefreshScheduler, JobQueue).
+
+A daemon thread repeatedly calls _claim() while a worker slot is free and
+hands each claimed item to _handle() on a thread pool; when nothing is
+claimable it sleeps for poll_seconds or until wake() is called.
+Subclasses make _claim() a single atomic find_one_and_update, so every
+gunicorn worker can run its own loop against the same collection without
+handling an item twice. start() is idempotent and fork-aware: a forked
+child starts its own thread and pool.
+
+Subclasses implement _claim() and _handle(item), and may override
+_ensure_indexes() (called once on start) and _tick() (called once per
+loop pass, for housekeeping).
+
+Provides:
+- ClaimLoop(max_workers, poll_seconds, name)
+    .start() / .stop() / .is_running() / .wake()
+    .run_pending(limit=None) -> handle claimable items synchronously
+"""
+
+import os
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
+
+
+class ClaimLoop(ABC):
+    def __init__(self, max_workers: int, poll_seconds: float, name: str):
+        self.max_workers = max_workers
+        self.poll_seconds = poll_seconds
+        self.name = name
+
+        self._lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+        self._pool = None
+        self._slots = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+
+    @abstractmethod
+    def _claim(self) -> Optional[Any]:
+        """Atomically claim one item, or None when nothing is due."""
+
+    @abstractmethod
+    def _handle(self, item: Any):
+        """Process a claimed item. Must not raise."""
+
+    @property
+    def _label(self) -> str:
+        return self.name.replace("-", " ").upper()
+
+    def _ensure_indexes(self):
+        pass
+
+    def _tick(self):
+        pass
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def is_running(self) -> bool:
+        return (
+            self._pid == os.getpid()
+            and self._thread is not None
+            and self._thread.is_alive()
+        )
+
+    def start(self):
+        """Start the claim loop and worker pool for this process (idempotent, fork-aware)."""
+        if self.is_running():
+            return
+        with self._lock:
+            if self.is_running():
+                return
+            try:
+                self._ensure_indexes()
+            except Exception as e:
+                print(f"{self._label} INDEX ERROR:", e)
+
+            self._pid = os.getpid()
+            self._stop = threading.Event()
+            self._wake = threading.Event()
+            self._slots = threading.BoundedSemaphore(self.max_workers)
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix=self.name,
+            )
+            self._thread = threading.Thread(
+                target=self._run, name=f"{self.name}-scheduler", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self, wait: bool = True):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None and wait:
+            self._thread.join(timeout=self.poll_seconds * 2)
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
+        self._thread = None
+        self._pool = None
+
+    def wake(self):
+        self._wake.set()
+
+    # ------------------------------------------------------------------
+    # Running
+    # ------------------------------------------------------------------
+
+    def run_pending(self, limit: Optional[int] = None) -> int:
+        """Claim and handle items in the calling thread. Returns the count."""
+        done = 0
+        while limit is None or done < limit:
+            item = self._claim()
+            if item is None:
+                break
+            self._handle(item)
+            done += 1
+        return done
+
+    def _release_slot(self, _future):
+        self._slots.release()
+
+    def _run(self):
+        while not self._stop.is_set():
+            claimed_any = False
+            try:
+                while not self._stop.is_set() and self._slots.acquire(blocking=False):
+                    try:
+                        item = self._claim()
+                    except Exception:
+                        self._slots.release()
+                        raise
+                    if item is None:
+                        self._slots.release()
+                        break
+                    claimed_any = True
+                    future = self._pool.submit(self._handle, item)
+                    future.add_done_callback(self._release_slot)
+
+                self._tick()
+            except Exception as e:
+                print(f"{self._label} SCHEDULER ERROR:", e)
+
+            if not claimed_any:
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+            else:
+                # Pool is full or we just drained the queue; give workers a moment.
+                self._stop.wait(0.1)
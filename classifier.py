@@ -0,0 +1,140 @@
+"""
+classifier.py
+
+Keyword classification for transactions: income vs expense, merchant
+category and raw Plaid category.
+
+Each rule table is a list of (result, keywords) in priority order: the
+first rule with any keyword occurring in the text wins. A table is
+compiled into one regex of the form
+
+    (?=(?P<r0>kw|kw...)|(?P<r1>kw|...)|...)
+
+so a single scan over the lowercased text finds every rule that matches
+at every position, and the lowest rule index wins. Results are memoized
+per input string in a bounded LRU, since merchant names repeat heavily.
+
+Provides:
+- KeywordClassifier(rules, default, cache_size)
+    .classify(text) / .classify_many(texts) / .cache_info() / .cache_clear()
+- is_income(name, category) -> bool
+- merchant_category(name) -> str
+- raw_category(raw_list) -> str
+- classify_directions(txs) -> [is_income, ...]
+"""
+
+import os
+import re
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+CLASSIFIER_CACHE_SIZE = int(os.getenv("CLASSIFIER_CACHE_SIZE", "8192"))
+
+# Income vs expense, matched against "<name> <category>"
+DIRECTION_RULES: List[Tuple[Any, Sequence[str]]] = [
+    (True, ["payroll", "deposit", "credit", "refund", "interest", "intrst"]),
+]
+
+# Merchant-name categories for the category breakdown chart
+MERCHANT_RULES: List[Tuple[Any, Sequence[str]]] = [
+    ("Dining", ["starbucks", "mcdonald", "pizza", "coffee"]),
+    ("Transport", ["uber", "lyft", "taxi", "bus"]),
+    ("Travel", ["airlines", "hotel", "airbnb"]),
+    ("Shopping", ["amazon", "walmart", "target"]),
+    ("Fitness", ["gym", "fitness", "climb"]),
+    ("Income", ["deposit", "payroll", "credit"]),
+    ("Bills", ["payment", "bill"]),
+]
+
+# First entry of a Plaid category list
+RAW_CATEGORY_RULES: List[Tuple[Any, Sequence[str]]] = [
+    ("Transport", ["uber", "lyft"]),
+    ("Food & Drink", ["mcdonald", "starbucks"]),
+    ("Bills", ["pay", "payment"]),
+    ("Travel", ["airlines", "flight"]),
+    ("Income", ["deposit", "credit"]),
+]
+
+
+class KeywordClassifier:
+    def __init__(
+        self,
+        rules: Sequence[Tuple[Any, Sequence[str]]],
+        default: Any = None,
+        cache_size: int = CLASSIFIER_CACHE_SIZE,
+    ):
+        self.results = [result for result, _ in rules]
+        self.default = default
+        alternatives = []
+        for i, (_, keywords) in enumerate(rules):
+            # Longest first so the group reports the most specific keyword
+            kws = sorted({k.lower() for k in keywords}, key=len, reverse=True)
+            alternatives.append(f"(?P<r{i}>{'|'.join(re.escape(k) for k in kws)})")
+        self.pattern = re.compile("(?=" + "|".join(alternatives) + ")")
+        self._cached = lru_cache(maxsize=cache_size)(self._classify_uncached)
+
+    def _classify_uncached(self, text: str) -> Any:
+        best: Optional[int] = None
+        for m in self.pattern.finditer(text):
+            # lastindex is the (only) rule group that matched here; the
+            # alternation already prefers the higher-priority rule at a
+            # given position
+            rule = m.lastindex - 1
+            if best is None or rule < best:
+                best = rule
+                if best == 0:
+                    break
+        return self.default if best is None else self.results[best]
+
+    def classify(self, text: str) -> Any:
+        return self._cached((text or "").lower())
+
+    def classify_many(self, texts: Iterable[str]) -> List[Any]:
+        """Classify a batch; repeated strings are looked up once."""
+        seen: Dict[str, Any] = {}
+        out = []
+        for text in texts:
+            key = (text or "").lower()
+            if key not in seen:
+                seen[key] = self._cached(key)
+            out.append(seen[key])
+        return out
+
+    def cache_info(self):
+        return self._cached.cache_info()
+
+    def cache_clear(self):
+        self._cached.cache_clear()
+
+
+direction_classifier = KeywordClassifier(DIRECTION_RULES, default=False)
+merchant_classifier = KeywordClassifier(MERCHANT_RULES, default="Other")
+raw_category_classifier = KeywordClassifier(RAW_CATEGORY_RULES, default=None)
+
+
+def _direction_label(name: Optional[str], category: Optional[str]) -> str:
+    return f"{name or ''} {category or ''}"
+
+
+def is_income(name: Optional[str], category: Optional[str]) -> bool:
+    return direction_classifier.classify(_direction_label(name, category))
+
+
+def merchant_category(name: Optional[str]) -> str:
+    if not name:
+        return "Other"
+    return merchant_classifier.classify(name)
+
+
+def raw_category(raw_list) -> str:
+    if not raw_list or not isinstance(raw_list, list):
+        return "Other"
+    matched = raw_category_classifier.classify(raw_list[0])
+    return matched if matched is not None else raw_list[0].title()
+
+
+def classify_directions(txs: Sequence[Dict[str, Any]]) -> List[bool]:
+    """is_income for each transaction dict (name/category keys), in one pass."""
+    return direction_classifier.classify_many(
+        _direction_label(tx.get("name"), tx.get("category") or "Other") for tx in txs
+    )
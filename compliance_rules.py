@@ -0,0 +1,276 @@
+"""
+compliance_rules.py
+
+Transaction flag rules for the compliance endpoints, configured from the
+global compliance_settings document instead of being hard-coded.
+
+Settings fields (defaults in DEFAULT_RULE_SETTINGS):
+  critical_amount, high_amount          high-value thresholds
+  suspicious_merchant_keywords          list of substrings of the merchant name
+  velocity_window_minutes, velocity_threshold
+  disabled_rules                        rule names to skip
+
+RuleEngine compiles the settings into a RuleSet of rule objects once
+(keyword lists become one precompiled KeywordClassifier) and keeps it
+until the settings' updated_at changes. updated_at is re-read at most
+every `check_seconds`, so other workers pick up a change within that
+time; invalidate() drops the cache in this process immediately.
+
+Every rule evaluation is counted and timed per rule; stats() reports
+evaluations, hits and average time so expensive or noisy rules can be
+tuned from the settings screen.
+
+Provides:
+- DEFAULT_RULE_SETTINGS, RISK_ORDER
+- HighValueRule, SuspiciousMerchantRule, VelocityRule
+- RuleSet(rules, velocity_window_minutes).evaluate(tx, recent) -> (risk, reasons)
+- RuleEngine(settings_col, doc_id="global", check_seconds=5)
+    .current() / .invalidate() / .evaluate(tx, recent) / .stats() / .reset_stats()
+- rule_settings(doc) -> normalized settings dict
+"""
+
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from classifier import KeywordClassifier
+
+DEFAULT_RULE_SETTINGS: Dict[str, Any] = {
+    "critical_amount": 5000.0,
+    "high_amount": 2000.0,
+    "suspicious_merchant_keywords": ["crypto", "casino", "bet", "gamble"],
+    "velocity_window_minutes": 60,
+    "velocity_threshold": 3,
+    "disabled_rules": [],
+}
+
+RISK_ORDER = {"Low": 0, "Medium": 1, "High": 2, "Critical": 3}
+
+# Velocity counters expire after a day (VelocityTracker.max_window_seconds)
+MAX_VELOCITY_WINDOW_MINUTES = 24 * 60
+
+
+def _keyword_list(value) -> List[str]:
+    if isinstance(value, str):
+        value = value.split(",")
+    if not isinstance(value, (list, tuple)):
+        return []
+    return [str(k).strip().lower() for k in value if str(k).strip()]
+
+
+def rule_settings(doc: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Rule fields of a compliance_settings doc, with defaults and types fixed."""
+    doc = doc or {}
+    d = DEFAULT_RULE_SETTINGS
+
+    def number(key, cast):
+        try:
+            return cast(doc.get(key, d[key]))
+        except (TypeError, ValueError):
+            return d[key]
+
+    keywords = doc.get("suspicious_merchant_keywords")
+    return {
+        "critical_amount": number("critical_amount", float),
+        "high_amount": number("high_amount", float),
+        "suspicious_merchant_keywords": (
+            list(d["suspicious_merchant_keywords"]) if keywords is None else _keyword_list(keywords)
+        ),
+        "velocity_window_minutes": max(1, min(
+            number("velocity_window_minutes", int), MAX_VELOCITY_WINDOW_MINUTES
+        )),
+        "velocity_threshold": max(1, number("velocity_threshold", int)),
+        "disabled_rules": _keyword_list(doc.get("disabled_rules", [])),
+    }
+
+
+class Rule(ABC):
+    name = "rule"
+
+    @abstractmethod
+    def evaluate(self, tx: Dict[str, Any], recent: int) -> Optional[Tuple[Optional[str], str]]:
+        """(risk or None, reason) when the rule fires, else None."""
+
+    def describe(self) -> Dict[str, Any]:
+        return {}
+
+
+class HighValueRule(Rule):
+    name = "high_value"
+
+    def __init__(self, critical_amount: float, high_amount: float):
+        self.critical_amount = critical_amount
+        self.high_amount = high_amount
+
+    def evaluate(self, tx, recent):
+        amount = float(tx.get("amount", 0))
+        if amount >= self.critical_amount:
+            return "Critical", "Critical: High-value transaction"
+        if amount >= self.high_amount:
+            return "High", "High-value transaction"
+        return None
+
+    def describe(self):
+        return {"critical_amount": self.critical_amount, "high_amount": self.high_amount}
+
+
+class SuspiciousMerchantRule(Rule):
+    name = "suspicious_merchant"
+
+    def __init__(self, keywords: Sequence[str]):
+        self.keywords = list(keywords)
+        self.matcher = KeywordClassifier([(True, self.keywords)], default=False) if self.keywords else None
+
+    def evaluate(self, tx, recent):
+        if self.matcher and self.matcher.classify(tx.get("name") or ""):
+            return "Critical", "Suspicious merchant"
+        return None
+
+    def describe(self):
+        return {"keywords": self.keywords}
+
+
+class VelocityRule(Rule):
+    name = "velocity"
+
+    def __init__(self, threshold: int):
+        self.threshold = threshold
+
+    def evaluate(self, tx, recent):
+        # recent = earlier transactions by this user at this merchant in the window
+        if recent >= self.threshold:
+            return None, "Velocity pattern detected"
+        return None
+
+    def describe(self):
+        return {"threshold": self.threshold}
+
+
+class RuleStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def record(self, name: str, hit: bool, elapsed: float):
+        with self._lock:
+            s = self._stats.setdefault(name, {"evaluations": 0, "hits": 0, "total_seconds": 0.0})
+            s["evaluations"] += 1
+            s["hits"] += int(hit)
+            s["total_seconds"] += elapsed
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            out = {}
+            for name, s in self._stats.items():
+                evals = s["evaluations"]
+                out[name] = {
+                    "evaluations": evals,
+                    "hits": s["hits"],
+                    "hit_rate": round(s["hits"] / evals, 4) if evals else 0.0,
+                    "total_ms": round(s["total_seconds"] * 1000, 3),
+                    "avg_us": round(s["total_seconds"] / evals * 1e6, 2) if evals else 0.0,
+                }
+            return out
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+class RuleSet:
+    def __init__(self, rules: Sequence[Rule], velocity_window_minutes: int, stats: Optional[RuleStats] = None):
+        self.rules = list(rules)
+        self.velocity_window_minutes = velocity_window_minutes
+        self.stats = stats
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any], stats: Optional[RuleStats] = None) -> "RuleSet":
+        rules = [
+            HighValueRule(settings["critical_amount"], settings["high_amount"]),
+            SuspiciousMerchantRule(settings["suspicious_merchant_keywords"]),
+            VelocityRule(settings["velocity_threshold"]),
+        ]
+        disabled = set(settings["disabled_rules"])
+        return cls(
+            [r for r in rules if r.name not in disabled],
+            settings["velocity_window_minutes"],
+            stats,
+        )
+
+    @property
+    def uses_velocity(self) -> bool:
+        return any(isinstance(r, VelocityRule) for r in self.rules)
+
+    def evaluate(self, tx: Dict[str, Any], recent: int = 0) -> Tuple[str, List[str]]:
+        """Run every rule on tx. Returns (risk_level, reasons); no reasons means clean."""
+        risk_level = "Low"
+        reasons = []
+        for rule in self.rules:
+            started = time.perf_counter()
+            outcome = rule.evaluate(tx, recent)
+            if self.stats is not None:
+                self.stats.record(rule.name, outcome is not None, time.perf_counter() - started)
+            if outcome is None:
+                continue
+            risk, reason = outcome
+            reasons.append(reason)
+            if risk and RISK_ORDER[risk] > RISK_ORDER[risk_level]:
+                risk_level = risk
+        return risk_level, reasons
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "velocity_window_minutes": self.velocity_window_minutes,
+            "rules": [{"name": r.name, **r.describe()} for r in self.rules],
+        }
+
+
+class RuleEngine:
+    def __init__(self, settings_col, doc_id: str = "global", check_seconds: float = 5.0):
+        self.settings_col = settings_col
+        self.doc_id = doc_id
+        self.check_seconds = check_seconds
+        self.stats_store = RuleStats()
+
+        self._lock = threading.Lock()
+        self._ruleset: Optional[RuleSet] = None
+        self._version = None
+        self._checked_at = 0.0
+        self._compiles = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._ruleset = None
+            self._checked_at = 0.0
+
+    def current(self) -> RuleSet:
+        now = time.monotonic()
+        if self._ruleset is not None and now - self._checked_at < self.check_seconds:
+            return self._ruleset
+
+        with self._lock:
+            if self._ruleset is not None and now - self._checked_at < self.check_seconds:
+                return self._ruleset
+            head = self.settings_col.find_one({"_id": self.doc_id}, {"updated_at": 1}) or {}
+            version = head.get("updated_at")
+            if self._ruleset is None or version != self._version:
+                doc = self.settings_col.find_one({"_id": self.doc_id}) or {}
+                self._ruleset = RuleSet.from_settings(rule_settings(doc), self.stats_store)
+                self._version = doc.get("updated_at")
+                self._compiles += 1
+            self._checked_at = now
+            return self._ruleset
+
+    def evaluate(self, tx: Dict[str, Any], recent: int = 0) -> Tuple[str, List[str]]:
+        return self.current().evaluate(tx, recent)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "compiles": self._compiles,
+            "settings_version": self._version.isoformat() if hasattr(self._version, "isoformat") else self._version,
+            "rules": self.stats_store.snapshot(),
+        }
+
+    def reset_stats(self):
+        self.stats_store.reset()
@@ -0,0 +1,167 @@
+"""
+entry_import.py
+
+Streaming parsers for bulk manual-entry imports (CSV and OFX).
+
+Both parsers read the upload line by line and yield (line_no, raw_row)
+pairs, so a file never has to fit in memory. validate_row() turns a raw
+row into an entries document (type / category / amount / created_at) or
+an error message; callers group validated rows for insert_many with
+batching.chunked().
+
+CSV: a header row is required. Recognised columns (case-insensitive):
+  type, category, amount, date (aliases: kind, description/memo for
+  category, value, created_at/posted). Without a type column the sign of
+  amount decides: negative -> expense, positive -> income.
+
+OFX: <STMTTRN> blocks from SGML (1.x) or XML (2.x) statements; TRNAMT sign
+decides income/expense, NAME (or MEMO) is mapped to a category by the
+merchant classifier.
+
+Provides:
+- detect_format(filename, explicit=None) -> "csv" | "ofx" | None
+- parse_csv(stream) / parse_ofx(stream) -> iterator of (line_no, dict)
+- validate_row(raw) -> (entry | None, error | None)
+"""
+
+import csv
+import math
+import re
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional, TextIO, Tuple
+
+import classifier
+
+CSV_ALIASES = {
+    "type": "type",
+    "kind": "type",
+    "category": "category",
+    "description": "category",
+    "memo": "category",
+    "amount": "amount",
+    "value": "amount",
+    "date": "date",
+    "created_at": "date",
+    "posted": "date",
+}
+
+DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y", "%d.%m.%Y", "%Y/%m/%d", "%Y%m%d")
+
+_OFX_TAG = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<\r\n]*)")
+
+
+def detect_format(filename: Optional[str], explicit: Optional[str] = None) -> Optional[str]:
+    fmt = (explicit or "").strip().lower()
+    if not fmt and filename:
+        fmt = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    if fmt in ("csv", "txt"):
+        return "csv"
+    if fmt in ("ofx", "qfx"):
+        return "ofx"
+    return None
+
+
+def parse_csv(stream: TextIO) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    reader = csv.reader(stream)
+    header = next(reader, None)
+    if not header:
+        return
+    columns = [CSV_ALIASES.get(h.strip().lower()) for h in header]
+    if "amount" not in columns:
+        raise ValueError("CSV header must include an amount column")
+
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        raw = {}
+        for key, value in zip(columns, row):
+            if key and key not in raw:
+                raw[key] = value.strip()
+        yield reader.line_num, raw
+
+
+def parse_ofx(stream: TextIO) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    current = None
+    start_line = 0
+    for line_no, line in enumerate(stream, start=1):
+        for closing, tag, value in _OFX_TAG.findall(line):
+            tag = tag.upper()
+            if tag == "STMTTRN":
+                if closing:
+                    if current is not None:
+                        yield start_line, _ofx_row(current)
+                    current = None
+                else:
+                    current = {}
+                    start_line = line_no
+            elif current is not None and not closing and value.strip():
+                current[tag] = value.strip()
+    if current:
+        yield start_line, _ofx_row(current)
+
+
+def _ofx_row(fields: Dict[str, str]) -> Dict[str, Any]:
+    amount = fields.get("TRNAMT", "")
+    try:
+        kind = "expense" if float(amount) < 0 else "income"
+    except ValueError:
+        kind = None
+    name = fields.get("NAME") or fields.get("MEMO") or ""
+    category = classifier.merchant_category(name) if name else "Other"
+    return {
+        "type": kind,
+        "category": category,
+        "amount": amount,
+        # DTPOSTED is YYYYMMDD[HHMMSS[.XXX][TZ]]
+        "date": fields.get("DTPOSTED", "")[:8],
+    }
+
+
+def _parse_date(value: str) -> Optional[datetime]:
+    value = (value or "").strip()
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised date: {value}")
+
+
+def validate_row(raw: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    amount_str = str(raw.get("amount") or "").replace(",", "").replace("$", "").strip()
+    try:
+        amount = float(amount_str)
+    except ValueError:
+        return None, "Invalid amount"
+    if not math.isfinite(amount):
+        return None, "Invalid amount"
+    if amount == 0:
+        return None, "Amount must be non-zero"
+
+    kind = str(raw.get("type") or "").strip().lower()
+    if not kind:
+        kind = "expense" if amount < 0 else "income"
+    if kind not in ("income", "expense"):
+        return None, "Type must be income or expense"
+
+    category = str(raw.get("category") or "").strip()
+    if not category:
+        return None, "Missing category"
+
+    try:
+        created_at = _parse_date(raw.get("date"))
+    except ValueError as e:
+        return None, str(e)
+
+    return {
+        "type": kind,
+        "category": category.title(),
+        "amount": abs(amount),
+        "created_at": created_at or datetime.utcnow(),
+    }, None
@@ -0,0 +1,253 @@
+"""
+jobs.py
+
+Small background job queue for long compliance operations (vulnerability
+scan, CSV/PDF export, age-based retention) so they don't run inside a
+gunicorn request.
+
+Each job is one document in the jobs collection:
+
+    {_id, kind, params, status: queued|running|done|failed,
+     progress (0-100), message, created_by, created_at, started_at,
+     finished_at, result (small JSON payload), result_file
+     {path, mimetype, download_name}, error}
+
+Runs on ClaimLoop; a job is claimed by moving it from queued to running.
+File results are written under `result_dir`, which must be shared
+between workers that serve the result endpoint.
+
+A running job's heartbeat_at is bumped every heartbeat_timeout / 3
+seconds while its handler runs. Jobs whose heartbeat is older than
+heartbeat_timeout (the worker was killed or restarted) are reaped on the
+next claim: requeued, or failed once they have been claimed
+max_attempts times. Each claim gets a fresh claim_id, and progress and
+completion updates only apply to the current claim.
+
+Handlers are registered per kind and called as fn(params, ctx) where
+ctx.progress(pct, message=None) updates the job and ctx.result_path(name)
+returns a path to write a file result to. A handler returns a dict:
+{"result": {...}} and/or {"file": path, "mimetype": ..., "download_name": ...}.
+
+Provides:
+- JobQueue(collection, max_workers=2, result_dir=..., ...)
+    .register(kind, fn) / .submit(kind, params, created_by) -> job_id
+    .get(job_id) / .start() / .stop() / .is_running()
+    .run_pending(limit=None) -> run queued jobs synchronously
+    .reap_stale() -> (requeued, failed)
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import ASCENDING, ReturnDocument
+
+from claim_loop import ClaimLoop
+
+JOB_RESULT_DIR = os.getenv(
+    "JOB_RESULT_DIR", os.path.join(tempfile.gettempdir(), "budgetmind_jobs")
+)
+
+
+class JobContext:
+    def __init__(self, queue: "JobQueue", job: Dict[str, Any]):
+        self.queue = queue
+        self.job = job
+        self.job_id = job["_id"]
+        self.claim_id = job.get("claim_id")
+
+    def progress(self, pct: float, message: Optional[str] = None):
+        update = {"progress": max(0, min(100, int(pct))), "heartbeat_at": datetime.utcnow()}
+        if message is not None:
+            update["message"] = message
+        self.queue.collection.update_one(
+            {"_id": self.job_id, "claim_id": self.claim_id}, {"$set": update}
+        )
+
+    def result_path(self, filename: str) -> str:
+        job_dir = os.path.join(self.queue.result_dir, str(self.job_id))
+        os.makedirs(job_dir, exist_ok=True)
+        return os.path.join(job_dir, filename)
+
+
+class JobQueue(ClaimLoop):
+    def __init__(
+        self,
+        collection,
+        max_workers: int = 2,
+        result_dir: str = JOB_RESULT_DIR,
+        poll_seconds: float = 2.0,
+        result_ttl_hours: int = 24,
+        heartbeat_timeout_seconds: float = 600,
+        max_attempts: int = 3,
+    ):
+        super().__init__(max_workers, poll_seconds, "compliance-job")
+        self.collection = collection
+        self.result_dir = result_dir
+        self.result_ttl_hours = result_ttl_hours
+        self.heartbeat_timeout_seconds = heartbeat_timeout_seconds
+        self.max_attempts = max_attempts
+        self.handlers: Dict[str, Callable[[Dict[str, Any], JobContext], Dict[str, Any]]] = {}
+
+        self._last_purge = None
+        self._last_reap = None
+
+    # ------------------------------------------------------------------
+    # Jobs
+    # ------------------------------------------------------------------
+
+    def register(self, kind: str, fn: Callable[[Dict[str, Any], JobContext], Dict[str, Any]]):
+        self.handlers[kind] = fn
+
+    def submit(self, kind: str, params: Optional[Dict[str, Any]] = None, created_by: Optional[str] = None) -> str:
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        now = datetime.utcnow()
+        job_id = self.collection.insert_one({
+            "kind": kind,
+            "params": params or {},
+            "status": "queued",
+            "progress": 0,
+            "message": None,
+            "created_by": created_by,
+            "created_at": now,
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "result_file": None,
+            "error": None,
+            "attempts": 0,
+        }).inserted_id
+        self.wake()
+        return str(job_id)
+
+    def get(self, job_id) -> Optional[Dict[str, Any]]:
+        try:
+            oid = job_id if isinstance(job_id, ObjectId) else ObjectId(job_id)
+        except Exception:
+            return None
+        return self.collection.find_one({"_id": oid})
+
+    # ------------------------------------------------------------------
+    # Running
+    # ------------------------------------------------------------------
+
+    def _ensure_indexes(self):
+        self.collection.create_index([("status", ASCENDING), ("created_at", ASCENDING)])
+
+    def reap_stale(self) -> Tuple[int, int]:
+        """
+        Requeue running jobs whose heartbeat is older than the timeout, or
+        fail them once they've used max_attempts. Returns (requeued, failed).
+        """
+        now = datetime.utcnow()
+        stale = {
+            "status": "running",
+            "heartbeat_at": {"$lt": now - timedelta(seconds=self.heartbeat_timeout_seconds)},
+        }
+        failed = self.collection.update_many(
+            {**stale, "attempts": {"$gte": self.max_attempts}},
+            {"$set": {
+                "status": "failed",
+                "error": "Worker stopped responding",
+                "finished_at": now,
+            }},
+        ).modified_count
+        requeued = self.collection.update_many(
+            stale,
+            {"$set": {"status": "queued", "message": "Requeued after the worker stopped responding"}},
+        ).modified_count
+        if failed or requeued:
+            print("JOB REAPER:", requeued, "requeued,", failed, "failed")
+        return requeued, failed
+
+    def _claim(self) -> Optional[Dict[str, Any]]:
+        now = datetime.utcnow()
+        # Reap at most once per poll interval, not on every claim attempt
+        if self._last_reap is None or now - self._last_reap >= timedelta(seconds=self.poll_seconds):
+            self._last_reap = now
+            self.reap_stale()
+        return self.collection.find_one_and_update(
+            {"status": "queued", "kind": {"$in": list(self.handlers)}},
+            {
+                "$set": {
+                    "status": "running",
+                    "started_at": now,
+                    "heartbeat_at": now,
+                    "claim_id": ObjectId(),
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def _heartbeat(self, job: Dict[str, Any], done: threading.Event):
+        interval = self.heartbeat_timeout_seconds / 3
+        while not done.wait(interval):
+            try:
+                self.collection.update_one(
+                    {"_id": job["_id"], "claim_id": job["claim_id"]},
+                    {"$set": {"heartbeat_at": datetime.utcnow()}},
+                )
+            except Exception as e:
+                print("JOB HEARTBEAT ERROR:", job.get("_id"), e)
+
+    def _handle(self, job: Dict[str, Any]):
+        ctx = JobContext(self, job)
+        current = {"_id": job["_id"], "claim_id": job.get("claim_id")}
+        done = threading.Event()
+        beat = threading.Thread(
+            target=self._heartbeat, args=(job, done), name="compliance-job-heartbeat", daemon=True
+        )
+        beat.start()
+        try:
+            outcome = self.handlers[job["kind"]](job.get("params") or {}, ctx) or {}
+            update = {
+                "status": "done",
+                "progress": 100,
+                "finished_at": datetime.utcnow(),
+                "result": outcome.get("result"),
+            }
+            if outcome.get("file"):
+                update["result_file"] = {
+                    "path": outcome["file"],
+                    "mimetype": outcome.get("mimetype", "application/octet-stream"),
+                    "download_name": outcome.get("download_name") or os.path.basename(outcome["file"]),
+                }
+            self.collection.update_one(current, {"$set": update})
+        except Exception as e:
+            print("JOB ERROR:", job.get("kind"), job.get("_id"), e)
+            self.collection.update_one(
+                current,
+                {"$set": {
+                    "status": "failed",
+                    "error": str(e),
+                    "finished_at": datetime.utcnow(),
+                }},
+            )
+        finally:
+            done.set()
+
+    def purge_expired(self) -> int:
+        """Delete finished jobs (and their files) older than result_ttl_hours."""
+        cutoff = datetime.utcnow() - timedelta(hours=self.result_ttl_hours)
+        expired = list(self.collection.find(
+            {"status": {"$in": ["done", "failed"]}, "finished_at": {"$lt": cutoff}},
+            {"_id": 1},
+        ))
+        for job in expired:
+            shutil.rmtree(os.path.join(self.result_dir, str(job["_id"])), ignore_errors=True)
+        if expired:
+            self.collection.delete_many({"_id": {"$in": [j["_id"] for j in expired]}})
+        return len(expired)
+
+    def _tick(self):
+        now = datetime.utcnow()
+        if self._last_purge is None or now - self._last_purge > timedelta(hours=1):
+            self._last_purge = now
+            self.purge_expired()
@@ -0,0 +1,145 @@
+"""
+pdf_report.py
+
+Page-at-a-time PDF writer for long tabular reports.
+
+Platypus (SimpleDocTemplate + one Paragraph per line) keeps every
+flowable in memory until build(). TableReport instead draws straight onto
+a reportlab canvas: rows are buffered only until the current page is
+full, drawn as one fixed-row-height Table, and the page is closed. Memory
+is bounded by one page of rows plus the canvas' compressed page streams,
+and a report can be written to any binary file object (a temp file for
+large exports).
+
+Usage:
+    report = TableReport(out, "Title", columns=[("Date", 70), ...])
+    report.section("User: a@b.c", "Balance: $1.00")
+    report.rows(iterable_of_tuples)   # or report.note("No transactions")
+    report.close()
+
+Provides:
+- TableReport(out, title, columns, pagesize=letter)
+    .section(heading, subheading=None) / .rows(rows) -> int / .note(text)
+    .close()
+"""
+
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.units import inch
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Table, TableStyle
+
+ROW_HEIGHT = 14
+FONT = "Helvetica"
+FONT_BOLD = "Helvetica-Bold"
+FONT_SIZE = 8
+
+_TABLE_STYLE = TableStyle([
+    ("FONTNAME", (0, 0), (-1, -1), FONT),
+    ("FONTSIZE", (0, 0), (-1, -1), FONT_SIZE),
+    ("FONTNAME", (0, 0), (-1, 0), FONT_BOLD),
+    ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#e8eaf0")),
+    ("LINEBELOW", (0, 0), (-1, 0), 0.5, colors.grey),
+    ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.white, colors.HexColor("#f7f7f9")]),
+    ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+    ("ALIGN", (-1, 0), (-1, -1), "RIGHT"),
+])
+
+
+class TableReport:
+    def __init__(
+        self,
+        out,
+        title: str,
+        columns: Sequence[Tuple[str, float]],
+        pagesize=letter,
+        margin: float = 0.6 * inch,
+    ):
+        self.canvas = canvas.Canvas(out, pagesize=pagesize)
+        self.title = title
+        self.headers = [name for name, _ in columns]
+        self.col_widths = [width for _, width in columns]
+        # Rough characters per column at FONT_SIZE, so long text never overflows
+        self.max_chars = [max(4, int(width / (FONT_SIZE * 0.5))) for width in self.col_widths]
+        self.width, self.height = pagesize
+        self.margin = margin
+        self.page = 0
+        self.y = 0.0
+        self._new_page()
+
+    def _new_page(self):
+        if self.page:
+            self.canvas.showPage()
+        self.page += 1
+        c = self.canvas
+        c.setFont(FONT_BOLD, 14 if self.page == 1 else 9)
+        c.drawString(self.margin, self.height - self.margin, self.title)
+        c.setFont(FONT, 7)
+        c.drawRightString(self.width - self.margin, self.margin / 2, f"Page {self.page}")
+        self.y = self.height - self.margin - (0.4 * inch if self.page == 1 else 0.25 * inch)
+
+    def _space(self) -> float:
+        return self.y - self.margin
+
+    def _ensure(self, needed: float):
+        if self._space() < needed:
+            self._new_page()
+
+    def section(self, heading: str, subheading: Optional[str] = None):
+        # Keep a heading together with at least a few rows
+        self._ensure(ROW_HEIGHT * 6)
+        c = self.canvas
+        c.setFont(FONT_BOLD, 10)
+        c.drawString(self.margin, self.y - 10, heading)
+        self.y -= 14
+        if subheading:
+            c.setFont(FONT, 9)
+            c.drawString(self.margin, self.y - 10, subheading)
+            self.y -= 13
+        self.y -= 4
+
+    def note(self, text: str):
+        self._ensure(ROW_HEIGHT * 2)
+        self.canvas.setFont("Helvetica-Oblique", 9)
+        self.canvas.drawString(self.margin, self.y - 10, text)
+        self.y -= ROW_HEIGHT + 8
+
+    def _cell(self, value, i: int) -> str:
+        text = "" if value is None else str(value)
+        limit = self.max_chars[i]
+        return text if len(text) <= limit else text[: limit - 1] + "…"
+
+    def _draw_chunk(self, chunk: List[List[str]]):
+        table = Table(
+            [self.headers] + chunk,
+            colWidths=self.col_widths,
+            rowHeights=ROW_HEIGHT,
+        )
+        table.setStyle(_TABLE_STYLE)
+        _, h = table.wrapOn(self.canvas, self.width, self.height)
+        table.drawOn(self.canvas, self.margin, self.y - h)
+        self.y -= h + 10
+
+    def rows(self, rows: Iterable[Sequence]) -> int:
+        """Draw rows as tables split across pages. Returns the row count."""
+        count = 0
+        chunk: List[List[str]] = []
+        capacity = 0
+        for row in rows:
+            if not chunk:
+                self._ensure(ROW_HEIGHT * 3)
+                # Rows that fit under a header row on what's left of this page
+                capacity = max(1, int((self._space() - 10) // ROW_HEIGHT) - 1)
+            chunk.append([self._cell(v, i) for i, v in enumerate(row)])
+            count += 1
+            if len(chunk) >= capacity:
+                self._draw_chunk(chunk)
+                chunk = []
+        if chunk:
+            self._draw_chunk(chunk)
+        return count
+
+    def close(self):
+        self.canvas.save()
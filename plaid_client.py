@@ -8,14 +8,24 @@ Plaid sandbox helper for BudgetMind AI.
 - Products: transactions (includes balances)
 
 Provides:
+- get_plaid_client()  -> shared, pooled PlaidApi for this process
+- get_plaid_client_stats() -> connection reuse counters
 - exchange_public_token(public_token)
 - get_current_balances(access_token)
-- get_recent_transactions(access_token, days=30)
+- get_recent_transactions(access_token, days=30)  -> one page
+- get_all_transactions(access_token, days=30)     -> every page, de-duplicated
+- sync_transactions(access_token, cursor=None) -> added/modified/removed deltas
+- refresh_bank_item(access_token, cursor=None) -> balances + transactions,
+  fetched concurrently, with per-call timings
 - create_sandbox_access_token()  -> {"access_token": ..., "item_id": ...}
 """
 
 import os
+import json
+import time
 import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, List, Optional
 
 from dotenv import load_dotenv
@@ -34,9 +44,16 @@ from plaid.model.transactions_get_request import TransactionsGetRequest
 from plaid.model.transactions_get_request_options import (
     TransactionsGetRequestOptions,
 )
+from plaid.model.transactions_sync_request import TransactionsSyncRequest
 from plaid.model.sandbox_public_token_create_request import (
     SandboxPublicTokenCreateRequest,
 )
+from plaid.model.sandbox_public_token_create_request_options import (
+    SandboxPublicTokenCreateRequestOptions,
+)
+from plaid.model.sandbox_public_token_create_request_options_transactions import (
+    SandboxPublicTokenCreateRequestOptionsTransactions,
+)
 
 # ---------------------------------------------------------------------------
 # ENV CONFIG (sandbox only)
@@ -58,20 +75,56 @@ PLAID_COUNTRY_CODES = ["US", "CA"]
 # Default sandbox institution (First Platypus Bank)
 PLAID_SANDBOX_INSTITUTION_ID = "ins_109508"
 
+# Sandbox host; overridable so tests can point at a local stand-in.
+PLAID_HOST = os.getenv("PLAID_HOST", "https://sandbox.plaid.com")
+
+# Max keep-alive connections per host, shared by all threads in a worker.
+PLAID_POOL_MAXSIZE = int(os.getenv("PLAID_POOL_MAXSIZE", "10"))
+
+# History requested for new sandbox items; covers the advisor's 365-day view.
+PLAID_TRANSACTIONS_DAYS_REQUESTED = int(
+    os.getenv("PLAID_TRANSACTIONS_DAYS_REQUESTED", "365")
+)
+
+# /transactions/get refuses larger pages.
+PLAID_MAX_PAGE_SIZE = 500
+
+# Times sync_transactions restarts its pagination when the item changes
+# mid-sync before giving up (the refresh is retried on its next run).
+PLAID_SYNC_MAX_RESTARTS = 3
+
+# (connect, read) timeout in seconds, passed on every Plaid call.
+PLAID_REQUEST_TIMEOUT = (
+    float(os.getenv("PLAID_CONNECT_TIMEOUT", "5")),
+    float(os.getenv("PLAID_READ_TIMEOUT", "30")),
+)
+
 
 # ---------------------------------------------------------------------------
-# Client factory
+# Client registry
 # ---------------------------------------------------------------------------
+#
+# One PlaidApi per process. Its urllib3 PoolManager keeps connections (and
+# their TLS sessions) alive between calls and is safe to share between
+# threads. After a fork (gunicorn workers) the child must not reuse the
+# parent's sockets, so the client is keyed by pid and dropped in the child.
 
-def get_plaid_client() -> plaid_api.PlaidApi:
+_client_lock = threading.Lock()
+_client: Optional[plaid_api.PlaidApi] = None
+_client_pid: Optional[int] = None
+_clients_built = 0
+_client_lookups = 0
+
+
+def _build_plaid_client() -> plaid_api.PlaidApi:
     """
-    Build and return a PlaidApi client pointed at the Sandbox environment.
+    Build a PlaidApi client pointed at the Sandbox environment.
 
     NOTE: We hard-code the sandbox host URL instead of using plaid.Environment
     because some installs don't expose plaid.Environment.
     """
     configuration = Configuration(
-        host="https://sandbox.plaid.com",
+        host=PLAID_HOST,
         api_key={
             "clientId": PLAID_CLIENT_ID,
             "secret": PLAID_SECRET,
@@ -79,10 +132,81 @@ def get_plaid_client() -> plaid_api.PlaidApi:
             "plaidVersion": "2020-09-14",
         },
     )
+    configuration.connection_pool_maxsize = PLAID_POOL_MAXSIZE
     api_client = ApiClient(configuration)
     return plaid_api.PlaidApi(api_client)
 
 
+def get_plaid_client() -> plaid_api.PlaidApi:
+    """
+    Return this process's shared PlaidApi client, building it on first use
+    (or on first use after a fork).
+    """
+    global _client, _client_pid, _clients_built, _client_lookups
+
+    pid = os.getpid()
+    with _client_lock:
+        _client_lookups += 1
+        if _client is None or _client_pid != pid:
+            _client = _build_plaid_client()
+            _client_pid = pid
+            _clients_built += 1
+        return _client
+
+
+def reset_plaid_client():
+    """Drop the shared client; the next call builds a fresh one."""
+    global _client, _client_pid
+    with _client_lock:
+        _client = None
+        _client_pid = None
+
+
+def _reset_after_fork():
+    # The lock may have been held by another thread at fork time.
+    global _client_lock, _client, _client_pid
+    _client_lock = threading.Lock()
+    _client = None
+    _client_pid = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_plaid_client_stats() -> Dict[str, Any]:
+    """
+    Connection reuse counters for this process.
+
+    connections_opened counts new TCP/TLS connections made by the pool;
+    every request beyond that went over a kept-alive connection.
+    """
+    with _client_lock:
+        client = _client if _client_pid == os.getpid() else None
+        stats = {
+            "pid": os.getpid(),
+            "clients_built": _clients_built,
+            "client_lookups": _client_lookups,
+            "pool_maxsize": PLAID_POOL_MAXSIZE,
+            "connections_opened": 0,
+            "requests_sent": 0,
+        }
+
+    if client is not None:
+        pools = client.api_client.rest_client.pool_manager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            stats["connections_opened"] += pool.num_connections
+            stats["requests_sent"] += pool.num_requests
+
+    stats["connections_reused"] = max(
+        stats["requests_sent"] - stats["connections_opened"], 0
+    )
+    return stats
+
+
 def _parse_products(products: List[str]):
     return [Products(p.strip()) for p in products if p.strip()]
 
@@ -102,7 +226,9 @@ def exchange_public_token(public_token: str) -> Dict[str, Any]:
     """
     client = get_plaid_client()
     req = ItemPublicTokenExchangeRequest(public_token=public_token)
-    resp = client.item_public_token_exchange(req)
+    resp = client.item_public_token_exchange(
+        req, _request_timeout=PLAID_REQUEST_TIMEOUT
+    )
     return resp.to_dict()
 
 
@@ -114,28 +240,22 @@ def get_current_balances(access_token: str) -> Dict[str, Any]:
     """
     client = get_plaid_client()
     req = AccountsBalanceGetRequest(access_token=access_token)
-    resp = client.accounts_balance_get(req)
+    resp = client.accounts_balance_get(
+        req, _request_timeout=PLAID_REQUEST_TIMEOUT
+    )
     return resp.to_dict()
 
 
-def get_recent_transactions(
+def _transactions_page(
     access_token: str,
-    days: int = 30,
-    account_ids: Optional[List[str]] = None,
-    count: int = 100,
-    offset: int = 0,
+    start_date: datetime.date,
+    end_date: datetime.date,
+    account_ids: Optional[List[str]],
+    count: int,
+    offset: int,
 ) -> Dict[str, Any]:
-    """
-    Get recent transactions for the last `days` days.
-
-    NOTE: Plaid's client requires account_ids to be a list *or omitted*,
-    it must not be None, so we only pass it when we have one.
-    """
     client = get_plaid_client()
 
-    end_date = datetime.date.today()
-    start_date = end_date - datetime.timedelta(days=days)
-
     # Build options without account_ids when it's None
     if account_ids:
         options = TransactionsGetRequestOptions(
@@ -155,10 +275,221 @@ def get_recent_transactions(
         end_date=end_date,
         options=options,
     )
-    resp = client.transactions_get(req)
+    resp = client.transactions_get(
+        req, _request_timeout=PLAID_REQUEST_TIMEOUT
+    )
     return resp.to_dict()
 
 
+def get_recent_transactions(
+    access_token: str,
+    days: int = 30,
+    account_ids: Optional[List[str]] = None,
+    count: int = 100,
+    offset: int = 0,
+) -> Dict[str, Any]:
+    """
+    Get one page of transactions for the last `days` days.
+
+    NOTE: Plaid's client requires account_ids to be a list *or omitted*,
+    it must not be None, so we only pass it when we have one.
+    """
+    end_date = datetime.date.today()
+    start_date = end_date - datetime.timedelta(days=days)
+    return _transactions_page(
+        access_token, start_date, end_date, account_ids, count, offset
+    )
+
+
+def get_all_transactions(
+    access_token: str,
+    days: int = 30,
+    account_ids: Optional[List[str]] = None,
+    page_size: int = PLAID_MAX_PAGE_SIZE,
+    max_concurrency: int = 4,
+) -> Dict[str, Any]:
+    """
+    Get every transaction for the last `days` days (30, 90, 365, ...).
+
+    Reads the first page, then fetches the remaining offsets implied by
+    `total_transactions` with at most `max_concurrency` page requests in
+    flight. Pages are merged and de-duplicated on transaction_id, since
+    offset paging can repeat a row when something posts mid-fetch.
+
+    Returns the same shape as get_recent_transactions() with all rows in
+    "transactions".
+    """
+    page_size = max(1, min(page_size, PLAID_MAX_PAGE_SIZE))
+    end_date = datetime.date.today()
+    start_date = end_date - datetime.timedelta(days=days)
+
+    def fetch(offset: int) -> Dict[str, Any]:
+        return _transactions_page(
+            access_token, start_date, end_date, account_ids, page_size, offset
+        )
+
+    first = fetch(0)
+    total = int(first.get("total_transactions") or 0)
+    pages = [first]
+
+    offsets = list(range(page_size, total, page_size))
+    if offsets:
+        workers = max(1, min(max_concurrency, len(offsets)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="plaid-page") as pool:
+            pages.extend(pool.map(fetch, offsets))
+
+    seen = set()
+    merged: List[Dict[str, Any]] = []
+    for page in pages:
+        for tx in page.get("transactions", []):
+            tx_id = tx.get("transaction_id")
+            if tx_id:
+                if tx_id in seen:
+                    continue
+                seen.add(tx_id)
+            merged.append(tx)
+
+    result = dict(first)
+    result["transactions"] = merged
+    result["total_transactions"] = total
+    return result
+
+
+def sync_transactions(
+    access_token: str,
+    cursor: Optional[str] = None,
+    count: int = 500,
+) -> Dict[str, Any]:
+    """
+    Pull only the transaction changes since `cursor` via /transactions/sync.
+
+    Follows `has_more` until the item is caught up and returns the combined
+    deltas:
+      {
+        "added":       [transaction, ...],
+        "modified":    [transaction, ...],
+        "removed":     [transaction_id, ...],
+        "next_cursor": "<cursor to store for the next call>",
+      }
+
+    cursor=None (or "") means "first sync": Plaid returns the item's whole
+    history as `added`.
+
+    If the item changes while paging, the loop restarts from `cursor`, at
+    most PLAID_SYNC_MAX_RESTARTS times; after that the Plaid error is
+    raised.
+    """
+    client = get_plaid_client()
+    start_cursor = cursor or ""
+    restarts = 0
+
+    while True:
+        added: List[Dict[str, Any]] = []
+        modified: List[Dict[str, Any]] = []
+        removed: List[str] = []
+        next_cursor = start_cursor
+
+        try:
+            has_more = True
+            while has_more:
+                req = TransactionsSyncRequest(
+                    access_token=access_token,
+                    cursor=next_cursor,
+                    count=count,
+                )
+                resp = client.transactions_sync(
+                    req, _request_timeout=PLAID_REQUEST_TIMEOUT
+                ).to_dict()
+
+                added.extend(resp.get("added", []))
+                modified.extend(resp.get("modified", []))
+                removed.extend(
+                    r.get("transaction_id")
+                    for r in resp.get("removed", [])
+                    if r.get("transaction_id")
+                )
+                next_cursor = resp.get("next_cursor") or next_cursor
+                has_more = bool(resp.get("has_more"))
+        except plaid.ApiException as e:
+            # Plaid asks us to restart the whole pagination loop from the
+            # original cursor if the item changed while we were paging.
+            if (
+                _plaid_error_code(e) == "TRANSACTIONS_SYNC_MUTATION_DURING_PAGINATION"
+                and restarts < PLAID_SYNC_MAX_RESTARTS
+            ):
+                restarts += 1
+                continue
+            raise
+
+        return {
+            "added": added,
+            "modified": modified,
+            "removed": removed,
+            "next_cursor": next_cursor,
+        }
+
+
+def _timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, round((time.perf_counter() - start) * 1000.0, 1)
+
+
+def refresh_bank_item(
+    access_token: str,
+    cursor: Optional[str] = None,
+    sync: bool = True,
+    days: int = 30,
+) -> Dict[str, Any]:
+    """
+    Fetch balances and transactions for one item at the same time.
+
+    The two Plaid calls are independent, so the balance call runs on a
+    helper thread while the transactions call runs on the caller's thread;
+    wall-clock time is roughly the slower of the two instead of their sum.
+
+    sync=True  -> transactions leg is sync_transactions(access_token, cursor)
+    sync=False -> transactions leg is get_all_transactions(days), every page
+
+    Returns:
+      {
+        "balances":     <accounts_balance_get dict>,
+        "transactions": <sync_transactions() / transactions_get dict>,
+        "timings_ms":   {"balances": .., "transactions": .., "total": ..},
+      }
+    """
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="plaid-balance") as pool:
+        balances_future = pool.submit(_timed, get_current_balances, access_token)
+
+        if sync:
+            transactions, tx_ms = _timed(sync_transactions, access_token, cursor)
+        else:
+            transactions, tx_ms = _timed(
+                get_all_transactions, access_token, days=days
+            )
+
+        balances, balances_ms = balances_future.result()
+
+    return {
+        "balances": balances,
+        "transactions": transactions,
+        "timings_ms": {
+            "balances": balances_ms,
+            "transactions": tx_ms,
+            "total": round((time.perf_counter() - start) * 1000.0, 1),
+        },
+    }
+
+
+def _plaid_error_code(exc: Exception) -> Optional[str]:
+    try:
+        return json.loads(exc.body).get("error_code")
+    except Exception:
+        return None
+
+
 def create_sandbox_access_token() -> Dict[str, str]:
     """
     SERVER-SIDE ONLY.
@@ -173,11 +504,18 @@ def create_sandbox_access_token() -> Dict[str, str]:
     sandbox_req = SandboxPublicTokenCreateRequest(
         institution_id=PLAID_SANDBOX_INSTITUTION_ID,
         initial_products=_parse_products(PLAID_PRODUCTS),
+        options=SandboxPublicTokenCreateRequestOptions(
+            transactions=SandboxPublicTokenCreateRequestOptionsTransactions(
+                days_requested=PLAID_TRANSACTIONS_DAYS_REQUESTED,
+            ),
+        ),
         # In sandbox this is optional, but you *could* also set country_codes:
         # country_codes=_parse_country_codes(PLAID_COUNTRY_CODES),
     )
 
-    sandbox_resp = client.sandbox_public_token_create(sandbox_req)
+    sandbox_resp = client.sandbox_public_token_create(
+        sandbox_req, _request_timeout=PLAID_REQUEST_TIMEOUT
+    )
     public_token = sandbox_resp.public_token
 
     exchange = exchange_public_token(public_token)
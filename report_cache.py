@@ -0,0 +1,133 @@
+"""
+report_cache.py
+
+Content-addressed, size-bounded disk cache for generated report files
+(compliance CSV / PDF exports).
+
+An artifact's key is the SHA-256 of the report kind, its parameters and a
+data version (anything that changes when the underlying data does, e.g.
+the newest updated_at plus a document count). The same key always names
+the same bytes, so it doubles as a strong ETag; when the data changes the
+key changes and the old artifact simply ages out.
+
+Artifacts are stored as <directory>/<key><suffix>. Writes go to a temp
+file in the same directory and are renamed into place, so concurrent
+builders (several gunicorn workers) never serve a partial file. Reading
+an artifact bumps its mtime; after each write the least recently used
+files are deleted until the directory is under max_bytes.
+
+Provides:
+- REPORT_CACHE_DIR, REPORT_CACHE_MAX_BYTES
+- ReportCache(directory, max_bytes)
+    .key(kind, params, version) -> str
+    .get(key, suffix) -> path | None
+    .build(key, suffix, write_fn, mode="wb") -> path
+    .build_stream(key, suffix, chunks) -> generator re-yielding chunks
+    .evict(keep=None) -> number of files removed
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+REPORT_CACHE_DIR = os.getenv(
+    "REPORT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "budgetmind_reports")
+)
+REPORT_CACHE_MAX_BYTES = int(os.getenv("REPORT_CACHE_MAX_MB", "512")) * 1024 * 1024
+
+
+class ReportCache:
+    def __init__(self, directory: str = REPORT_CACHE_DIR, max_bytes: int = REPORT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(kind: str, params: Optional[Dict[str, Any]], version: Any) -> str:
+        payload = json.dumps(
+            {"kind": kind, "params": params or {}, "version": version},
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.directory, key + suffix)
+
+    def get(self, key: str, suffix: str = "") -> Optional[str]:
+        path = self._path(key, suffix)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def build(self, key: str, suffix: str, write_fn: Callable[[Any], None], mode: str = "wb") -> str:
+        """Write an artifact with write_fn(file_obj), move it into place and evict."""
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-", suffix=suffix)
+        try:
+            kwargs = {"newline": "", "encoding": "utf-8"} if "b" not in mode else {}
+            with os.fdopen(fd, mode, **kwargs) as f:
+                write_fn(f)
+            path = self._path(key, suffix)
+            os.replace(tmp_path, path)
+        except Exception:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        self.evict(keep=path)
+        return path
+
+    def build_stream(self, key: str, suffix: str, chunks: Iterable[str], encoding: str = "utf-8") -> Iterator[str]:
+        """
+        Pass text chunks through to the caller while writing them to the
+        cache. The artifact is only kept if the stream runs to the end.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-", suffix=suffix)
+        complete = False
+        try:
+            with os.fdopen(fd, "w", newline="", encoding=encoding) as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    yield chunk
+            path = self._path(key, suffix)
+            os.replace(tmp_path, path)
+            complete = True
+            self.evict(keep=path)
+        finally:
+            if not complete:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """Delete least recently used artifacts until the cache fits max_bytes."""
+        try:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and not entry.name.startswith(".tmp-"):
+                    st = entry.stat()
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+        except OSError:
+            return 0
+
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
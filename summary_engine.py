@@ -0,0 +1,83 @@
+"""
+summary_engine.py
+
+Builder for the Plaid summary payload (labels / income / expenses /
+categoryBreakdown / transactions) returned by app._build_plaid_summary.
+
+Rows are expected to carry the ingest-time fields set by
+app._enrich_transaction (posted_date, signed_amount, canonical_category);
+rows without them are passed through `enrich` first, so the loop itself
+does no date parsing or classification.
+
+Provides:
+- build_summary(txs, cutoff_date, enrich=None) -> dict
+"""
+
+from datetime import date
+from typing import Callable, Dict, List, Optional
+
+
+def _prepare(txs: List[dict], enrich: Optional[Callable[[dict], dict]]) -> List[dict]:
+    if enrich is not None:
+        for tx in txs:
+            if "is_income" not in tx:
+                enrich(tx)
+    return txs
+
+
+def _tx_output(tx: dict, date_key: str) -> dict:
+    return {
+        "date": date_key,
+        "name": tx.get("name", ""),
+        "category": tx["canonical_category"],
+        "amount": tx["signed_amount"],
+        "transaction_id": tx.get("transaction_id"),
+    }
+
+
+def build_summary(
+    txs: List[dict],
+    cutoff_date: date,
+    enrich: Optional[Callable[[dict], dict]] = None,
+) -> dict:
+    """Summary of rows dated on or after `cutoff_date`, grouped by day."""
+    filtered = []
+    for tx in _prepare(txs, enrich):
+        posted = tx.get("posted_date")
+        if posted is None:
+            continue
+        d = posted.date()
+        if d < cutoff_date:
+            continue
+        filtered.append((d, tx))
+
+    # Sort ascending by date
+    filtered.sort(key=lambda x: x[0])
+
+    income_by_day: Dict[str, float] = {}
+    expense_by_day: Dict[str, float] = {}
+    categories: Dict[str, float] = {}
+    tx_output = []
+
+    for d, tx in filtered:
+        signed = tx["signed_amount"]
+        date_key = d.isoformat()
+
+        if signed >= 0:
+            income_by_day[date_key] = income_by_day.get(date_key, 0.0) + signed
+        else:
+            val = abs(signed)
+            expense_by_day[date_key] = expense_by_day.get(date_key, 0.0) + val
+            cat = tx["canonical_category"]
+            categories[cat] = categories.get(cat, 0.0) + val
+
+        tx_output.append(_tx_output(tx, date_key))
+
+    labels = sorted(set(income_by_day) | set(expense_by_day))
+    return {
+        "labels": labels,
+        "income": [round(income_by_day.get(d, 0.0), 2) for d in labels],
+        "expenses": [round(expense_by_day.get(d, 0.0), 2) for d in labels],
+        "categoryBreakdown": {k: round(v, 2) for k, v in categories.items()},
+        "transactions": tx_output,
+    }
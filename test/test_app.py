@@ -156,3 +156,755 @@ def test_select_advisor(client):
     users_col.delete_one({"_id": logged_user_oid})
     users_col.delete_one({"_id": advisor_oid})
     clients_col.delete_many({"advisor_id": advisor_oid})
+
+
+
+def test_bank_status_applies_sync_deltas(client, monkeypatch):
+    import app as app_module
+    from app import bank_accounts_col, bank_transactions_col
+    from datetime import date
+
+    with client.session_transaction() as s:
+        logged_user_id = s["user_id"]
+
+    today = date.today().isoformat()
+    bank_accounts_col.insert_one({
+        "user_id": logged_user_id,
+        "access_token": "access-sandbox-test",
+        "transactions_cursor": "cursor-1",
+        "recent_transactions": [
+            {"transaction_id": "tx1", "name": "Starbucks", "amount": 8, "date": today},
+            {"transaction_id": "tx2", "name": "Uber", "amount": 21, "date": today},
+        ],
+    })
+
+    monkeypatch.setattr(app_module, "refresh_bank_item", lambda token, cursor=None: {
+        "balances": {"accounts": [{"balances": {"current": 250.0}}]},
+        "transactions": {
+            "added": [{"transaction_id": "tx3", "name": "Payroll", "amount": 900, "date": today}],
+            "modified": [],
+            "removed": ["tx1"],
+            "next_cursor": "cursor-2",
+        },
+        "timings_ms": {"balances": 1.0, "transactions": 1.0, "total": 1.0},
+    })
+
+    res = client.get("/api/bank/status")
+    assert res.status_code == 200
+    assert res.get_json()["current_balance"] == 250.0
+
+    doc = bank_accounts_col.find_one({"user_id": logged_user_id})
+    assert doc["transactions_cursor"] == "cursor-2"
+    # Legacy embedded array is migrated into bank_transactions on sync
+    assert "recent_transactions" not in doc
+    assert doc["transaction_count"] == 2
+    rows = bank_transactions_col.find({"user_id": logged_user_id})
+    assert {tx["transaction_id"] for tx in rows} == {"tx2", "tx3"}
+
+    bank_accounts_col.delete_many({"user_id": logged_user_id})
+    bank_transactions_col.delete_many({"user_id": logged_user_id})
+
+
+
+def test_bank_refresher_claims_due_items_once():
+    from app import bank_accounts_col
+    from bank_refresh import BankRefreshScheduler
+    from datetime import datetime, timedelta
+
+    now = datetime.utcnow()
+    due_id = bank_accounts_col.insert_one({
+        "user_id": str(ObjectId()),
+        "access_token": "access-sandbox-due",
+        "next_refresh_at": now - timedelta(minutes=1),
+        "last_viewed_at": now,
+    }).inserted_id
+    later_id = bank_accounts_col.insert_one({
+        "user_id": str(ObjectId()),
+        "access_token": "access-sandbox-later",
+        "next_refresh_at": now + timedelta(hours=1),
+        "last_viewed_at": now,
+    }).inserted_id
+
+    refreshed = []
+    scheduler = BankRefreshScheduler(
+        bank_accounts_col,
+        lambda doc: refreshed.append(doc["_id"]),
+        interval_seconds=600,
+        jitter_seconds=60,
+    )
+
+    scheduler.run_pending()
+    scheduler.run_pending()
+
+    assert due_id in refreshed
+    assert refreshed.count(due_id) == 1
+    assert later_id not in refreshed
+
+    doc = bank_accounts_col.find_one({"_id": due_id})
+    assert doc["next_refresh_at"] > now + timedelta(seconds=599)
+
+    bank_accounts_col.delete_many({"_id": {"$in": [due_id, later_id]}})
+
+
+def test_simplify_transactions_enriches_rows():
+    from app import _simplify_transactions, _build_plaid_summary
+    from datetime import date, datetime
+
+    rows = _simplify_transactions({"transactions": [
+        {"date": date(2024, 3, 1), "name": "ACME PAYROLL", "amount": 900,
+         "category": None, "personal_finance_category": {"primary": "INCOME"},
+         "transaction_id": "in1"},
+        {"date": "2024-03-02", "name": "Uber", "amount": 12.5,
+         "category": ["Travel", "Taxi"], "transaction_id": "out1"},
+    ]})
+
+    income, expense = rows
+    assert income["posted_date"] == datetime(2024, 3, 1)
+    assert income["is_income"] is True
+    assert income["signed_amount"] == 900.0
+    assert income["canonical_category"] == "Income"
+    assert expense["is_income"] is False
+    assert expense["signed_amount"] == -12.5
+    assert expense["canonical_category"] == "Travel / Taxi"
+
+    # Rows stored before enrichment are filled in on read
+    legacy = {"date": "2024-03-02", "name": "Uber", "amount": 12.5,
+              "category": "Travel / Taxi", "transaction_id": "old1"}
+    summary = _build_plaid_summary(rows + [legacy], date(2024, 3, 1))
+    assert summary["income"] == [900.0, 0.0]
+    assert summary["expenses"] == [0.0, 25.0]
+
+
+def test_daily_rollups_follow_incremental_writes():
+    from app import (
+        bank_accounts_col, bank_transactions_col, daily_rollups_col,
+        _write_transaction_rows, _simplify_transactions, _load_daily_rollups,
+        _rollup_totals,
+    )
+
+    user_id = str(ObjectId())
+    bank_accounts_col.insert_one({"user_id": user_id})
+
+    def txs(*specs):
+        return _simplify_transactions({"transactions": [
+            {"date": d, "name": name, "amount": amt, "category": [cat],
+             "transaction_id": tx_id}
+            for tx_id, d, name, amt, cat in specs
+        ]})
+
+    _write_transaction_rows(user_id, txs(
+        ("t1", "2024-03-01", "Coffee", 5.0, "Food.Drink"),
+        ("t2", "2024-03-01", "Payroll", 800.0, "Income"),
+        ("t3", "2024-03-02", "Uber", 20.0, "Travel"),
+    ), replace=True)
+
+    # t1 grows, t3 disappears
+    _write_transaction_rows(
+        user_id,
+        txs(("t1", "2024-03-01", "Coffee", 7.5, "Food.Drink")),
+        removed_ids=["t3"],
+    )
+
+    rollups = _load_daily_rollups(user_id)
+    assert [r["day"] for r in rollups] == ["2024-03-01"]
+    totals = _rollup_totals(rollups)
+    assert totals["income"] == 800.0
+    assert totals["expenses"] == 7.5
+    assert totals["categories"] == {"Food.Drink": 7.5}
+
+    bank_accounts_col.delete_many({"user_id": user_id})
+    bank_transactions_col.delete_many({"user_id": user_id})
+    daily_rollups_col.delete_many({"user_id": user_id})
+
+
+def test_async_csv_export_job(client, tmp_path, monkeypatch):
+    from app import job_queue, compliance_jobs_col
+
+    monkeypatch.setattr(job_queue, "result_dir", str(tmp_path))
+    with client.session_transaction() as s:
+        s["role"] = "Compliance Regulator"
+
+    res = client.get("/api/compliance/export_csv?async=1")
+    assert res.status_code == 202
+    job_id = res.get_json()["job_id"]
+
+    assert client.get(f"/api/compliance/jobs/{job_id}/result").status_code == 409
+
+    assert job_queue.run_pending(limit=1) == 1
+    status = client.get(f"/api/compliance/jobs/{job_id}").get_json()
+    assert status["status"] == "done"
+    assert status["progress"] == 100
+
+    res = client.get(f"/api/compliance/jobs/{job_id}/result")
+    assert res.status_code == 200
+    assert res.mimetype == "text/csv"
+
+    compliance_jobs_col.delete_one({"_id": ObjectId(job_id)})
+
+
+def test_manual_entry_rescores_vulnerability(client):
+    from app import entries_col, financially_vulnerable_col
+
+    with client.session_transaction() as s:
+        user_id = s["user_id"]
+    user_oid = ObjectId(user_id)
+    advisor_oid = ObjectId()
+    users_col.insert_one({"_id": user_oid, "fullName": "Manual User", "email": "manual@test.com"})
+    clients_col.insert_one({"user_id": user_oid, "advisor_id": advisor_oid,
+                            "status": "Accepted", "priority": "low"})
+
+    client.post("/entry", data={"type": "income", "category": "salary", "amount": "1000"})
+    assert financially_vulnerable_col.find_one({"user_id": user_id}) is None
+
+    client.post("/entry", data={"type": "expense", "category": "rent", "amount": "900"})
+    doc = financially_vulnerable_col.find_one({"user_id": user_id})
+    assert doc["risk_level"] == "high"
+    assert clients_col.find_one({"user_id": user_oid})["priority"] == "high"
+
+    client.post("/entry", data={"type": "income", "category": "bonus", "amount": "2000"})
+    assert financially_vulnerable_col.find_one({"user_id": user_id}) is None
+    assert clients_col.find_one({"user_id": user_oid})["priority"] == "low"
+
+    entries_col.delete_many({"user_id": user_id})
+    users_col.delete_one({"_id": user_oid})
+    clients_col.delete_many({"user_id": user_oid})
+
+
+def test_spending_totals_track_expense_entries(client):
+    from app import entries_col, spending_totals_col, reconcile_spending_totals
+    from datetime import datetime
+
+    with client.session_transaction() as s:
+        user_id = s["user_id"]
+    user_oid = ObjectId(user_id)
+    users_col.insert_one({"_id": user_oid, "email": "totals@test.com", "spending_limit": 100})
+
+    # History from before the counters existed
+    entries_col.insert_one({"user_id": user_id, "type": "expense", "category": "Rent",
+                            "amount": 60.0, "created_at": datetime(2024, 1, 5)})
+
+    client.post("/entry", data={"type": "expense", "category": "food", "amount": "30"})
+    totals = spending_totals_col.find_one({"_id": user_id})
+    assert totals["expense_total"] == 90.0
+    assert totals["by_month"]["2024-01"] == 60.0
+    assert users_col.find_one({"_id": user_oid})["is_flagged"] is False
+
+    client.post("/entry", data={"type": "expense", "category": "food", "amount": "20"})
+    assert spending_totals_col.find_one({"_id": user_id})["expense_total"] == 110.0
+    assert users_col.find_one({"_id": user_oid})["is_flagged"] is True
+
+    spending_totals_col.update_one({"_id": user_id}, {"$set": {"expense_total": -1}})
+    reconcile_spending_totals(user_id)
+    assert spending_totals_col.find_one({"_id": user_id})["expense_total"] == 110.0
+
+    entries_col.delete_many({"user_id": user_id})
+    spending_totals_col.delete_one({"_id": user_id})
+    users_col.delete_one({"_id": user_oid})
+
+
+def test_import_entries_csv(client):
+    import io
+    from app import entries_col, spending_totals_col
+
+    with client.session_transaction() as s:
+        user_id = s["user_id"]
+    user_oid = ObjectId(user_id)
+    users_col.insert_one({"_id": user_oid, "email": "import@test.com", "spending_limit": 100})
+
+    csv_bytes = b"type,category,amount,date\nexpense,rent,90,2024-01-05\nexpense,food,25,2024-01-06\nfoo,x,1,\n"
+    res = client.post(
+        "/api/entries/import",
+        data={"file": (io.BytesIO(csv_bytes), "entries.csv")},
+        content_type="multipart/form-data",
+    )
+    data = res.get_json()
+    assert res.status_code == 201
+    assert data["inserted"] == 2
+    assert data["skipped"] == 1
+    assert entries_col.count_documents({"user_id": user_id}) == 2
+    assert spending_totals_col.find_one({"_id": user_id})["expense_total"] == 115.0
+    assert users_col.find_one({"_id": user_oid})["is_flagged"] is True
+
+    entries_col.delete_many({"user_id": user_id})
+    spending_totals_col.delete_one({"_id": user_id})
+    users_col.delete_one({"_id": user_oid})
+
+
+def test_compliance_summary_counts_and_pages(client):
+    from app import flagged_col
+    from datetime import datetime, timedelta
+
+    with client.session_transaction() as s:
+        s["role"] = "Compliance Regulator"
+
+    marker = str(ObjectId())
+    now = datetime.utcnow()
+    flagged_col.insert_many([
+        {"transaction": {"name": marker, "amount": i}, "risk": risk,
+         "reasons": [], "created_at": now + timedelta(seconds=i)}
+        for i, risk in enumerate(["High", "High", "Low"])
+    ])
+    before = flagged_col.count_documents({})
+
+    data = client.get("/api/compliance/summary?page=1&page_size=2").get_json()
+    assert data["total_flagged"] == before
+    assert sum(data["risk_distribution"].values()) <= before
+    assert len(data["flagged"]) == 2
+    assert data["flagged"][0]["merchant"] == marker
+    assert data["flagged"][0]["amount"] == 2
+    assert data["has_more"] is True
+
+    flagged_col.delete_many({"transaction.name": marker})
+
+
+def test_flagged_users_joins_users_and_ranks_risk(client):
+    from app import flagged_col
+    from datetime import datetime
+
+    with client.session_transaction() as s:
+        s["role"] = "Compliance Regulator"
+
+    user_oid = ObjectId()
+    users_col.insert_one({"_id": user_oid, "fullName": "Flag User", "email": "flag@test.com"})
+    flagged_col.insert_many([
+        {"transaction": {"user_id": str(user_oid)}, "risk": risk, "created_at": datetime.utcnow()}
+        for risk in ["Low", "High", "Medium"]
+    ])
+
+    data = client.get("/api/compliance/flagged_users?sort=risk&page_size=500").get_json()
+    row = next(u for u in data["users"] if u["user_id"] == str(user_oid))
+    assert row["name"] == "Flag User"
+    assert row["flagged_transactions"] == 3
+    assert row["risk"] == "High"
+
+    flagged_col.delete_many({"transaction.user_id": str(user_oid)})
+    users_col.delete_one({"_id": user_oid})
+
+
+def test_flag_transaction_velocity_uses_settings(client):
+    from app import compliance_settings_col, velocity_counters_col
+
+    with client.session_transaction() as s:
+        s["role"] = "Compliance Regulator"
+
+    previous = compliance_settings_col.find_one({"_id": "global"})
+    compliance_settings_col.update_one(
+        {"_id": "global"},
+        {"$set": {"velocity_window_minutes": 10, "velocity_threshold": 2}},
+        upsert=True,
+    )
+    user_id = str(ObjectId())
+    tx = {"user_id": user_id, "name": "Corner Shop", "amount": 5}
+
+    results = [
+        client.post("/api/compliance/flag_transaction", json={"transaction": tx}).get_json()
+        for _ in range(3)
+    ]
+    assert [r["suspicious"] for r in results] == [False, False, True]
+    assert "Velocity pattern detected" in results[2]["reasons"]
+
+    velocity_counters_col.delete_many({"key": {"$regex": f"^{user_id}\\|"}})
+    from app import flagged_col
+    flagged_col.delete_many({"transaction.user_id": user_id})
+    if previous:
+        compliance_settings_col.replace_one({"_id": "global"}, previous)
+    else:
+        compliance_settings_col.delete_one({"_id": "global"})
+
+
+def test_screen_transactions_batch(client):
+    from app import flagged_col
+
+    with client.session_transaction() as s:
+        s["role"] = "Compliance Regulator"
+
+    user_id = str(ObjectId())
+    txs = [
+        {"user_id": user_id, "transaction_id": "t1", "name": "Grocer", "amount": 40},
+        {"user_id": user_id, "transaction_id": "t2", "name": "Lucky Casino", "amount": 10},
+        {"user_id": user_id, "transaction_id": "t3", "name": "Jeweller", "amount": 2500},
+    ]
+    data = client.post("/api/compliance/screen_transactions", json={"transactions": txs}).get_json()
+
+    assert data["ok"] is True
+    assert data["screened"] == 3
+    assert data["flagged"] == 2
+    assert [r["risk"] for r in data["results"]] == ["Low", "Critical", "High"]
+    assert flagged_col.count_documents({"transaction.user_id": user_id}) == 2
+
+    res = client.post("/api/compliance/screen_transactions", json={})
+    assert res.status_code == 400
+
+    flagged_col.delete_many({"transaction.user_id": user_id})
+
+
+def test_export_csv_streams_fixed_columns_with_filters(client):
+    import csv as csv_mod
+    from datetime import datetime
+    from app import flagged_col, FLAGGED_CSV_COLUMNS
+
+    with client.session_transaction() as s:
+        s["role"] = "Compliance Regulator"
+
+    user_id = str(ObjectId())
+    flagged_col.insert_many([
+        {"transaction": {"user_id": user_id, "name": "Casino", "amount": 10},
+         "reasons": ["Suspicious merchant"], "risk": "Critical", "created_at": datetime(2031, 5, 2)},
+        {"transaction": {"user_id": user_id, "name": "Shop", "amount": 2500},
+         "reasons": ["High-value transaction"], "risk": "High", "created_at": datetime(2031, 5, 3)},
+    ])
+
+    res = client.get("/api/compliance/export_csv?start=2031-05-01&end=2031-05-31&risk=critical")
+    assert res.status_code == 200
+    rows = list(csv_mod.reader(res.get_data(as_text=True).splitlines()))
+    assert rows[0] == FLAGGED_CSV_COLUMNS
+    assert len(rows) == 2
+    assert rows[1][FLAGGED_CSV_COLUMNS.index("name")] == "Casino"
+
+    assert client.get("/api/compliance/export_csv?risk=bogus").status_code == 400
+
+    flagged_col.delete_many({"transaction.user_id": user_id})
+
+
+def test_export_pdf_filters_by_user(client):
+    with client.session_transaction() as s:
+        s["role"] = "Compliance Regulator"
+
+    res = client.get(f"/api/compliance/export_pdf?user_id={ObjectId()}&min_amount=10")
+    assert res.status_code == 200
+    assert res.mimetype == "application/pdf"
+    assert res.get_data().startswith(b"%PDF")
+
+    assert client.get("/api/compliance/export_pdf?start=not-a-date").status_code == 400
+
+
+def test_export_csv_etag_revalidates(client, tmp_path, monkeypatch):
+    from app import report_cache
+
+    monkeypatch.setattr(report_cache, "directory", str(tmp_path))
+    with client.session_transaction() as s:
+        s["role"] = "Compliance Regulator"
+
+    first = client.get("/api/compliance/export_csv?risk=High")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+
+    again = client.get("/api/compliance/export_csv?risk=High", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+
+    cached = client.get("/api/compliance/export_csv?risk=High")
+    assert cached.status_code == 200
+    assert cached.get_data() == first.get_data()
+
+
+def test_save_settings_keeps_rule_fields_not_in_payload(client):
+    from app import compliance_settings_col
+
+    with client.session_transaction() as s:
+        s["role"] = "Compliance Regulator"
+
+    previous = compliance_settings_col.find_one({"_id": "global"})
+    client.post("/api/compliance/save_settings", json={
+        "high_amount": 750,
+        "velocity_threshold": 7,
+        "suspicious_merchant_keywords": ["pawn"],
+    })
+    # What the settings page posts when a toggle changes
+    client.post("/api/compliance/save_settings", json={
+        "enable_data_masking": True,
+        "enable_ip_logging": False,
+        "auto_anonymize": True,
+        "notify_critical": True,
+        "track_admin": False,
+        "retention_days": "30",
+    })
+
+    settings = client.get("/api/compliance/get_settings").get_json()["settings"]
+    assert settings["enable_data_masking"] is True
+    assert settings["retention_days"] == 30
+    assert settings["high_amount"] == 750.0
+    assert settings["velocity_threshold"] == 7
+    assert settings["suspicious_merchant_keywords"] == ["pawn"]
+
+    if previous:
+        compliance_settings_col.replace_one({"_id": "global"}, previous)
+    else:
+        compliance_settings_col.delete_one({"_id": "global"})
+
+
+def test_job_queue_reaps_stale_running_jobs():
+    from datetime import datetime, timedelta
+    from app import compliance_jobs_col
+    from jobs import JobQueue
+
+    queue = JobQueue(compliance_jobs_col, heartbeat_timeout_seconds=60, max_attempts=2)
+    old = datetime.utcnow() - timedelta(minutes=5)
+    retry_id = compliance_jobs_col.insert_one({
+        "kind": "reap_test", "status": "running", "attempts": 1,
+        "heartbeat_at": old, "created_at": old,
+    }).inserted_id
+    spent_id = compliance_jobs_col.insert_one({
+        "kind": "reap_test", "status": "running", "attempts": 2,
+        "heartbeat_at": old, "created_at": old,
+    }).inserted_id
+    live_id = compliance_jobs_col.insert_one({
+        "kind": "reap_test", "status": "running", "attempts": 1,
+        "heartbeat_at": datetime.utcnow(), "created_at": old,
+    }).inserted_id
+
+    queue.reap_stale()
+
+    assert compliance_jobs_col.find_one({"_id": retry_id})["status"] == "queued"
+    assert compliance_jobs_col.find_one({"_id": spent_id})["status"] == "failed"
+    assert compliance_jobs_col.find_one({"_id": live_id})["status"] == "running"
+
+    compliance_jobs_col.delete_many({"kind": "reap_test"})
+
+
+def test_category_breakdown_reads_stored_transactions(client):
+    from app import bank_accounts_col, bank_transactions_col
+    from datetime import datetime
+
+    user_id = str(ObjectId())
+    with client.session_transaction() as s:
+        s["user_id"] = user_id
+
+    today = datetime.utcnow().date().isoformat()
+    bank_accounts_col.insert_one({"user_id": user_id, "access_token": "access-sandbox-x"})
+    bank_transactions_col.insert_many([
+        {"user_id": user_id, "transaction_id": "c1", "name": "Uber 063015", "amount": 12.0, "date": today},
+        {"user_id": user_id, "transaction_id": "c2", "name": "Uber 072515", "amount": 8.0, "date": today},
+        {"user_id": user_id, "transaction_id": "c3", "name": "Payroll", "amount": -500.0, "date": today},
+    ])
+
+    data = client.get("/api/category-breakdown?range=month").get_json()
+    assert data == [{"category": "Transport", "total": 20.0}]
+
+    bank_transactions_col.delete_many({"user_id": user_id})
+    bank_accounts_col.delete_many({"user_id": user_id})
+
+
+def test_failed_vulnerability_scan_leaves_priorities_alone():
+    from datetime import datetime
+    from app import daily_rollups_col, financially_vulnerable_col
+    from vulnerability import run_vulnerability_scan
+
+    user_oid = ObjectId()
+    user_id = str(user_oid)
+    users_col.insert_one({"_id": user_oid, "fullName": "Scan User", "email": "scan@test.com"})
+    link_id = clients_col.insert_one({"user_id": user_oid, "advisor_id": ObjectId(),
+                                      "status": "Accepted", "priority": "low"}).inserted_id
+    daily_rollups_col.insert_one({"user_id": user_id, "day": datetime.utcnow().date().isoformat(),
+                                  "income": 1000.0, "expenses": 950.0, "tx_count": 2})
+
+    class FailingAccounts:
+        def find(self, *args, **kwargs):
+            yield {"user_id": user_id, "current_balance": 10.0}
+            raise RuntimeError("cursor died")
+
+    with pytest.raises(RuntimeError):
+        run_vulnerability_scan(FailingAccounts(), users_col, daily_rollups_col,
+                               clients_col, financially_vulnerable_col, batch_size=1)
+
+    assert clients_col.find_one({"_id": link_id})["priority"] == "low"
+
+    daily_rollups_col.delete_many({"user_id": user_id})
+    users_col.delete_one({"_id": user_oid})
+    clients_col.delete_one({"_id": link_id})
+
+
+def test_rescore_keeps_advisor_set_priority(client):
+    from app import entries_col
+
+    with client.session_transaction() as s:
+        user_id = s["user_id"]
+    user_oid = ObjectId(user_id)
+    users_col.insert_one({"_id": user_oid, "fullName": "Manual Prio", "email": "prio@test.com"})
+    scanned_id = clients_col.insert_one({"user_id": user_oid, "advisor_id": ObjectId(),
+                                         "status": "Accepted", "priority": "low"}).inserted_id
+    manual_id = clients_col.insert_one({"user_id": user_oid, "advisor_id": ObjectId(),
+                                        "status": "Accepted", "priority": "medium",
+                                        "priority_source": "advisor"}).inserted_id
+
+    client.post("/entry", data={"type": "income", "category": "salary", "amount": "1000"})
+    client.post("/entry", data={"type": "expense", "category": "rent", "amount": "900"})
+    assert clients_col.find_one({"_id": scanned_id})["priority"] == "high"
+    assert clients_col.find_one({"_id": manual_id})["priority"] == "medium"
+
+    client.post("/entry", data={"type": "income", "category": "bonus", "amount": "2000"})
+    assert clients_col.find_one({"_id": scanned_id})["priority"] == "low"
+    assert clients_col.find_one({"_id": manual_id})["priority"] == "medium"
+
+    entries_col.delete_many({"user_id": user_id})
+    users_col.delete_one({"_id": user_oid})
+    clients_col.delete_many({"user_id": user_oid})
+
+
+def test_advisor_summary_caps_transaction_table(client, monkeypatch):
+    import app as app_module
+    from datetime import datetime, timedelta
+    from app import bank_transactions_col, daily_rollups_col, _write_transaction_rows, _simplify_transactions
+
+    monkeypatch.setattr(app_module, "RECENT_TRANSACTION_LIMIT", 2)
+    advisor_id, user_id = ObjectId(), ObjectId()
+    link_id = clients_col.insert_one({"user_id": user_id, "advisor_id": advisor_id,
+                                      "status": "Accepted"}).inserted_id
+    with client.session_transaction() as s:
+        s["user_id"] = str(advisor_id)
+        s["role"] = "Financial Advisor"
+
+    today = datetime.utcnow().date()
+    _write_transaction_rows(str(user_id), _simplify_transactions({"transactions": [
+        {"date": (today - timedelta(days=i)).isoformat(), "name": "Coffee", "amount": 5.0,
+         "category": ["Food.Drink"], "transaction_id": f"a{i}"}
+        for i in range(4)
+    ]}), replace=True)
+
+    data = client.get(f"/api/advisor/summary?client={link_id}").get_json()
+    assert [tx["transaction_id"] for tx in data["transactions"]] == ["a0", "a1"]
+    assert sum(data["expenses"]) == 20.0
+
+    clients_col.delete_one({"_id": link_id})
+    bank_transactions_col.delete_many({"user_id": str(user_id)})
+    daily_rollups_col.delete_many({"user_id": str(user_id)})
+
+
+def test_velocity_counts_concurrent_records():
+    import threading
+    from datetime import datetime
+    from app import velocity_tracker, velocity_counters_col
+
+    user_id = str(ObjectId())
+    now = datetime.utcnow()
+    results = []
+    lock = threading.Lock()
+
+    def hit():
+        prior = velocity_tracker.count_and_record(user_id, "Corner Shop", 3600, now)
+        with lock:
+            results.append(prior)
+
+    threads = [threading.Thread(target=hit) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(results) == list(range(8))
+
+    many = velocity_tracker.count_and_record_many(
+        [(user_id, "Corner Shop"), (user_id, "Other"), (user_id, "corner shop ")], 3600, now
+    )
+    assert many == [8, 0, 9]
+
+    velocity_counters_col.delete_many({"key": {"$regex": f"^{user_id}\\|"}})
+
+
+def test_report_reads_embedded_rows_only_for_legacy_accounts():
+    from app import bank_accounts_col, _report_transactions
+
+    user_id = str(ObjectId())
+    bank_accounts_col.insert_one({"user_id": user_id, "recent_transactions": [
+        {"transaction_id": "l1", "date": "2024-05-01", "name": "Rent", "amount": 900.0},
+        {"transaction_id": "l2", "date": "2024-05-03", "name": "Coffee", "amount": 4.0},
+    ]})
+
+    rows = list(_report_transactions(user_id, {"min_amount": 10}, legacy=True))
+    assert [tx["name"] for tx in rows] == ["Rent"]
+    assert list(_report_transactions(user_id, {}, legacy=False)) == []
+
+    bank_accounts_col.delete_many({"user_id": user_id})
+
+
+def test_export_pdf_etag_changes_with_user_email(client, tmp_path, monkeypatch):
+    from app import report_cache
+
+    monkeypatch.setattr(report_cache, "directory", str(tmp_path))
+    user_oid = ObjectId()
+    users_col.insert_one({"_id": user_oid, "fullName": "Etag User", "email": "etag-old@test.com"})
+
+    with client.session_transaction() as s:
+        s["user_id"] = str(user_oid)
+    client.post("/api/update-profile", data={"email": "etag-new@test.com"})
+
+    with client.session_transaction() as s:
+        s["role"] = "Compliance Regulator"
+    first = client.get("/api/compliance/export_pdf").headers["ETag"]
+
+    with client.session_transaction() as s:
+        s["role"] = "Average User"
+    client.post("/api/update-profile", data={"email": "etag-newer@test.com"})
+    assert users_col.find_one({"_id": user_oid})["updated_at"]
+
+    with client.session_transaction() as s:
+        s["role"] = "Compliance Regulator"
+    res = client.get("/api/compliance/export_pdf", headers={"If-None-Match": first})
+    assert res.status_code == 200
+    assert res.headers["ETag"] != first
+
+    users_col.delete_one({"_id": user_oid})
+
+
+def test_lazy_spending_totals_never_overwrite_existing_doc():
+    from datetime import datetime
+    from app import entries_col, spending_totals_col, reconcile_spending_totals, _bump_spending_totals
+
+    user_id = str(ObjectId())
+    old = {"user_id": user_id, "type": "expense", "amount": 40.0, "created_at": datetime(2024, 1, 5)}
+    entries_col.insert_one(old)
+
+    # A totals doc another request created and bumped meanwhile
+    spending_totals_col.insert_one({"_id": user_id, "expense_total": 55.0, "expense_count": 2,
+                                    "by_month": {"2024-01": 55.0}})
+    reconcile_spending_totals(user_id, only_missing=True)
+    assert spending_totals_col.find_one({"_id": user_id})["expense_total"] == 55.0
+
+    # First bump creates the doc and backfills only older entries
+    spending_totals_col.delete_one({"_id": user_id})
+    new = {"user_id": user_id, "type": "expense", "amount": 10.0, "created_at": datetime(2024, 2, 1)}
+    entries_col.insert_one(new)
+    _bump_spending_totals(user_id, [new])
+    totals = spending_totals_col.find_one({"_id": user_id})
+    assert totals["expense_total"] == 50.0
+    assert totals["expense_count"] == 2
+    assert totals["by_month"] == {"2024-01": 40.0, "2024-02": 10.0}
+
+    entries_col.delete_many({"user_id": user_id})
+    spending_totals_col.delete_one({"_id": user_id})
+
+
+def test_rescore_reuses_the_last_scan_window(client):
+    from datetime import datetime, timedelta
+    from app import entries_col, financially_vulnerable_col, compliance_settings_col
+
+    with client.session_transaction() as s:
+        user_id = s["user_id"]
+    user_oid = ObjectId(user_id)
+    users_col.insert_one({"_id": user_oid, "fullName": "Window User", "email": "window@test.com"})
+    previous = compliance_settings_col.find_one({"_id": "global"})
+
+    # Income 60 days ago: only a 90-day window sees it
+    entries_col.insert_one({"user_id": user_id, "type": "income", "category": "Salary",
+                            "amount": 1000.0, "created_at": datetime.utcnow() - timedelta(days=60)})
+    entries_col.insert_one({"user_id": user_id, "type": "expense", "category": "Rent",
+                            "amount": 700.0, "created_at": datetime.utcnow()})
+
+    with client.session_transaction() as s:
+        s["role"] = "Compliance Regulator"
+    client.post("/api/compliance/financially_vulnerable/scan", json={"days": 90})
+    doc = financially_vulnerable_col.find_one({"user_id": user_id})
+    assert doc["risk_level"] == "medium" and doc["window_days"] == 90
+
+    with client.session_transaction() as s:
+        s["role"] = "Average User"
+    client.post("/entry", data={"type": "expense", "category": "food", "amount": "10"})
+    doc = financially_vulnerable_col.find_one({"user_id": user_id})
+    # A 30-day rescore would see no income and score it "high"
+    assert doc["risk_level"] == "medium" and doc["window_days"] == 90
+
+    entries_col.delete_many({"user_id": user_id})
+    users_col.delete_one({"_id": user_oid})
+    financially_vulnerable_col.delete_many({"user_id": user_id})
+    if previous:
+        compliance_settings_col.replace_one({"_id": "global"}, previous)
+    else:
+        compliance_settings_col.delete_one({"_id": "global"})
@@ -0,0 +1,88 @@
+# test/test_audit_queue.py
+
+import threading
+import time
+
+from audit_queue import AuditQueue
+
+
+class _Collection:
+    """Just records insert_many batches."""
+
+    def __init__(self, fail=False, delay=0.0):
+        self.batches = []
+        self.fail = fail
+        self.delay = delay
+        self.lock = threading.Lock()
+
+    def insert_many(self, docs, ordered=True):
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("down")
+        with self.lock:
+            self.batches.append(list(docs))
+
+    @property
+    def docs(self):
+        return [d for batch in self.batches for d in batch]
+
+
+def _wait_for(predicate, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_background_writer_batches_by_size_and_time():
+    col = _Collection()
+    q = AuditQueue(col, batch_size=10, flush_seconds=0.05)
+    for i in range(25):
+        assert q.enqueue({"i": i})
+
+    assert _wait_for(lambda: len(col.docs) == 25)
+    assert [d["i"] for d in col.docs] == list(range(25))
+    assert all(len(b) <= 10 for b in col.batches)
+    assert q.stats()["flushed"] == 25
+    q.close()
+
+
+def test_full_queue_drops_and_close_flushes():
+    # Slow writes, one doc per batch: the queue fills up behind them
+    col = _Collection(delay=0.2)
+    q = AuditQueue(col, max_size=5, batch_size=1, flush_seconds=10)
+    results = [q.enqueue({"i": i}) for i in range(20)]
+
+    stats = q.stats()
+    assert results.count(False) == stats["dropped"] > 0
+    q.close()
+    assert len(col.docs) == stats["enqueued"]
+    assert q.stats()["queued"] == 0
+
+
+def test_failed_inserts_are_counted():
+    q = AuditQueue(_Collection(fail=True), flush_seconds=10)
+    q.enqueue({"i": 1})
+    q.close()
+    assert q.stats()["failed"] == 1
+
+
+def test_flush_writes_the_batch_the_writer_holds():
+    col = _Collection()
+    q = AuditQueue(col, batch_size=100, flush_seconds=30)
+    q.enqueue({"i": 1})
+    # Let the writer take the doc off the queue and start waiting for more
+    assert _wait_for(lambda: q.stats()["queued"] == 0)
+    time.sleep(0.05)
+
+    started = time.monotonic()
+    q.flush()
+    assert [d["i"] for d in col.docs] == [1]
+    assert time.monotonic() - started < 1.0
+
+    q.enqueue({"i": 2})
+    q.flush()
+    assert [d["i"] for d in col.docs] == [1, 2]
+    q.close()
@@ -0,0 +1,15 @@
+# test/test_batching.py
+
+from batching import chunked
+
+
+def test_chunked_groups_lazily():
+    assert [len(c) for c in chunked(range(7), 3)] == [3, 3, 1]
+    assert list(chunked([], 3)) == []
+
+    def source():
+        yield 1
+        yield 2
+        raise AssertionError("read past the first chunk")
+
+    assert next(chunked(source(), 2)) == [1, 2]
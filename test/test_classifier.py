@@ -0,0 +1,64 @@
+# test/test_classifier.py
+
+import random
+
+import classifier
+from classifier import KeywordClassifier
+
+
+def _first_match(rules, default, text):
+    text = text.lower()
+    for result, keywords in rules:
+        if any(k in text for k in keywords):
+            return result
+    return default
+
+
+WORDS = [
+    "starbucks", "uber", "payroll", "acme", "credit", "card", "payment",
+    "hotel", "bus", "coffee", "deposit", "target", "gym", "airbnb", "bill",
+    "interest", "refund", "pay", "flight", "lyft", "xx", "intrst", "climb",
+]
+
+
+def test_compiled_tables_match_first_match_semantics():
+    rng = random.Random(11)
+    tables = [
+        (classifier.DIRECTION_RULES, False, classifier.direction_classifier),
+        (classifier.MERCHANT_RULES, "Other", classifier.merchant_classifier),
+        (classifier.RAW_CATEGORY_RULES, None, classifier.raw_category_classifier),
+    ]
+    for _ in range(2000):
+        text = "".join(rng.choice(WORDS) + rng.choice(["", " ", "-"]) for _ in range(rng.randrange(1, 5)))
+        text = text.upper() if rng.random() < 0.3 else text
+        for rules, default, engine in tables:
+            assert engine.classify(text) == _first_match(rules, default, text), text
+
+
+def test_lower_priority_match_earlier_in_text_loses():
+    engine = KeywordClassifier([("A", ["zeta"]), ("B", ["alpha"])], default="-")
+    assert engine.classify("alpha then zeta") == "A"
+    assert engine.classify("alpha only") == "B"
+    assert engine.classify("nothing") == "-"
+
+
+def test_batch_and_cache():
+    engine = KeywordClassifier(classifier.MERCHANT_RULES, default="Other", cache_size=16)
+    names = ["Starbucks #12", "UBER TRIP", "Starbucks #12", "Corner Shop"] * 50
+    assert engine.classify_many(names)[:4] == ["Dining", "Transport", "Dining", "Other"]
+    info = engine.cache_info()
+    assert info.misses == 3
+    assert info.currsize == 3
+
+
+def test_wrappers_keep_legacy_edge_cases():
+    assert classifier.merchant_category(None) == "Other"
+    assert classifier.raw_category(None) == "Other"
+    assert classifier.raw_category(["shops"]) == "Shops"
+    assert classifier.raw_category(["Payroll"]) == "Bills"
+    assert classifier.is_income("ACME PAYROLL", None) is True
+
+    assert classifier.classify_directions([
+        {"name": "Interest Paid", "category": "Transfer"},
+        {"name": None, "category": "Travel"},
+    ]) == [True, False]
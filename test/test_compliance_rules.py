@@ -0,0 +1,57 @@
+# test/test_compliance_rules.py
+
+import pytest
+
+from compliance_rules import DEFAULT_RULE_SETTINGS, Rule, RuleSet, RuleStats, rule_settings
+
+
+def test_default_rules_match_legacy_thresholds():
+    ruleset = RuleSet.from_settings(rule_settings({}))
+
+    assert ruleset.evaluate({"name": "Grocer", "amount": 40}) == ("Low", [])
+    assert ruleset.evaluate({"name": "Jeweller", "amount": 2500}) == ("High", ["High-value transaction"])
+    assert ruleset.evaluate({"name": "Jeweller", "amount": 5000})[0] == "Critical"
+    assert ruleset.evaluate({"name": "Online CASINO", "amount": 10}) == ("Critical", ["Suspicious merchant"])
+
+    risk, reasons = ruleset.evaluate({"name": "Grocer", "amount": 2500}, recent=3)
+    assert risk == "High"
+    assert reasons == ["High-value transaction", "Velocity pattern detected"]
+
+
+def test_rule_settings_normalizes_and_disables_rules():
+    settings = rule_settings({
+        "high_amount": "100",
+        "suspicious_merchant_keywords": "Pawn, lottery",
+        "velocity_window_minutes": 0,
+        "disabled_rules": ["velocity"],
+    })
+    assert settings["high_amount"] == 100.0
+    assert settings["critical_amount"] == DEFAULT_RULE_SETTINGS["critical_amount"]
+    assert settings["suspicious_merchant_keywords"] == ["pawn", "lottery"]
+    assert settings["velocity_window_minutes"] == 1
+
+    ruleset = RuleSet.from_settings(settings)
+    assert not ruleset.uses_velocity
+    assert ruleset.evaluate({"name": "City Lottery", "amount": 150}, recent=99) == (
+        "Critical", ["High-value transaction", "Suspicious merchant"]
+    )
+    # Default keywords were replaced
+    assert ruleset.evaluate({"name": "casino", "amount": 1}) == ("Low", [])
+
+
+def test_rule_stats_count_hits_per_rule():
+    stats = RuleStats()
+    ruleset = RuleSet.from_settings(rule_settings({}), stats)
+    for amount in (10, 3000, 6000):
+        ruleset.evaluate({"name": "Shop", "amount": amount})
+
+    snapshot = stats.snapshot()
+    assert snapshot["high_value"]["evaluations"] == 3
+    assert snapshot["high_value"]["hits"] == 2
+    assert snapshot["suspicious_merchant"]["hits"] == 0
+    assert snapshot["velocity"]["evaluations"] == 3
+
+
+def test_rule_base_class_is_abstract():
+    with pytest.raises(TypeError):
+        Rule()
@@ -0,0 +1,53 @@
+# test/test_entry_import.py
+
+import io
+from datetime import datetime
+
+from entry_import import detect_format, parse_csv, parse_ofx, validate_row
+
+
+def test_csv_rows_validate_with_aliases_and_sign():
+    data = io.StringIO(
+        "Date,Description,Amount\n"
+        "2024-01-05,rent,-900.00\n"
+        "\n"
+        "01/06/2024,salary,\"2,500\"\n"
+        "2024-01-07,coffee,abc\n"
+    )
+    rows = list(parse_csv(data))
+    assert [line for line, _ in rows] == [2, 4, 5]
+
+    results = [validate_row(raw) for _, raw in rows]
+    rent, salary, bad = results
+    assert rent[0] == {"type": "expense", "category": "Rent", "amount": 900.0,
+                       "created_at": datetime(2024, 1, 5)}
+    assert salary[0]["type"] == "income"
+    assert salary[0]["amount"] == 2500.0
+    assert bad == (None, "Invalid amount")
+
+
+def test_non_finite_amounts_are_rejected():
+    for amount in ("nan", "inf", "-Infinity", "1e999"):
+        assert validate_row({"amount": amount, "date": "2024-01-05"}) == (None, "Invalid amount")
+
+
+def test_ofx_sgml_transactions():
+    data = io.StringIO(
+        "OFXHEADER:100\n<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>\n"
+        "<STMTTRN>\n<TRNTYPE>DEBIT\n<DTPOSTED>20240302120000[-5:EST]\n"
+        "<TRNAMT>-4.50\n<NAME>STARBUCKS 123\n</STMTTRN>\n"
+        "<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20240303<TRNAMT>1200.00<NAME>ACME PAYROLL</STMTTRN>\n"
+        "</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>\n"
+    )
+    entries = [validate_row(raw)[0] for _, raw in parse_ofx(data)]
+    assert entries == [
+        {"type": "expense", "category": "Dining", "amount": 4.5, "created_at": datetime(2024, 3, 2)},
+        {"type": "income", "category": "Income", "amount": 1200.0, "created_at": datetime(2024, 3, 3)},
+    ]
+
+
+def test_format_detection():
+    assert detect_format("statement.QFX") == "ofx"
+    assert detect_format("export.csv") == "csv"
+    assert detect_format("notes.pdf") is None
+    assert detect_format("upload", "ofx") == "ofx"
@@ -0,0 +1,29 @@
+# test/test_pdf_report.py
+
+import io
+
+from pdf_report import TableReport
+
+
+def test_rows_split_across_pages():
+    out = io.BytesIO()
+    report = TableReport(out, "Report", [("Date", 70), ("Description", 250), ("Amount", 70)])
+    report.section("User: a@example.com", "Balance: $1.00")
+    written = report.rows(
+        ("2030-01-01", f"Merchant {i} " + "x" * 200, f"${i:,.2f}") for i in range(500)
+    )
+    report.note("done")
+    report.close()
+
+    assert written == 500
+    assert report.page > 5
+    assert out.getvalue().startswith(b"%PDF")
+
+
+def test_empty_report_is_valid_pdf():
+    out = io.BytesIO()
+    report = TableReport(out, "Report", [("Date", 70)])
+    assert report.rows([]) == 0
+    report.close()
+    assert report.page == 1
+    assert out.getvalue().startswith(b"%PDF")
@@ -0,0 +1,253 @@
+# tests/test_plaid_client.py
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import plaid_client
+
+
+ITEM = {
+    "item_id": "item-sandbox",
+    "webhook": None,
+    "error": None,
+    "available_products": [],
+    "billed_products": ["transactions"],
+    "consent_expiration_time": None,
+    "update_type": "background",
+}
+
+
+class FakePlaidHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so the client can keep the connection alive between calls
+    protocol_version = "HTTP/1.1"
+    routes = {}
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        handler = self.routes.get(self.path)
+        if handler is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        # Handlers return a payload, or (status, payload) for errors
+        result = handler(body)
+        status, result = result if isinstance(result, tuple) else (200, result)
+        payload = json.dumps(result).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_plaid(monkeypatch):
+    FakePlaidHandler.routes = {
+        "/accounts/balance/get": lambda body: {
+            "accounts": [],
+            "item": ITEM,
+            "request_id": "req-balance",
+        },
+    }
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakePlaidHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    monkeypatch.setattr(plaid_client, "PLAID_HOST", f"http://127.0.0.1:{server.server_port}")
+    plaid_client.reset_plaid_client()
+
+    yield FakePlaidHandler
+
+    plaid_client.reset_plaid_client()
+    server.shutdown()
+    server.server_close()
+
+
+def test_plaid_client_is_shared_and_reuses_connections(fake_plaid):
+    assert plaid_client.get_plaid_client() is plaid_client.get_plaid_client()
+
+    for _ in range(5):
+        plaid_client.get_current_balances("access-sandbox-test")
+
+    stats = plaid_client.get_plaid_client_stats()
+    assert stats["requests_sent"] == 5
+    assert stats["connections_opened"] == 1
+    assert stats["connections_reused"] == 4
+
+
+def test_plaid_client_is_thread_safe(fake_plaid):
+    errors = []
+
+    def worker():
+        try:
+            for _ in range(5):
+                plaid_client.get_current_balances("access-sandbox-test")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    stats = plaid_client.get_plaid_client_stats()
+    assert not errors
+    assert stats["requests_sent"] == 20
+    assert stats["connections_opened"] <= plaid_client.PLAID_POOL_MAXSIZE
+
+
+def test_refresh_bank_item_fetches_concurrently(fake_plaid):
+    import time
+
+    def slow(payload):
+        def handler(body):
+            time.sleep(0.3)
+            return payload
+        return handler
+
+    fake_plaid.routes["/accounts/balance/get"] = slow({
+        "accounts": [],
+        "item": ITEM,
+        "request_id": "req-balance",
+    })
+    fake_plaid.routes["/transactions/sync"] = slow({
+        "transactions_update_status": "HISTORICAL_UPDATE_COMPLETE",
+        "accounts": [],
+        "added": [],
+        "modified": [],
+        "removed": [{"transaction_id": "tx-gone", "account_id": "acc-1"}],
+        "next_cursor": "cursor-2",
+        "has_more": False,
+        "request_id": "req-sync",
+    })
+
+    result = plaid_client.refresh_bank_item("access-sandbox-test", cursor="cursor-1")
+
+    assert result["transactions"]["removed"] == ["tx-gone"]
+    assert result["transactions"]["next_cursor"] == "cursor-2"
+    timings = result["timings_ms"]
+    assert timings["balances"] >= 300 and timings["transactions"] >= 300
+    assert timings["total"] < timings["balances"] + timings["transactions"]
+
+
+def _tx_row(i):
+    return {
+        "transaction_id": f"tx{i}",
+        "account_id": "acc-1",
+        "amount": float(i),
+        "iso_currency_code": "USD",
+        "unofficial_currency_code": None,
+        "category": ["Shops"],
+        "category_id": "19000000",
+        "date": "2025-01-01",
+        "name": f"Shop {i}",
+        "pending": False,
+        "pending_transaction_id": None,
+        "account_owner": None,
+        "location": {k: None for k in (
+            "address", "city", "region", "postal_code",
+            "country", "lat", "lon", "store_number",
+        )},
+        "payment_meta": {k: None for k in (
+            "reference_number", "ppd_id", "payee", "by_order_of",
+            "payer", "payment_method", "payment_processor", "reason",
+        )},
+        "payment_channel": "in store",
+        "authorized_date": None,
+        "authorized_datetime": None,
+        "datetime": None,
+        "transaction_code": None,
+        "transaction_type": "place",
+        "merchant_name": None,
+        "check_number": None,
+        "logo_url": None,
+        "website": None,
+        "personal_finance_category": None,
+        "counterparties": [],
+        "merchant_entity_id": None,
+    }
+
+
+def test_get_all_transactions_follows_total_and_dedupes(fake_plaid):
+    rows = [_tx_row(i) for i in range(7)]
+    seen_offsets = []
+
+    def transactions_get(body):
+        options = body.get("options", {})
+        offset, count = options.get("offset", 0), options.get("count", 100)
+        seen_offsets.append(offset)
+        # Each page overlaps the previous one by a row, like a mid-fetch post
+        page = rows[max(offset - 1, 0):offset + count]
+        return {
+            "accounts": [],
+            "transactions": page,
+            "total_transactions": len(rows),
+            "item": ITEM,
+            "request_id": f"req-{offset}",
+        }
+
+    fake_plaid.routes["/transactions/get"] = transactions_get
+
+    result = plaid_client.get_all_transactions(
+        "access-sandbox-test", days=365, page_size=3, max_concurrency=2
+    )
+
+    assert sorted(seen_offsets) == [0, 3, 6]
+    assert [tx["transaction_id"] for tx in result["transactions"]] == [f"tx{i}" for i in range(7)]
+    assert result["total_transactions"] == 7
+
+
+def test_refresh_bank_item_without_sync_reads_every_page(fake_plaid, monkeypatch):
+    monkeypatch.setattr(plaid_client, "PLAID_MAX_PAGE_SIZE", 2)
+    rows = [_tx_row(i) for i in range(5)]
+
+    def transactions_get(body):
+        options = body.get("options", {})
+        offset, count = options.get("offset", 0), options.get("count", 100)
+        return {
+            "accounts": [],
+            "transactions": rows[offset:offset + count],
+            "total_transactions": len(rows),
+            "item": ITEM,
+            "request_id": f"req-{offset}",
+        }
+
+    fake_plaid.routes["/transactions/get"] = transactions_get
+    fake_plaid.routes["/accounts/balance/get"] = lambda body: {
+        "accounts": [], "item": ITEM, "request_id": "req-balance",
+    }
+
+    result = plaid_client.refresh_bank_item("access-sandbox-test", sync=False, days=90)
+    assert [tx["transaction_id"] for tx in result["transactions"]["transactions"]] == [
+        f"tx{i}" for i in range(5)
+    ]
+
+
+def test_sync_transactions_gives_up_after_repeated_mutations(fake_plaid):
+    calls = []
+
+    def transactions_sync(body):
+        calls.append(body.get("cursor"))
+        return 400, {
+            "error_type": "TRANSACTIONS_ERROR",
+            "error_code": "TRANSACTIONS_SYNC_MUTATION_DURING_PAGINATION",
+            "error_message": "Underlying transaction data changed since last page was fetched.",
+            "display_message": None,
+            "request_id": "req-sync",
+        }
+
+    fake_plaid.routes["/transactions/sync"] = transactions_sync
+
+    with pytest.raises(plaid_client.plaid.ApiException):
+        plaid_client.sync_transactions("access-sandbox-test", cursor="cursor-1")
+    assert calls == ["cursor-1"] * (plaid_client.PLAID_SYNC_MAX_RESTARTS + 1)
@@ -0,0 +1,45 @@
+# test/test_report_cache.py
+
+import os
+
+from report_cache import ReportCache
+
+
+def test_key_depends_on_params_and_version():
+    k = ReportCache.key("csv", {"risk": "High", "start": "2030-01-01"}, [1, "v"])
+    assert k == ReportCache.key("csv", {"start": "2030-01-01", "risk": "High"}, [1, "v"])
+    assert k != ReportCache.key("csv", {"risk": "High", "start": "2030-01-01"}, [2, "v"])
+    assert k != ReportCache.key("pdf", {"risk": "High", "start": "2030-01-01"}, [1, "v"])
+
+
+def test_build_get_and_lru_eviction(tmp_path):
+    cache = ReportCache(str(tmp_path), max_bytes=250)
+    assert cache.get("a", ".pdf") is None
+
+    paths = {}
+    for i, name in enumerate("abc"):
+        paths[name] = cache.build(name, ".pdf", lambda f: f.write(b"x" * 100))
+        os.utime(paths[name], (1000 + i, 1000 + i))
+    # Third write pushed the total over 250 bytes: the oldest ("a") goes
+    assert not os.path.exists(paths["a"])
+    assert cache.get("b", ".pdf") == paths["b"]
+
+    # "b" was just read, so "c" is now least recently used
+    os.utime(paths["c"], (1, 1))
+    cache.build("d", ".pdf", lambda f: f.write(b"x" * 100))
+    assert not os.path.exists(paths["c"])
+    assert os.path.exists(paths["b"])
+
+
+def test_build_stream_keeps_only_complete_artifacts(tmp_path):
+    cache = ReportCache(str(tmp_path), max_bytes=10_000)
+
+    assert "".join(cache.build_stream("full", ".csv", iter(["a,b\n", "1,2\n"]))) == "a,b\n1,2\n"
+    with open(cache.get("full", ".csv"), encoding="utf-8") as f:
+        assert f.read() == "a,b\n1,2\n"
+
+    stream = cache.build_stream("partial", ".csv", iter(["a\n", "b\n"]))
+    next(stream)
+    stream.close()
+    assert cache.get("partial", ".csv") is None
+    assert os.listdir(tmp_path) == ["full.csv"]
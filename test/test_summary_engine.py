@@ -0,0 +1,70 @@
+# test/test_summary_engine.py
+
+from datetime import date, datetime
+
+from summary_engine import build_summary
+
+
+def _row(i, posted, signed, cat, date_str=None):
+    return {
+        "date": date_str if date_str is not None else (posted.date().isoformat() if posted else "None"),
+        "name": f"Merchant {i}",
+        "category": cat,
+        "amount": abs(signed),
+        "transaction_id": f"tx{i}",
+        "posted_date": posted,
+        "is_income": signed >= 0,
+        "signed_amount": signed,
+        "canonical_category": cat,
+    }
+
+
+def test_summary_groups_by_day_from_cutoff():
+    txs = [
+        _row(1, datetime(2024, 2, 3), -20.0, "Shops"),
+        _row(2, datetime(2024, 1, 31), -99.0, "Shops"),
+        _row(3, datetime(2024, 2, 1), 1000.0, "Income"),
+        _row(4, datetime(2024, 2, 3), -5.5, "Food And Drink"),
+        _row(5, datetime(2024, 2, 1), -0.25, "Shops"),
+        _row(6, None, -10.0, "Shops"),
+    ]
+    summary = build_summary(txs, date(2024, 2, 1))
+
+    assert summary["labels"] == ["2024-02-01", "2024-02-03"]
+    assert summary["income"] == [1000.0, 0.0]
+    assert summary["expenses"] == [0.25, 25.5]
+    assert summary["categoryBreakdown"] == {"Shops": 20.25, "Food And Drink": 5.5}
+    # Oldest first, same-day rows in input order
+    assert [tx["transaction_id"] for tx in summary["transactions"]] == ["tx3", "tx5", "tx1", "tx4"]
+    assert summary["transactions"][0] == {
+        "date": "2024-02-01", "name": "Merchant 3", "category": "Income",
+        "amount": 1000.0, "transaction_id": "tx3",
+    }
+
+
+def test_summary_handles_datetime_strings_and_enrich_callback():
+    seen = []
+
+    def enrich(tx):
+        seen.append(tx["transaction_id"])
+        tx.update({
+            "posted_date": datetime(2024, 3, 2),
+            "is_income": False,
+            "signed_amount": -4.0,
+            "canonical_category": "Food And Drink",
+        })
+        return tx
+
+    txs = [
+        _row(1, datetime(2024, 3, 1), 100.0, "Income", date_str="2024-03-01T00:00:00"),
+        {"date": "2024-03-02", "name": "Cafe", "transaction_id": "legacy"},
+    ]
+    summary = build_summary(txs, date(2024, 3, 1), enrich=enrich)
+
+    assert seen == ["legacy"]
+    assert summary["labels"] == ["2024-03-01", "2024-03-02"]
+    assert summary["income"] == [100.0, 0.0]
+    assert summary["expenses"] == [0.0, 4.0]
+    assert summary["categoryBreakdown"] == {"Food And Drink": 4.0}
+    assert [tx["transaction_id"] for tx in summary["transactions"]] == ["tx1", "legacy"]
+
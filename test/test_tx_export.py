@@ -0,0 +1,151 @@
+# test/test_tx_export.py
+
+import gzip
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from tx_export import EXPORT_FIELDS, export_row, export_transactions, parse_timestamp
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, key, direction):
+        return _Cursor(sorted(self.docs, key=lambda d: d[key], reverse=direction < 0))
+
+    def __iter__(self):
+        return iter(self.docs)
+
+
+class _Collection:
+    def __init__(self, docs):
+        self.docs = docs
+        self.queries = []
+
+    def find(self, query, projection=None, batch_size=None):
+        self.queries.append(query)
+        window = query.get("updated_at", {})
+        out = []
+        for doc in self.docs:
+            if "user_id" in query and doc["user_id"] != query["user_id"]:
+                continue
+            if "$gt" in window and not doc["updated_at"] > window["$gt"]:
+                continue
+            if "$lte" in window and not doc["updated_at"] <= window["$lte"]:
+                continue
+            out.append(dict(doc))
+        return _Cursor(out)
+
+
+def _docs():
+    base = datetime(2030, 1, 1, 12, 0)
+    return [
+        {"user_id": "u1" if i % 2 else "u2", "transaction_id": f"t{i}", "date": "2030-01-01",
+         "amount": 10.0 + i, "name": "Coffee", "is_income": False, "updated_at": base + timedelta(minutes=i)}
+        for i in range(5)
+    ]
+
+
+def _read(path):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_export_row_uses_enriched_fields():
+    row = export_row({
+        "user_id": "u1", "transaction_id": "t1", "date": "2030-02-03",
+        "amount": 12.5, "name": "Coffee", "category": "FOOD_AND_DRINK",
+        "canonical_category": "Food And Drink", "is_income": False,
+        "signed_amount": -12.5, "updated_at": datetime(2030, 2, 4, 8, 0),
+    })
+    assert list(row) == EXPORT_FIELDS
+    assert row["direction"] == "expense"
+    assert row["category"] == "Food And Drink"
+    assert row["updated_at"] == "2030-02-04T08:00:00"
+    json.dumps(row)
+
+
+def test_export_row_classifies_legacy_rows():
+    row = export_row({"user_id": "u1", "date": "2030-02-03", "amount": "100", "name": "ACME PAYROLL"})
+    assert row["direction"] == "income"
+    assert row["signed_amount"] == 100.0
+
+
+def test_export_transactions_window_and_watermark(tmp_path):
+    col = _Collection(list(reversed(_docs())))
+    out = str(tmp_path / "tx.ndjson.gz")
+    since = datetime(2030, 1, 1, 12, 0)
+    until = datetime(2030, 1, 1, 12, 3)
+
+    result = export_transactions(col, out, since=since, until=until, batch_size=2)
+
+    rows = _read(out)
+    assert [r["transaction_id"] for r in rows] == ["t1", "t2", "t3"]
+    assert result == {"path": out, "rows": 3, "watermark": until}
+    assert not (tmp_path / "tx.ndjson.gz.part").exists()
+
+    result = export_transactions(col, out, since=result["watermark"], user_id="u2")
+    assert [r["transaction_id"] for r in _read(out)] == ["t4"]
+    assert result["watermark"] == datetime(2030, 1, 1, 12, 4)
+
+
+def test_export_transactions_keeps_since_when_nothing_new(tmp_path):
+    since = datetime(2030, 1, 2)
+    result = export_transactions(_Collection(_docs()), str(tmp_path / "tx.ndjson.gz"), since=since)
+    assert result["rows"] == 0
+    assert result["watermark"] == since
+
+
+def test_export_transactions_overlap_rereads_late_commits(tmp_path):
+    docs = _docs()
+    col = _Collection(docs[:3] + docs[4:])
+    out = str(tmp_path / "tx.ndjson.gz")
+    first = export_transactions(col, out)
+    assert first["watermark"] == datetime(2030, 1, 1, 12, 4)
+
+    # t3 was stamped before the watermark but committed after the first export read
+    col.docs.append(docs[3])
+    second = export_transactions(col, out, since=first["watermark"], overlap=timedelta(minutes=5))
+    assert "t3" in [r["transaction_id"] for r in _read(out)]
+    assert second["watermark"] == first["watermark"]
+
+
+def test_export_transactions_normalizes_aware_bounds(tmp_path):
+    col = _Collection(_docs())
+    since = datetime(2030, 1, 1, 14, 1, tzinfo=timezone(timedelta(hours=2)))
+    export_transactions(col, str(tmp_path / "tx.ndjson.gz"), since=since)
+    assert col.queries[0]["updated_at"]["$gt"] == datetime(2030, 1, 1, 12, 1)
+    assert [r["transaction_id"] for r in _read(tmp_path / "tx.ndjson.gz")] == ["t2", "t3", "t4"]
+
+
+def test_export_transactions_removes_partial_file_on_error(tmp_path):
+    out = tmp_path / "tx.ndjson.gz"
+    out.write_bytes(b"previous export")
+
+    class _FailingCursor(_Cursor):
+        def sort(self, key, direction):
+            return self
+
+        def __iter__(self):
+            yield self.docs[0]
+            raise RuntimeError("cursor died")
+
+    class _Failing(_Collection):
+        def find(self, query, projection=None, batch_size=None):
+            return _FailingCursor(self.docs)
+
+    with pytest.raises(RuntimeError):
+        export_transactions(_Failing(_docs()), str(out), batch_size=1)
+    assert out.read_bytes() == b"previous export"
+    assert not (tmp_path / "tx.ndjson.gz.part").exists()
+
+
+def test_parse_timestamp_returns_naive_utc():
+    assert parse_timestamp("2030-01-01T12:00:00") == datetime(2030, 1, 1, 12, 0)
+    assert parse_timestamp("2030-01-01T12:00:00Z") == datetime(2030, 1, 1, 12, 0)
+    assert parse_timestamp("2030-01-01T14:30:00+02:00") == datetime(2030, 1, 1, 12, 30)
+    with pytest.raises(ValueError):
+        parse_timestamp("yesterday")
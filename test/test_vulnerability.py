@@ -0,0 +1,18 @@
+# test/test_vulnerability.py
+
+from vulnerability import score_vulnerability
+
+
+def test_score_thresholds():
+    assert score_vulnerability(1000, 850)["risk_level"] == "high"
+    assert score_vulnerability(1000, 700)["risk_level"] == "medium"
+    assert score_vulnerability(1000, 500)["risk_level"] == "low"
+    assert score_vulnerability(1000, 480) is None
+
+
+def test_score_without_income_is_worst_case():
+    score = score_vulnerability(0, 120.456)
+    assert score["risk_level"] == "high"
+    assert score["percent_income_left"] == 0.0
+    assert score["total_expenses"] == 120.46
+    assert score_vulnerability(0, 0) is None
@@ -0,0 +1,156 @@
+"""
+tx_export.py
+
+Bulk export of stored Plaid transactions (bank_transactions) for offline
+analytics, outside the web process.
+
+Rows are read with a projected, batched cursor in updated_at order and
+written as gzip-compressed NDJSON, one object per line:
+
+    {"user_id", "transaction_id", "date", "amount", "signed_amount",
+     "category", "direction": "income"|"expense", "updated_at"}
+
+Exports can be incremental: pass `since` (exclusive) and only rows
+written after it are exported; the returned watermark is the newest
+updated_at written, to be used as the next `since`. updated_at is stored
+as naive UTC, so timezone-aware bounds are converted to naive UTC first.
+
+updated_at is stamped by the application before the write commits, so a
+slow sync can commit a row older than one the previous export already
+read. Incremental exports therefore re-read an `overlap` before `since`
+(EXPORT_WATERMARK_OVERLAP, EXPORT_WATERMARK_LAG_SECONDS in the
+environment); the watermark itself never moves backwards. Rows in the
+overlap and re-synced rows are exported again, so consumers must upsert
+on (user_id, transaction_id). Deletions are not exported.
+
+The file is written to a temp name next to the target and renamed into
+place once complete.
+
+Provides:
+- EXPORT_FIELDS, EXPORT_WATERMARK_OVERLAP
+- parse_timestamp(value) -> naive UTC datetime
+- export_row(doc) -> dict
+- export_transactions(tx_col, out_path, since=None, until=None,
+                      user_id=None, batch_size=5000, overlap=None) -> dict
+"""
+
+import gzip
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from pymongo import ASCENDING
+
+import classifier
+
+EXPORT_FIELDS = [
+    "user_id", "transaction_id", "date", "amount", "signed_amount",
+    "category", "direction", "updated_at",
+]
+
+EXPORT_WATERMARK_OVERLAP = timedelta(
+    seconds=int(os.getenv("EXPORT_WATERMARK_LAG_SECONDS", "300"))
+)
+
+_PROJECTION = {
+    "_id": 0, "user_id": 1, "transaction_id": 1, "date": 1, "amount": 1,
+    "name": 1, "category": 1, "canonical_category": 1, "is_income": 1,
+    "signed_amount": 1, "updated_at": 1,
+}
+
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def parse_timestamp(value: str) -> datetime:
+    """ISO timestamp (a trailing Z or any offset allowed) as naive UTC. Raises ValueError."""
+    value = value.strip()
+    if value.endswith(("Z", "z")):
+        value = value[:-1] + "+00:00"
+    return _naive_utc(datetime.fromisoformat(value))
+
+
+def export_row(doc: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        amount = float(doc.get("amount") or 0)
+    except (TypeError, ValueError):
+        amount = 0.0
+    is_income = doc.get("is_income")
+    if is_income is None:
+        # Rows stored before ingest-time enrichment
+        is_income = classifier.is_income(doc.get("name", ""), doc.get("category") or "Other")
+    signed = doc.get("signed_amount")
+    if signed is None:
+        signed = amount if is_income else -amount
+    updated_at = doc.get("updated_at")
+    return {
+        "user_id": doc.get("user_id"),
+        "transaction_id": doc.get("transaction_id"),
+        "date": str(doc.get("date", ""))[:10],
+        "amount": amount,
+        "signed_amount": signed,
+        "category": doc.get("canonical_category") or doc.get("category"),
+        "direction": "income" if is_income else "expense",
+        "updated_at": updated_at.isoformat() if isinstance(updated_at, datetime) else updated_at,
+    }
+
+
+def export_transactions(
+    tx_col,
+    out_path: str,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    user_id: Optional[str] = None,
+    batch_size: int = 5000,
+    overlap: Optional[timedelta] = None,
+) -> Dict[str, Any]:
+    """
+    Write rows with since - overlap < updated_at <= until (either bound
+    optional) to out_path. Returns {"path", "rows", "watermark"}; watermark
+    is the newest updated_at exported, or `since` if that is newer.
+    """
+    since, until = _naive_utc(since), _naive_utc(until)
+    query: Dict[str, Any] = {}
+    window = {}
+    if since:
+        window["$gt"] = since - overlap if overlap else since
+    if until:
+        window["$lte"] = until
+    if window:
+        query["updated_at"] = window
+    if user_id:
+        query["user_id"] = user_id
+
+    cursor = tx_col.find(query, _PROJECTION, batch_size=batch_size).sort("updated_at", ASCENDING)
+
+    tmp_path = out_path + ".part"
+    rows = 0
+    watermark = since
+    try:
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as out:
+            lines = []
+            for doc in cursor:
+                lines.append(json.dumps(export_row(doc), separators=(",", ":")))
+                updated_at = doc.get("updated_at")
+                if isinstance(updated_at, datetime) and (watermark is None or updated_at > watermark):
+                    watermark = updated_at
+                if len(lines) >= batch_size:
+                    out.write("\n".join(lines) + "\n")
+                    rows += len(lines)
+                    lines = []
+            if lines:
+                out.write("\n".join(lines) + "\n")
+                rows += len(lines)
+        os.replace(tmp_path, out_path)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    return {"path": out_path, "rows": rows, "watermark": watermark}
@@ -0,0 +1,161 @@
+"""
+velocity.py
+
+Sliding-window event counter for the transaction velocity rule ("N
+transactions at this merchant in the last hour").
+
+Events are counted per (user, merchant) key in fixed-size time buckets,
+one small document per key per bucket:
+
+    {key, bucket (bucket start), count, expires_at}
+
+Recording an event is one $inc upsert. Counting a window reads at most
+window / bucket_seconds + 1 documents through the (key, bucket) index, so
+the cost does not grow with history. A TTL index on expires_at lets
+MongoDB drop buckets once they can no longer fall inside a window.
+
+The window is approximate to one bucket: the oldest bucket is counted
+whole if it overlaps the window at all.
+
+count_and_record* record first and count afterwards, so concurrent
+requests for the same key can't all read the count from before any of
+them was recorded. count_and_record takes the current bucket's count from
+its own $inc (find_one_and_update), which orders concurrent callers
+exactly; the batch form reads the window after its bulk $inc, so events
+recorded concurrently by other callers are counted, never missed.
+
+Provides:
+- VelocityTracker(collection, bucket_seconds=300, max_window_seconds=86400)
+    .ensure_indexes()
+    .record(user_id, merchant, now=None)
+    .count(user_id, merchant, window_seconds, now=None) -> int
+    .count_and_record(user_id, merchant, window_seconds, now=None) -> int
+    .count_and_record_many(events, window_seconds, now=None) -> [int]
+"""
+
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+
+
+class VelocityTracker:
+    def __init__(self, collection, bucket_seconds: int = 300, max_window_seconds: int = 86400):
+        self.collection = collection
+        self.bucket_seconds = bucket_seconds
+        self.max_window_seconds = max_window_seconds
+
+    def ensure_indexes(self):
+        self.collection.create_index([("key", ASCENDING), ("bucket", ASCENDING)], unique=True)
+        self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    @staticmethod
+    def key(user_id: Optional[str], merchant: Optional[str]) -> str:
+        return f"{user_id or ''}|{(merchant or '').strip().lower()}"
+
+    def _bucket_start(self, now: datetime) -> datetime:
+        epoch = int(now.timestamp()) if now.tzinfo else int((now - datetime(1970, 1, 1)).total_seconds())
+        start = epoch - epoch % self.bucket_seconds
+        return datetime(1970, 1, 1) + timedelta(seconds=start)
+
+    def _increment_spec(self, key: str, bucket: datetime, n: int = 1) -> Tuple[dict, dict]:
+        return (
+            {"key": key, "bucket": bucket},
+            {
+                "$inc": {"count": n},
+                "$setOnInsert": {
+                    "expires_at": bucket + timedelta(
+                        seconds=self.max_window_seconds + self.bucket_seconds
+                    ),
+                },
+            },
+        )
+
+    def _increment(self, key: str, bucket: datetime, n: int = 1) -> UpdateOne:
+        return UpdateOne(*self._increment_spec(key, bucket, n), upsert=True)
+
+    def record(self, user_id: Optional[str], merchant: Optional[str], now: Optional[datetime] = None):
+        now = now or datetime.utcnow()
+        self.collection.bulk_write([
+            self._increment(self.key(user_id, merchant), self._bucket_start(now))
+        ])
+
+    def count(
+        self,
+        user_id: Optional[str],
+        merchant: Optional[str],
+        window_seconds: int,
+        now: Optional[datetime] = None,
+    ) -> int:
+        now = now or datetime.utcnow()
+        oldest = self._bucket_start(now - timedelta(seconds=window_seconds))
+        cursor = self.collection.find(
+            {"key": self.key(user_id, merchant), "bucket": {"$gte": oldest}},
+            {"_id": 0, "count": 1},
+        )
+        return sum(doc.get("count", 0) for doc in cursor)
+
+    def count_and_record(
+        self,
+        user_id: Optional[str],
+        merchant: Optional[str],
+        window_seconds: int,
+        now: Optional[datetime] = None,
+    ) -> int:
+        """Record this event; returns the events already in the window before it."""
+        now = now or datetime.utcnow()
+        key = self.key(user_id, merchant)
+        bucket = self._bucket_start(now)
+        current = self.collection.find_one_and_update(
+            *self._increment_spec(key, bucket),
+            projection={"_id": 0, "count": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        oldest = self._bucket_start(now - timedelta(seconds=window_seconds))
+        cursor = self.collection.find(
+            {"key": key, "bucket": {"$gte": oldest, "$lt": bucket}},
+            {"_id": 0, "count": 1},
+        )
+        return sum(doc.get("count", 0) for doc in cursor) + current["count"] - 1
+
+    def count_and_record_many(
+        self,
+        events: Iterable[Tuple[Optional[str], Optional[str]]],
+        window_seconds: int,
+        now: Optional[datetime] = None,
+    ) -> List[int]:
+        """
+        Batch form of count_and_record for [(user_id, merchant), ...] seen
+        together at `now`: one bulk $inc, then one read for every key. Each
+        event's count includes the events before it in the batch.
+        """
+        now = now or datetime.utcnow()
+        keys = [self.key(user_id, merchant) for user_id, merchant in events]
+        if not keys:
+            return []
+
+        batch = Counter(keys)
+        bucket = self._bucket_start(now)
+        self.collection.bulk_write(
+            [self._increment(key, bucket, n) for key, n in batch.items()],
+            ordered=False,
+        )
+
+        # Window totals include this batch; start each key from before it
+        running = Counter()
+        oldest = self._bucket_start(now - timedelta(seconds=window_seconds))
+        cursor = self.collection.find(
+            {"key": {"$in": list(batch)}, "bucket": {"$gte": oldest}},
+            {"_id": 0, "key": 1, "count": 1},
+        )
+        for doc in cursor:
+            running[doc["key"]] += doc.get("count", 0)
+        running.subtract(batch)
+
+        counts = []
+        for key in keys:
+            counts.append(running[key])
+            running[key] += 1
+        return counts
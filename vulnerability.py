@@ -0,0 +1,306 @@
+"""
+vulnerability.py
+
+Financially-vulnerable scan as a batch job.
+
+Window totals per user come from one aggregation over the daily rollups.
+Bank accounts are streamed with a projection and the matching user docs
+are fetched with batched $in queries. Results are bulk-written into a
+per-run staging collection, which is then renamed over
+financially_vulnerable_users (dropTarget=True). Readers keep seeing the
+previous snapshot until the new one is complete.
+
+Users without Plaid activity in the window are scored from their manual
+entries instead. rescore_user() applies the same rules to a single user,
+so sync and manual entry can keep the snapshot current between scans;
+callers pass the window of the scan that built the snapshot, and every
+snapshot doc records its window_days.
+
+Advisor link priorities written here are tagged priority_source
+"vulnerability_scan". Links an advisor prioritised by hand
+(priority_source "advisor") are never overwritten, and leaving the
+snapshot only resets links the scanner set.
+
+Rules (over the window):
+  net = income - expenses, percent_left = net / income * 100
+  percent_left <= 20 -> high, <= 40 -> medium, <= 50 -> low,
+  otherwise not vulnerable. No income but some expenses counts as 0% left.
+
+Provides:
+- PRIORITY_SOURCE_SCAN, PRIORITY_SOURCE_ADVISOR
+- score_vulnerability(total_income, total_expenses) -> dict | None
+- window_totals(rollups_col, since, user_id=None) -> {user_id: totals}
+- manual_window_totals(entries_col, since, user_id=None) -> {user_id: totals}
+- rescore_user(user_doc, totals, current_balance, clients_col, target_col,
+               window_days) -> dict | None
+- run_vulnerability_scan(...) -> dict
+"""
+
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import ASCENDING, InsertOne, UpdateMany
+
+from batching import chunked
+
+SCAN_BATCH_SIZE = 500
+
+PRIORITY_SOURCE_SCAN = "vulnerability_scan"
+PRIORITY_SOURCE_ADVISOR = "advisor"
+
+
+def _scan_priority_update(user_oid, risk_level: str):
+    """(filter, update) setting the scanner's priority on a user's accepted links."""
+    return (
+        {
+            "user_id": user_oid,
+            "status": "Accepted",
+            "priority_source": {"$ne": PRIORITY_SOURCE_ADVISOR},
+        },
+        {"$set": {"priority": risk_level, "priority_source": PRIORITY_SOURCE_SCAN}},
+    )
+
+
+def score_vulnerability(total_income: float, total_expenses: float) -> Optional[Dict[str, Any]]:
+    """Risk fields for one user's window totals, or None if not vulnerable."""
+    # If we truly have no income and no expenses in this window, skip
+    if total_income <= 0 and total_expenses <= 0:
+        return None
+
+    net = total_income - total_expenses
+    if total_income <= 0:
+        percent_left = 0.0
+    else:
+        percent_left = (net / total_income) * 100.0
+
+    if percent_left <= 20:
+        risk_level = "high"
+    elif percent_left <= 40:
+        risk_level = "medium"
+    elif percent_left <= 50:
+        risk_level = "low"
+    else:
+        return None
+
+    return {
+        "percent_income_left": round(percent_left, 2),
+        "total_income": round(total_income, 2),
+        "total_expenses": round(total_expenses, 2),
+        "net_amount": round(net, 2),
+        "risk_level": risk_level,
+    }
+
+
+def window_totals(rollups_col, since: date, user_id: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+    """{user_id: {"income", "expenses"}} summed over rollup days >= since."""
+    match = {"day": {"$gte": since.isoformat()}, "tx_count": {"$gt": 0}}
+    if user_id is not None:
+        match["user_id"] = user_id
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": "$user_id",
+            "income": {"$sum": "$income"},
+            "expenses": {"$sum": "$expenses"},
+        }},
+    ]
+    return {
+        row["_id"]: {"income": row["income"], "expenses": row["expenses"]}
+        for row in rollups_col.aggregate(pipeline, allowDiskUse=True)
+    }
+
+
+def manual_window_totals(entries_col, since: date, user_id: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+    """{user_id: {"income", "expenses"}} over manual entries created on/after since."""
+    match = {
+        "created_at": {"$gte": datetime(since.year, since.month, since.day)},
+        "type": {"$in": ["income", "expense"]},
+    }
+    if user_id is not None:
+        match["user_id"] = user_id
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": "$user_id",
+            "income": {"$sum": {"$cond": [{"$eq": ["$type", "income"]}, "$amount", 0]}},
+            "expenses": {"$sum": {"$cond": [{"$eq": ["$type", "expense"]}, "$amount", 0]}},
+        }},
+    ]
+    return {
+        row["_id"]: {"income": row["income"], "expenses": row["expenses"]}
+        for row in entries_col.aggregate(pipeline, allowDiskUse=True)
+    }
+
+
+def _snapshot_doc(
+    user_doc: dict, score: Dict[str, Any], current_balance, computed_at: datetime, window_days: int
+) -> dict:
+    return {
+        "user_id": str(user_doc["_id"]),
+        "username": user_doc.get("username"),
+        "email": user_doc.get("email"),
+        "fullName": user_doc.get("fullName"),
+        **score,
+        "current_balance": float(current_balance or 0.0),
+        "window_days": window_days,
+        "computed_at": computed_at,
+    }
+
+
+def rescore_user(
+    user_doc: dict,
+    totals: Optional[Dict[str, float]],
+    current_balance,
+    clients_col,
+    target_col,
+    window_days: int,
+) -> Optional[dict]:
+    """
+    Recompute one user's snapshot entry from their totals over the last
+    `window_days` days (the window of the scan that built the snapshot).
+
+    Vulnerable -> upsert the snapshot doc and set the priority of their
+    accepted advisor links. No longer vulnerable -> remove the doc and put
+    the links the scanner prioritised back to the default "low". Returns
+    the doc or None.
+    """
+    score = None
+    if totals:
+        score = score_vulnerability(float(totals["income"]), float(totals["expenses"]))
+
+    user_id_str = str(user_doc["_id"])
+    if not score:
+        link_query = {"user_id": user_doc["_id"], "status": "Accepted"}
+        previous = target_col.find_one_and_delete({"user_id": user_id_str}, {"risk_level": 1})
+        if previous:
+            clients_col.update_many(
+                {**link_query, "$or": [
+                    {"priority_source": PRIORITY_SOURCE_SCAN},
+                    # Links prioritised before priority_source existed
+                    {"priority_source": {"$exists": False}, "priority": previous.get("risk_level")},
+                ]},
+                {"$set": {"priority": "low"}, "$unset": {"priority_source": ""}},
+            )
+        return None
+
+    doc = _snapshot_doc(user_doc, score, current_balance, datetime.utcnow(), window_days)
+    target_col.update_one({"user_id": user_id_str}, {"$set": doc}, upsert=True)
+    clients_col.update_many(*_scan_priority_update(user_doc["_id"], score["risk_level"]))
+    return doc
+
+
+def _user_docs(users_col, user_ids: List[str]) -> Dict[str, dict]:
+    oids = []
+    for uid in user_ids:
+        try:
+            oids.append(ObjectId(uid))
+        except Exception:
+            continue
+    if not oids:
+        return {}
+    cursor = users_col.find(
+        {"_id": {"$in": oids}},
+        {"username": 1, "email": 1, "fullName": 1},
+    )
+    return {str(u["_id"]): u for u in cursor}
+
+
+def run_vulnerability_scan(
+    bank_accounts_col,
+    users_col,
+    rollups_col,
+    clients_col,
+    target_col,
+    days: int = 30,
+    batch_size: int = SCAN_BATCH_SIZE,
+    entries_col=None,
+) -> Dict[str, Any]:
+    """
+    Score every user with activity in the last `days` days and swap the
+    result in as `target_col`: Plaid-connected users from their rollups,
+    everyone else (when entries_col is given) from manual entries.
+    Accepted advisor links of vulnerable users get their priority set to
+    the risk level.
+
+    Returns {"window_days", "scanned_accounts", "vulnerable_count",
+    "vulnerable_users"}.
+    """
+    cutoff_date = datetime.utcnow().date() - timedelta(days=days)
+    totals = window_totals(rollups_col, cutoff_date)
+    manual_totals = manual_window_totals(entries_col, cutoff_date) if entries_col is not None else {}
+
+    staging = target_col.database[f"{target_col.name}_staging_{ObjectId()}"]
+    # Creating the indexes also creates the collection, so the rename
+    # below works even when nobody is vulnerable.
+    staging.create_index([("user_id", ASCENDING)], unique=True)
+    staging.create_index([("percent_income_left", ASCENDING)])
+
+    vulnerable_results = []
+    # Applied only after the new snapshot is live, so a failed scan leaves
+    # advisor priorities matching the snapshot readers still see
+    priority_updates = []
+    scanned = 0
+    seen = set()
+
+    def score_batch(batch):
+        # batch: [(user_id, current_balance)]
+        nonlocal scanned
+        users = _user_docs(users_col, [uid for uid, _ in batch])
+        inserts = []
+        computed_at = datetime.utcnow()
+        for user_id_str, balance in batch:
+            user_doc = users.get(user_id_str)
+            if not user_doc:
+                continue
+            scanned += 1
+
+            user_totals = totals.get(user_id_str) or manual_totals[user_id_str]
+            score = score_vulnerability(
+                float(user_totals["income"]), float(user_totals["expenses"])
+            )
+            if not score:
+                continue
+
+            doc = _snapshot_doc(user_doc, score, balance, computed_at, days)
+            inserts.append(InsertOne(dict(doc)))
+            priority_updates.append(UpdateMany(*_scan_priority_update(user_doc["_id"], score["risk_level"])))
+            vulnerable_results.append(doc)
+
+        if inserts:
+            staging.bulk_write(inserts, ordered=False)
+
+    try:
+        accounts = bank_accounts_col.find(
+            {}, {"_id": 0, "user_id": 1, "current_balance": 1}, batch_size=batch_size
+        )
+        for batch in chunked(accounts, batch_size):
+            # Only users with activity in the window count as scanned
+            items = []
+            for acct in batch:
+                uid = acct.get("user_id")
+                if uid in seen or (uid not in totals and uid not in manual_totals):
+                    continue
+                seen.add(uid)
+                items.append((uid, acct.get("current_balance")))
+            score_batch(items)
+
+        # Manual-only users (no bank connection)
+        manual_only = [(uid, 0.0) for uid in manual_totals if uid not in seen]
+        for batch in chunked(manual_only, batch_size):
+            score_batch(batch)
+
+        staging.rename(target_col.name, dropTarget=True)
+    except Exception:
+        staging.drop()
+        raise
+
+    for batch in chunked(priority_updates, batch_size):
+        clients_col.bulk_write(batch, ordered=False)
+
+    return {
+        "window_days": days,
+        "scanned_accounts": scanned,
+        "vulnerable_count": len(vulnerable_results),
+        "vulnerable_users": vulnerable_results,
+    }